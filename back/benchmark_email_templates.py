@@ -0,0 +1,86 @@
+"""
+Micro-benchmark du rendu des emails : f-string inline (ancien code des méthodes
+envoyer_email_*) contre les modèles précompilés de utils/email_templates.py.
+
+Usage :
+    python benchmark_email_templates.py               # lot de 150 destinataires
+    python benchmark_email_templates.py --lot 500 --repetitions 20
+"""
+import argparse
+import timeit
+
+from utils.email_templates import modeles
+
+
+def rendu_inline(destinataire, prenom, titre_travail, nom_matiere, formateur, date_echeance, description):
+    """Copie du rendu d'avant les modèles précompilés (envoyer_email_assignation_travail)"""
+    corps_html = f"""
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #e1e1e1; border-radius: 10px;">
+                <h2 style="color: #2563eb;">Nouveau travail assigné !</h2>
+                <p>Bonjour <strong>{prenom}</strong>,</p>
+                <p>Un nouveau travail vous a été assigné dans la matière <strong>{nom_matiere}</strong> par votre formateur <strong>{formateur}</strong>.</p>
+
+                <div style="background-color: #f8fafc; padding: 15px; border-radius: 5px; margin: 20px 0;">
+                    <p style="margin-top: 0;"><strong>Titre :</strong> {titre_travail}</p>
+                    <p><strong>Échéance :</strong> <span style="color: #dc2626; font-weight: bold;">{date_echeance}</span></p>
+                    <p style="margin-bottom: 0;"><strong>Description :</strong><br>{description}</p>
+                </div>
+
+                <p>Pour toute question, n'hésitez pas à contacter votre formateur.</p>
+                <br>
+                <p>Cordialement,<br>L'équipe pédagogique</p>
+            </div>
+        </body>
+        </html>
+        """
+    return f"Nouveau travail : {titre_travail} - {nom_matiere}", corps_html
+
+
+def construire_lot(taille):
+    description = "Implémenter un analyseur syntaxique et rédiger un rapport. " * 10
+    return [
+        {
+            "destinataire": f"etudiant{i}@uatm.bj", "prenom": f"Étudiant{i}",
+            "titre_travail": "Projet compilation", "nom_matiere": "Compilation",
+            "formateur": "Jean Dupont", "date_echeance": "15/01/2026 23:59",
+            "description": description
+        }
+        for i in range(taille)
+    ]
+
+
+def mesurer(nom, fonction, nb_messages, repetitions):
+    meilleur = min(timeit.repeat(fonction, number=10, repeat=repetitions)) / 10
+    print(f"{nom:<32} {meilleur * 1e6 / nb_messages:8.2f} µs/message")
+    return meilleur
+
+
+def main(taille_lot, repetitions):
+    lot = construire_lot(taille_lot)
+    variables = [{k: v for k, v in p.items() if k != "destinataire"} for p in lot]
+    communes = {k: v for k, v in variables[0].items() if k != "prenom"}
+    propres = [{"prenom": v["prenom"]} for v in variables]
+    modele = modeles["assignation_travail"]
+
+    # Même sujet et même corps (aux lignes vides près) que l'ancien code
+    attendu = [rendu_inline(**p) for p in lot]
+    assert modele.rendre_lot(propres, communes) == modele.rendre_lot(variables)
+    assert [s for s, _ in modele.rendre_lot(variables)] == [s for s, _ in attendu]
+    assert [c.split() for _, c in modele.rendre_lot(variables)] == [c.split() for _, c in attendu]
+
+    print(f"Rendu de {taille_lot} emails d'assignation (meilleur de {repetitions})\n")
+    reference = mesurer("f-string inline (ancien)", lambda: [rendu_inline(**p) for p in lot],
+                        taille_lot, repetitions)
+    par_lot = mesurer("modèle précompilé, par lot", lambda: modele.rendre_lot(propres, communes),
+                      taille_lot, repetitions)
+    print(f"\npar lot : x{reference / par_lot:.2f}  (vs ancien)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare le coût de rendu des emails")
+    parser.add_argument("--lot", type=int, default=150)
+    parser.add_argument("--repetitions", type=int, default=50)
+    args = parser.parse_args()
+    main(args.lot, args.repetitions)
@@ -1,12 +1,15 @@
+from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
 import os
 
-from models import Utilisateur, TentativeConnexion, RoleEnum
+from models import Utilisateur, Formateur, Etudiant, RoleEnum
 from database.database import get_db
-from core.jwt import create_access_token, get_password_hash, verify_password
+from core.cache import cache_identites
+from core.limiteur import limiteur_connexions
+from core.jwt import create_access_token, get_password_hash, verify_password, verify_token
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
@@ -109,63 +112,150 @@ def initialiser_compte_de(db: Session) -> Optional[Dict[str, Any]]:
     }
 
 
-def verifier_tentatives_connexion(db: Session, email: str) -> Optional[Dict[str, str]]:
+def verifier_tentatives_connexion(email: str) -> Optional[Dict[str, Any]]:
     """
-    Vérifie si l'utilisateur a dépassé le nombre de tentatives de connexion
-    Retourne une erreur si trop de tentatives, sinon None
+    Vérifie si l'email a dépassé le nombre d'échecs de connexion autorisés
+    Retourne une erreur (avec l'attente en secondes) si trop de tentatives, sinon None
     """
-    # Debug: Vérification des tentatives de connexion
-    print(f"Debug: Vérification des tentatives pour l'email: {email}")
-    
-    # Calculer la date il y a 15 minutes
-    date_limite = datetime.utcnow() - timedelta(minutes=15)
-    
-    # Compter les tentatives échouées dans les dernières 15 minutes
-    tentatives_recentes = db.query(TentativeConnexion).filter(
-        and_(
-            TentativeConnexion.email == email,
-            TentativeConnexion.succes == False,
-            TentativeConnexion.date_tentative > date_limite
-        )
-    ).count()
-    
-    print(f"Debug: Nombre de tentatives échouées dans les 15 dernières minutes: {tentatives_recentes}")
-    
-    if tentatives_recentes >= 5:
-        print("Debug: Trop de tentatives - blocage activé")
-        return {
-            "code": "AUTH_04",
-            "message": "Trop de tentatives. Veuillez attendre 15 minutes."
-        }
-    
-    print("Debug: Nombre de tentatives acceptable - pas de blocage")
-    return None
+    attente = limiteur_connexions.attente(email)
+    if attente is None:
+        return None
+    return {
+        "code": "AUTH_04",
+        "message": f"Trop de tentatives. Veuillez attendre {max(1, round(attente / 60))} minute(s).",
+        "attente": int(attente) + 1
+    }
 
 
 def generer_token_jwt(utilisateur: Dict[str, Any]) -> str:
-    """Génère un token JWT"""
+    """
+    Génère un token JWT. Les identifiants de profil (formateur / étudiant / promotion)
+    et la version de token sont signés avec les autres claims lorsqu'ils sont fournis.
+    """
     payload = {
         "sub": utilisateur["identifiant"],
         "email": utilisateur["email"],
         "role": utilisateur["role"],
         "nom": utilisateur["nom"],
-        "prenom": utilisateur["prenom"]
+        "prenom": utilisateur["prenom"],
+        "ver": utilisateur.get("version_token", 0)
     }
+    for claim in ("id_formateur", "id_etudiant", "id_promotion"):
+        if utilisateur.get(claim):
+            payload[claim] = utilisateur[claim]
     return create_access_token(data=payload)
 
 
+@dataclass(frozen=True)
+class Identite:
+    """Utilisateur actif et identifiants de son profil, tels que mis en cache"""
+    identifiant: str
+    email: str
+    nom: str
+    prenom: str
+    role: RoleEnum
+    actif: bool
+    mot_de_passe_temporaire: bool
+    version_token: int = 0
+    id_formateur: Optional[str] = None
+    id_etudiant: Optional[str] = None
+    id_promotion: Optional[str] = None
+
+    def en_utilisateur(self) -> Utilisateur:
+        """Utilisateur non attaché à une session, construit à partir des colonnes en cache"""
+        return Utilisateur(
+            identifiant=self.identifiant,
+            email=self.email,
+            nom=self.nom,
+            prenom=self.prenom,
+            role=self.role,
+            actif=self.actif,
+            mot_de_passe_temporaire=self.mot_de_passe_temporaire,
+            version_token=self.version_token
+        )
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Utilisateur authentifié tel que décrit par les claims signés de son token"""
+    identifiant: str
+    email: str
+    role: RoleEnum
+    nom: str
+    prenom: str
+    id_formateur: Optional[str] = None
+    id_etudiant: Optional[str] = None
+    id_promotion: Optional[str] = None
+
+
+def resoudre_identite(db: Session, identifiant: str) -> Optional[Identite]:
+    """
+    Retourne l'identité d'un utilisateur et de son profil formateur / étudiant.
+    Les utilisateurs actifs sont servis depuis le cache mémoire (durée de vie courte) ;
+    sinon une seule requête les charge depuis la base.
+    """
+    identite = cache_identites.obtenir(identifiant)
+    if identite is not None:
+        return identite
+
+    row = db.query(
+        Utilisateur.identifiant,
+        Utilisateur.email,
+        Utilisateur.nom,
+        Utilisateur.prenom,
+        Utilisateur.role,
+        Utilisateur.actif,
+        Utilisateur.mot_de_passe_temporaire,
+        Utilisateur.version_token,
+        Formateur.id_formateur,
+        Etudiant.id_etudiant,
+        Etudiant.id_promotion
+    ).outerjoin(
+        Formateur, Formateur.identifiant == Utilisateur.identifiant
+    ).outerjoin(
+        Etudiant, Etudiant.identifiant == Utilisateur.identifiant
+    ).filter(Utilisateur.identifiant == identifiant).first()
+
+    if row is None:
+        return None
+
+    identite = Identite(**row._asdict())
+    if identite.actif:
+        cache_identites.enregistrer(identifiant, identite)
+    return identite
+
+
+def generer_token_utilisateur(db: Session, identifiant: str) -> str:
+    """Génère le JWT d'un utilisateur avec les claims de son profil et sa version de token"""
+    identite = resoudre_identite(db, identifiant)
+    return generer_token_jwt(asdict(identite))
+
+
+def revoquer_tokens(utilisateur: Utilisateur) -> None:
+    """
+    Invalide tous les JWT déjà émis pour cet utilisateur en incrémentant sa version de token.
+    L'appelant valide la transaction puis invalide l'identité en cache.
+    """
+    utilisateur.version_token = (utilisateur.version_token or 0) + 1
+
+
 # Configuration pour l'authentification Bearer
 security = HTTPBearer()
 
 
-def get_current_user(
-    token: Optional[str] = None,
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
-    db: Session = Depends(get_db)
-) -> Utilisateur:
-    """Récupère l'utilisateur actuel à partir du token JWT (Header ou Query Param)"""
-    
-    # 1. Récupérer le token (soit du header, soit du paramètre d'URL)
+def _erreur_authentification(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _decoder_token(
+    token: Optional[str],
+    credentials: Optional[HTTPAuthorizationCredentials]
+) -> Dict[str, Any]:
+    """Récupère le token (header ou paramètre d'URL) et retourne ses claims vérifiés"""
     jwt_token = None
     if credentials:
         jwt_token = credentials.credentials
@@ -173,46 +263,66 @@ def get_current_user(
         jwt_token = token
     
     if not jwt_token:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Session expirée ou jeton manquant. Veuillez vous reconnecter.",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _erreur_authentification("Session expirée ou jeton manquant. Veuillez vous reconnecter.")
 
-    # Vérifier et décoder le token
     try:
-        from core.jwt import verify_token
         payload = verify_token(jwt_token)
-        identifiant = payload.get("sub")
-        
-        if identifiant is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token invalide",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
     except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token invalide",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # Récupérer l'utilisateur depuis la base de données
-    utilisateur = db.query(Utilisateur).filter(Utilisateur.identifiant == identifiant).first()
+        raise _erreur_authentification("Token invalide")
+
+    if payload.get("sub") is None:
+        raise _erreur_authentification("Token invalide")
+    return payload
+
+
+def _verifier_identite(db: Session, payload: Dict[str, Any]) -> Identite:
+    """Vérifie que le compte existe, est actif et que le token n'a pas été révoqué"""
+    identite = resoudre_identite(db, payload["sub"])
     
-    if utilisateur is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Utilisateur non trouvé",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    if identite is None:
+        raise _erreur_authentification("Utilisateur non trouvé")
     
-    if not utilisateur.actif:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Compte inactif",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    if not identite.actif:
+        raise _erreur_authentification("Compte inactif")
+
+    # Les tokens émis avant l'introduction des versions n'ont pas de claim "ver"
+    if payload.get("ver", 0) < identite.version_token:
+        raise _erreur_authentification("Session révoquée. Veuillez vous reconnecter.")
     
-    return utilisateur
\ No newline at end of file
+    return identite
+
+
+def get_current_user(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
+    db: Session = Depends(get_db)
+) -> Utilisateur:
+    """Récupère l'utilisateur actuel à partir du token JWT (Header ou Query Param)"""
+    payload = _decoder_token(token, credentials)
+    return _verifier_identite(db, payload).en_utilisateur()
+
+
+def get_current_principal(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """
+    Retourne l'utilisateur authentifié et les identifiants de son profil directement
+    depuis les claims du token, sans requête Formateur / Etudiant.
+    La révocation (compte inactif, version de token) est vérifiée via le cache d'identités.
+    """
+    payload = _decoder_token(token, credentials)
+    identite = _verifier_identite(db, payload)
+
+    # Les tokens émis avant l'ajout des claims de profil retombent sur l'identité en cache
+    return Principal(
+        identifiant=payload["sub"],
+        email=payload.get("email", identite.email),
+        role=RoleEnum(payload.get("role", identite.role)),
+        nom=payload.get("nom", identite.nom),
+        prenom=payload.get("prenom", identite.prenom),
+        id_formateur=payload.get("id_formateur", identite.id_formateur),
+        id_etudiant=payload.get("id_etudiant", identite.id_etudiant),
+        id_promotion=payload.get("id_promotion", identite.id_promotion)
+    )
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import os
+import threading
+import time
+
+from models import RoleEnum
+
+
+class CacheTTL:
+    """
+    Cache mémoire borné : éviction LRU au-delà de taille_max
+    et expiration de chaque entrée après sa durée de vie (en secondes)
+    """
+
+    def __init__(self, taille_max: int = 1000, duree_vie: float = 60):
+        self.taille_max = taille_max
+        self.duree_vie = duree_vie
+        self._entrees: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def obtenir(self, cle: Hashable) -> Optional[Any]:
+        """Retourne la valeur associée à la clé, ou None si absente ou expirée"""
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None:
+                return None
+            expiration, valeur = entree
+            if expiration <= time.monotonic():
+                del self._entrees[cle]
+                return None
+            self._entrees.move_to_end(cle)
+            return valeur
+
+    def enregistrer(self, cle: Hashable, valeur: Any, duree_vie: Optional[float] = None) -> None:
+        expiration = time.monotonic() + (self.duree_vie if duree_vie is None else duree_vie)
+        with self._verrou:
+            self._entrees[cle] = (expiration, valeur)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    def invalider(self, cle: Hashable) -> None:
+        with self._verrou:
+            self._entrees.pop(cle, None)
+
+    def invalider_si(self, predicat: Callable[[Hashable], bool]) -> None:
+        """Supprime toutes les entrées dont la clé vérifie le prédicat"""
+        with self._verrou:
+            for cle in [cle for cle in self._entrees if predicat(cle)]:
+                del self._entrees[cle]
+
+    def vider(self) -> None:
+        with self._verrou:
+            self._entrees.clear()
+
+
+# ==================== TABLEAUX DE BORD ====================
+
+# Durée de vie (secondes) des tableaux de bord, par rôle
+DUREES_VIE_TABLEAUX_DE_BORD = {
+    RoleEnum.DE: float(os.environ.get("CACHE_TTL_DASHBOARD_DE", "60")),
+    RoleEnum.FORMATEUR: float(os.environ.get("CACHE_TTL_DASHBOARD_FORMATEUR", "30")),
+    RoleEnum.ETUDIANT: float(os.environ.get("CACHE_TTL_DASHBOARD_ETUDIANT", "30")),
+}
+
+cache_tableaux_de_bord = CacheTTL(
+    taille_max=int(os.environ.get("CACHE_DASHBOARD_TAILLE_MAX", "2000"))
+)
+
+
+def obtenir_tableau_de_bord(role: RoleEnum, identifiant: str, calculer: Callable[[], Any]) -> Any:
+    """
+    Retourne le tableau de bord en cache pour (rôle, identifiant utilisateur),
+    ou le calcule et le met en cache pour la durée de vie du rôle
+    """
+    cle = (role.value, identifiant)
+    tableau = cache_tableaux_de_bord.obtenir(cle)
+    if tableau is None:
+        tableau = calculer()
+        cache_tableaux_de_bord.enregistrer(cle, tableau, DUREES_VIE_TABLEAUX_DE_BORD[role])
+    return tableau
+
+
+def invalider_tableaux_de_bord(role: RoleEnum, *identifiants: Optional[str]) -> None:
+    """
+    Invalide les tableaux de bord d'un rôle : ceux des identifiants donnés,
+    ou tous ceux du rôle si aucun identifiant n'est fourni
+    """
+    if identifiants:
+        for identifiant in identifiants:
+            if identifiant:
+                cache_tableaux_de_bord.invalider((role.value, identifiant))
+    else:
+        cache_tableaux_de_bord.invalider_si(lambda cle: cle[0] == role.value)
+
+
+# ==================== IDENTITÉS ====================
+
+# Utilisateurs actifs authentifiés et leur profil (formateur / étudiant), par identifiant
+cache_identites = CacheTTL(
+    taille_max=int(os.environ.get("CACHE_IDENTITES_TAILLE_MAX", "5000")),
+    duree_vie=float(os.environ.get("CACHE_TTL_IDENTITE", "30"))
+)
+
+
+def invalider_identite(*identifiants: Optional[str]) -> None:
+    """
+    Invalide l'identité en cache des utilisateurs donnés (désactivation,
+    changement ou réinitialisation de mot de passe), ou toutes si aucun n'est fourni
+    """
+    if identifiants:
+        for identifiant in identifiants:
+            if identifiant:
+                cache_identites.invalider(identifiant)
+    else:
+        cache_identites.vider()
@@ -0,0 +1,126 @@
+"""
+Limitation des tentatives de connexion (fenêtre glissante)
+
+Les échecs récents de chaque email sont comptés en mémoire : la vérification faite à
+chaque connexion ne touche pas la base. Avec plusieurs processus (workers uvicorn,
+instances), chacun a son propre compte ; un stockage partagé (ex : Redis) peut être
+branché en implémentant StockageTentatives et en le passant à configurer_limiteur.
+La table tentative_connexion ne sert plus qu'au journal des échecs, écrit hors requête.
+"""
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Deque, Optional
+
+from sqlalchemy.orm import Session
+
+from models import TentativeConnexion
+
+ECHECS_MAX = int(os.getenv("LOGIN_ECHECS_MAX", "5"))
+FENETRE = float(os.getenv("LOGIN_FENETRE", "900"))  # secondes
+
+
+class StockageTentatives(ABC):
+    """Instants (time.time()) des échecs récents, par clé"""
+
+    @abstractmethod
+    def ajouter(self, cle: str, instant: float, fenetre: float, conserver: int) -> None:
+        """Enregistre un échec ; seuls les `conserver` plus récents de la fenêtre sont utiles"""
+
+    @abstractmethod
+    def lister(self, cle: str, depuis: float) -> list:
+        """Échecs postérieurs à `depuis`, du plus ancien au plus récent"""
+
+    @abstractmethod
+    def effacer(self, cle: str) -> None:
+        """Oublie les échecs d'une clé"""
+
+
+class StockageMemoire(StockageTentatives):
+    """Stockage du processus courant, borné (les clés les moins récentes sont évincées)"""
+
+    def __init__(self, taille_max: int = 10000):
+        self.taille_max = taille_max
+        self._echecs: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def ajouter(self, cle: str, instant: float, fenetre: float, conserver: int) -> None:
+        with self._verrou:
+            echecs = self._echecs.get(cle)
+            if echecs is None or echecs.maxlen != conserver:
+                echecs = self._echecs[cle] = deque(echecs or (), maxlen=conserver)
+            while echecs and echecs[0] <= instant - fenetre:
+                echecs.popleft()
+            echecs.append(instant)
+            self._echecs.move_to_end(cle)
+            while len(self._echecs) > self.taille_max:
+                self._echecs.popitem(last=False)
+
+    def lister(self, cle: str, depuis: float) -> list:
+        with self._verrou:
+            return [instant for instant in self._echecs.get(cle, ()) if instant > depuis]
+
+    def effacer(self, cle: str) -> None:
+        with self._verrou:
+            self._echecs.pop(cle, None)
+
+
+class LimiteurConnexions:
+    """Au plus `echecs_max` échecs par email sur une fenêtre glissante de `fenetre` secondes"""
+
+    def __init__(self, stockage: StockageTentatives, echecs_max: int = ECHECS_MAX, fenetre: float = FENETRE):
+        self.stockage = stockage
+        self.echecs_max = echecs_max
+        self.fenetre = fenetre
+
+    @staticmethod
+    def _cle(email: str) -> str:
+        return email.strip().lower()
+
+    def attente(self, email: str) -> Optional[float]:
+        """Secondes avant une nouvelle tentative si l'email est bloqué, sinon None"""
+        maintenant = time.time()
+        echecs = self.stockage.lister(self._cle(email), maintenant - self.fenetre)
+        if len(echecs) < self.echecs_max:
+            return None
+        # Débloqué quand le plus ancien des `echecs_max` derniers échecs sort de la fenêtre
+        return echecs[-self.echecs_max] + self.fenetre - maintenant
+
+    def enregistrer_echec(self, email: str) -> None:
+        self.stockage.ajouter(self._cle(email), time.time(), self.fenetre, self.echecs_max)
+
+    def reinitialiser(self, email: str) -> None:
+        self.stockage.effacer(self._cle(email))
+
+
+limiteur_connexions = LimiteurConnexions(StockageMemoire())
+
+
+def configurer_limiteur(stockage: StockageTentatives) -> None:
+    """Remplace le stockage du limiteur (ex : stockage partagé entre processus)"""
+    limiteur_connexions.stockage = stockage
+
+
+# Un seul thread : les écritures du journal sont faites hors requête, l'une après l'autre
+_journal = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal-connexions")
+
+
+def journaliser_echec(session_factory: Callable[[], Session], email: str) -> None:
+    """Planifie l'enregistrement d'un échec dans tentative_connexion (audit), sans attendre"""
+    _journal.submit(_ecrire_echec, session_factory, email, datetime.utcnow())
+
+
+def _ecrire_echec(session_factory: Callable[[], Session], email: str, date_tentative: datetime) -> None:
+    db = session_factory()
+    try:
+        db.add(TentativeConnexion(email=email, succes=False, date_tentative=date_tentative))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Journalisation de la tentative de connexion impossible : {e}", flush=True)
+    finally:
+        db.close()
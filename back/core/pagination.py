@@ -0,0 +1,91 @@
+"""
+Pagination par curseur (keyset)
+
+Les listes sont triées sur des colonnes dont la dernière est unique (ex : date_assignment,
+id_assignation). La page suivante reprend après la dernière ligne servie
+(WHERE (date, id) < (date, id) de la dernière ligne) au lieu d'un OFFSET qui relit
+toutes les lignes précédentes. Le format du corps de la réponse est inchangé ; le curseur
+de la page suivante et le total sont renvoyés en en-têtes (X-Curseur-Suivant, X-Total-Count).
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+LIMITE_DEFAUT = 50
+LIMITE_MAX = 200
+
+ENTETE_CURSEUR = "X-Curseur-Suivant"
+ENTETE_TOTAL = "X-Total-Count"
+
+
+def encoder_curseur(valeurs: Sequence[Any]) -> str:
+    brut = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in valeurs], default=str)
+    return base64.urlsafe_b64encode(brut.encode()).decode().rstrip("=")
+
+
+def decoder_curseur(curseur: str, colonnes: Sequence[Any]) -> List[Any]:
+    """Valeurs du curseur, converties au type Python de chaque colonne de tri"""
+    try:
+        brut = base64.urlsafe_b64decode(curseur + "=" * (-len(curseur) % 4))
+        valeurs = json.loads(brut)
+        if not isinstance(valeurs, list) or len(valeurs) != len(colonnes):
+            raise ValueError
+        resultat = []
+        for colonne, valeur in zip(colonnes, valeurs):
+            type_python = colonne.type.python_type
+            if valeur is None:
+                resultat.append(None)
+            elif type_python is datetime:
+                resultat.append(datetime.fromisoformat(valeur))
+            elif type_python is date:
+                resultat.append(date.fromisoformat(valeur))
+            elif type_python is Decimal:
+                resultat.append(Decimal(valeur))
+            else:
+                resultat.append(valeur)
+        return resultat
+    except (ValueError, TypeError, NotImplementedError):
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+
+def _apres(colonnes: Sequence[Any], valeurs: Sequence[Any], descendant: bool):
+    """(c1, c2, ...) < (v1, v2, ...) (ou >) développé en OR/AND, exploitable par les index"""
+    conditions = []
+    for i, (colonne, valeur) in enumerate(zip(colonnes, valeurs)):
+        egalites = [c == v for c, v in zip(colonnes[:i], valeurs[:i])]
+        conditions.append(and_(*egalites, colonne < valeur if descendant else colonne > valeur))
+    return or_(*conditions)
+
+
+def motif_prefixe(texte: str) -> str:
+    """Motif LIKE « commence par » (utilise les index), jokers de la saisie neutralisés"""
+    echappe = texte.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{echappe}%"
+
+
+def paginer(requete: Query, tri: Sequence[Any], response: Response, curseur: Optional[str] = None,
+            limite: Optional[int] = LIMITE_DEFAUT, avec_total: bool = True, descendant: bool = True) -> list:
+    """
+    Applique tri, curseur et limite à une requête projetée (qui doit sélectionner
+    les colonnes de tri) et renseigne les en-têtes de pagination.
+    `limite=None` renvoie toutes les lignes restantes (pas de curseur suivant).
+    """
+    if avec_total:
+        response.headers[ENTETE_TOTAL] = str(requete.order_by(None).count())
+    if curseur:
+        requete = requete.filter(_apres(tri, decoder_curseur(curseur, tri), descendant))
+
+    ordre = [colonne.desc() if descendant else colonne.asc() for colonne in tri]
+    if limite is None:
+        return requete.order_by(*ordre).all()
+    lignes = requete.order_by(*ordre).limit(limite + 1).all()
+    if len(lignes) > limite:
+        lignes = lignes[:limite]
+        response.headers[ENTETE_CURSEUR] = encoder_curseur([getattr(lignes[-1], c.key) for c in tri])
+    return lignes
@@ -56,6 +56,9 @@ def executer_migrations(engine):
         ("date_soumission", "DATETIME NULL"),
         ("commentaire_etudiant", "TEXT NULL"),
         ("fichier_path", "VARCHAR(255) NULL"),
+        ("fichier_nom", "VARCHAR(255) NULL"),
+        ("fichier_taille", "BIGINT NULL"),
+        ("fichier_sha256", "CHAR(64) NULL"),
         ("date_evaluation", "DATETIME NULL"),
         ("note", "NUMERIC(3, 1) NULL"),
         ("commentaire_formateur", "TEXT NULL")
@@ -75,16 +78,39 @@ def executer_migrations(engine):
             except Exception as e:
                 print(f"⚠️ Erreur lors de l'ajout de '{col_name}': {e}")
     
+    # Colonnes ajoutées à la table 'utilisateur'
+    colonnes_utilisateur = [
+        ("version_token", "INT NOT NULL DEFAULT 0")
+    ]
+
+    with engine.connect() as conn:
+        for col_name, col_def in colonnes_utilisateur:
+            try:
+                result = conn.execute(text(f"SHOW COLUMNS FROM utilisateur LIKE '{col_name}'"))
+                if not result.fetchone():
+                    print(f"➕ Ajout de la colonne '{col_name}' à la table 'utilisateur'...")
+                    conn.execute(text(f"ALTER TABLE utilisateur ADD COLUMN {col_name} {col_def}"))
+                    conn.commit()
+                else:
+                    print(f"✅ La colonne '{col_name}' existe déjà.")
+            except Exception as e:
+                print(f"⚠️ Erreur lors de l'ajout de '{col_name}': {e}")
+
     print("✨ Migrations des colonnes terminées.")
 
     # Migration pour les INDEX (pour la performance)
     print("🔄 Vérification des index de performance...")
     indexes_to_add = [
         ("utilisateur", "email", "idx_utilisateur_email"),
+        ("utilisateur", "nom, prenom", "idx_utilisateur_nom"),
         ("etudiant", "id_promotion", "idx_etudiant_promotion"),
         ("etudiant", "statut", "idx_etudiant_statut"),
         ("assignation", "statut", "idx_assignation_statut"),
-        ("espace_pedagogique", "id_formateur", "idx_espace_formateur")
+        ("assignation", "fichier_sha256", "ix_assignation_fichier_sha256"),
+        ("assignation", "date_assignment, id_assignation", "idx_assignation_date"),
+        ("espace_pedagogique", "id_formateur", "idx_espace_formateur"),
+        ("tentative_connexion", "email, date_tentative", "idx_tentative_email_date"),
+        ("email_outbox", "destinataire, modele", "idx_email_outbox_destinataire")
     ]
 
     with engine.connect() as conn:
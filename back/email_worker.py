@@ -0,0 +1,46 @@
+"""
+Worker d'envoi des emails : vide la table email_outbox par lots.
+
+Usage :
+    python email_worker.py                 # boucle continue
+    python email_worker.py --une-fois      # traite un seul lot puis s'arrête
+"""
+import argparse
+import asyncio
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database.database import Base, SessionLocal, engine
+import models  # noqa: F401 - enregistre la table email_outbox
+from utils.email_service import EmailService
+from utils.email_outbox import WorkerOutbox
+
+
+async def main(taille_lot: int, intervalle: float, une_fois: bool):
+    Base.metadata.create_all(bind=engine, tables=[models.EmailOutbox.__table__])
+    service = EmailService()
+    worker = WorkerOutbox(SessionLocal, service, taille_lot=taille_lot)
+    print(f"📬 Worker email démarré (lots de {taille_lot}, concurrence {service.concurrence_max})", flush=True)
+    try:
+        if une_fois:
+            print(f"📬 {await worker.traiter_lot()}", flush=True)
+        else:
+            await worker.executer(intervalle=intervalle)
+    finally:
+        await service.fermer()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Envoi des emails en attente dans la table email_outbox")
+    parser.add_argument("--taille-lot", type=int, default=int(os.getenv("EMAIL_OUTBOX_TAILLE_LOT", "50")))
+    parser.add_argument("--intervalle", type=float, default=float(os.getenv("EMAIL_OUTBOX_INTERVALLE", "2")))
+    parser.add_argument("--une-fois", action="store_true", help="Traiter un seul lot puis s'arrêter")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args.taille_lot, args.intervalle, args.une_fois))
+    except KeyboardInterrupt:
+        print("Worker email arrêté", flush=True)
@@ -0,0 +1,43 @@
+"""
+Ramasse-miettes des fichiers livrés : supprime de uploads/blobs les fichiers qui ne sont
+plus référencés par aucune assignation.
+
+Usage :
+    python gc_fichiers.py                       # délai de grâce de 24 h
+    python gc_fichiers.py --recompter           # recalcule d'abord les compteurs de références
+    python gc_fichiers.py --delai-grace 1
+"""
+import argparse
+from datetime import timedelta
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database.database import Base, SessionLocal, engine
+import models  # noqa: F401 - enregistre la table fichier_stocke
+from utils.stockage import collecter_fichiers, recompter_references, stockage_blobs
+
+
+def main(delai_grace: float, recompter: bool):
+    Base.metadata.create_all(bind=engine, tables=[models.FichierStocke.__table__])
+    db = SessionLocal()
+    try:
+        if recompter:
+            print(f"🔢 {recompter_references(db)} compteur(s) de références corrigé(s)", flush=True)
+        resultat = collecter_fichiers(db, stockage_blobs, timedelta(hours=delai_grace))
+        print(f"🧹 {resultat['supprimes']} fichier(s) sans référence, "
+              f"{resultat['orphelins']} fichier(s) orphelin(s) et "
+              f"{resultat['temporaires']} fichier(s) temporaire(s) supprimé(s)", flush=True)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suppression des fichiers livrés qui ne sont plus référencés")
+    parser.add_argument("--delai-grace", type=float, default=24,
+                        help="Âge minimum (heures) d'un fichier sans référence avant suppression")
+    parser.add_argument("--recompter", action="store_true",
+                        help="Recalculer les compteurs de références depuis les assignations")
+    args = parser.parse_args()
+    main(args.delai_grace, args.recompter)
@@ -90,6 +90,21 @@ def initialiser_systeme():
 # Lancer l'initialisation
 initialiser_systeme()
 
+# Numéro de nœud des identifiants générés, distinct pour chaque processus (workers)
+from utils.sequences import attribuer_noeud_identifiants
+
+def configurer_identifiants():
+    db = SessionLocal()
+    try:
+        print(f"OK Nœud des identifiants : {attribuer_noeud_identifiants(db)}")
+    except Exception as e:
+        db.rollback()
+        print(f"ATTENTION: numéro de nœud non attribué ({e}) ; définissez ID_NOEUD si plusieurs processus tournent")
+    finally:
+        db.close()
+
+configurer_identifiants()
+
 app = FastAPI(
     title="Système de Suivi de Projets",
     description="API pour la gestion et le suivi des projets étudiants",
@@ -116,7 +131,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Disposition", "Content-Length", "X-Filename"]
+    expose_headers=["Content-Disposition", "Content-Length", "X-Filename", "ETag", "Last-Modified", "Accept-Ranges", "Content-Range", "X-Total-Count", "X-Curseur-Suivant"]
 )
 
 # Inclure les routers
@@ -143,6 +158,30 @@ from routes import travaux
 app.include_router(travaux.router, prefix="/api/travaux", tags=["Travaux"])
 print("Router travaux chargé")
 
+# Worker email intégré (optionnel) : pour un déploiement sans processus email_worker.py séparé
+import asyncio
+import os
+from utils.email_service import email_service
+from utils.email_outbox import WorkerOutbox
+
+arret_worker_email = asyncio.Event()
+
+@app.on_event("startup")
+async def demarrer_worker_email():
+    if os.getenv("EMAIL_WORKER_INTEGRE", "false").lower() == "true":
+        worker = WorkerOutbox(SessionLocal, email_service)
+        app.state.tache_worker_email = asyncio.create_task(worker.executer(arret=arret_worker_email))
+        print("Worker email intégré démarré")
+
+@app.on_event("shutdown")
+async def fermer_connexions_email():
+    """Arrête le worker intégré et ferme le client HTTP partagé du service email"""
+    arret_worker_email.set()
+    tache = getattr(app.state, "tache_worker_email", None)
+    if tache:
+        await tache
+    await email_service.fermer()
+
 @app.get("/")
 def home():
     return {"message": "FastAPI fonctionne 🎉"}
\ No newline at end of file
@@ -13,7 +13,10 @@ from sqlalchemy import (
     ForeignKey,
     Enum as SAEnum,
     Numeric,
+    Integer,
+    BigInteger,
     UniqueConstraint,
+    Index,
 )
 from sqlalchemy.orm import relationship
 
@@ -44,6 +47,13 @@ class StatutAssignationEnum(str, Enum):
     NOTE = "NOTE"
 
 
+class StatutEmailEnum(str, Enum):
+    EN_ATTENTE = "EN_ATTENTE"
+    EN_COURS = "EN_COURS"
+    ENVOYE = "ENVOYE"
+    ECHEC = "ECHEC"  # Abandonné après le nombre maximal de tentatives (lettre morte)
+
+
 class Utilisateur(Base):
     __tablename__ = "utilisateur"
 
@@ -58,6 +68,7 @@ class Utilisateur(Base):
     token_activation = Column(String(255), nullable=True)
     date_expiration_token = Column(DateTime, nullable=True)
     mot_de_passe_temporaire = Column(Boolean, nullable=False, default=False)  # ← AJOUTÉ pour gérer le DE
+    version_token = Column(Integer, nullable=False, default=0)  # Incrémentée pour révoquer les JWT émis
 
     # Relations : un utilisateur a 0 ou 1 rôle spécifique
     etudiant = relationship("Etudiant", back_populates="utilisateur", uselist=False, cascade="all, delete-orphan")
@@ -201,6 +212,9 @@ class GroupeEtudiant(Base):
 
 class Assignation(Base):
     __tablename__ = "assignation"
+    __table_args__ = (
+        Index("idx_assignation_date", "date_assignment", "id_assignation"),  # Pagination par curseur
+    )
 
     id_assignation = Column(String(100), primary_key=True, nullable=False)
     id_etudiant = Column(String(100), ForeignKey("etudiant.id_etudiant"), nullable=False)
@@ -213,6 +227,9 @@ class Assignation(Base):
     date_soumission = Column(DateTime, nullable=True)
     commentaire_etudiant = Column(Text, nullable=True)
     fichier_path = Column(String(255), nullable=True)
+    fichier_nom = Column(String(255), nullable=True)
+    fichier_taille = Column(BigInteger, nullable=True)
+    fichier_sha256 = Column(String(64), nullable=True, index=True)
     
     # Champs d'évaluation (US 6)
     date_evaluation = Column(DateTime, nullable=True)
@@ -229,8 +246,49 @@ class Assignation(Base):
 
 class TentativeConnexion(Base):
     __tablename__ = "tentative_connexion"
+    __table_args__ = (Index("idx_tentative_email_date", "email", "date_tentative"),)
 
     id_tentative = Column(String(100), primary_key=True, nullable=False, default=lambda: secrets.token_urlsafe(16))
     email = Column(String(191), nullable=False)
     date_tentative = Column(DateTime, nullable=False, default=datetime.utcnow)
-    succes = Column(Boolean, nullable=False, default=False)
\ No newline at end of file
+    succes = Column(Boolean, nullable=False, default=False)
+
+
+class EmailOutbox(Base):
+    """File d'envoi des emails, alimentée dans la même transaction que le changement métier"""
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        Index("idx_email_outbox_statut_disponible", "statut", "date_disponible"),
+        Index("idx_email_outbox_destinataire", "destinataire", "modele"),
+    )
+
+    id_email = Column(Integer, primary_key=True, autoincrement=True)
+    modele = Column(String(50), nullable=False)  # Type de notification (ex: assignation_travail)
+    destinataire = Column(String(191), nullable=False)
+    parametres = Column(Text, nullable=True)  # JSON des variables du modèle, effacé après envoi
+    statut = Column(SAEnum(StatutEmailEnum), nullable=False, default=StatutEmailEnum.EN_ATTENTE)
+    tentatives = Column(Integer, nullable=False, default=0)
+    date_creation = Column(DateTime, nullable=False, default=datetime.utcnow)
+    date_disponible = Column(DateTime, nullable=False, default=datetime.utcnow)  # Prochain envoi possible
+    date_envoi = Column(DateTime, nullable=True)
+    derniere_erreur = Column(Text, nullable=True)
+
+
+class FichierStocke(Base):
+    """Fichier livré, stocké une seule fois par contenu (uploads/blobs) et partagé entre assignations"""
+    __tablename__ = "fichier_stocke"
+
+    sha256 = Column(String(64), primary_key=True)
+    taille = Column(BigInteger, nullable=False)
+    nb_references = Column(Integer, nullable=False, default=0)  # Assignations pointant vers ce fichier
+    date_creation = Column(DateTime, nullable=False, default=datetime.utcnow)
+    date_modification = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class CompteurSequence(Base):
+    """Dernier numéro attribué par séquence et par année (matricules, numéros d'employé)"""
+    __tablename__ = "compteur_sequence"
+
+    nom = Column(String(50), primary_key=True)  # Ex : matricule, numero_employe
+    annee = Column(Integer, primary_key=True)
+    valeur = Column(Integer, nullable=False, default=0)
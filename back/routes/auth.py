@@ -4,14 +4,17 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr, validator
 
-from models import Utilisateur, TentativeConnexion, RoleEnum
-from database.database import get_db
+from models import Utilisateur, RoleEnum
+from database.database import get_db, SessionLocal
 from core.auth import (
     generer_token_unique,
     initialiser_compte_de,
     verifier_tentatives_connexion,
-    generer_token_jwt
+    generer_token_utilisateur,
+    revoquer_tokens
 )
+from core.cache import invalider_identite
+from core.limiteur import journaliser_echec, limiteur_connexions
 from core.jwt import get_password_hash, verify_password
 
 router = APIRouter()
@@ -66,6 +69,16 @@ class ActivateAccountRequest(BaseModel):
         return v
 
 
+def _echec_connexion(email: str) -> HTTPException:
+    """Compte l'échec pour le limiteur et le journalise en base, sans attendre l'écriture"""
+    limiteur_connexions.enregistrer_echec(email)
+    journaliser_echec(SessionLocal, email)
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail={"code": "AUTH_01", "message": "Identifiants invalides"}
+    )
+
+
 @router.post("/login")
 def login(request: LoginRequest, db: Session = Depends(get_db)):
     """
@@ -75,11 +88,12 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
     initialiser_compte_de(db)
     
     # Étape 1: Vérifier les tentatives de connexion
-    erreur_tentatives = verifier_tentatives_connexion(db, request.email)
+    erreur_tentatives = verifier_tentatives_connexion(request.email)
     if erreur_tentatives:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=erreur_tentatives
+            detail=erreur_tentatives,
+            headers={"Retry-After": str(erreur_tentatives["attente"])}
         )
     
     # Étape 2: Rechercher l'utilisateur par email
@@ -99,18 +113,7 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
     
     # Étape 3: Vérifier si l'utilisateur existe et est actif
     if not utilisateur or not utilisateur.actif:
-        # Enregistrer la tentative échouée
-        tentative = TentativeConnexion(
-            email=request.email,
-            succes=False
-        )
-        db.add(tentative)
-        db.commit()
-        
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail={"code": "AUTH_01", "message": "Identifiants invalides"}
-        )
+        raise _echec_connexion(request.email)
     
     # Étape 4: Vérifier le mot de passe
     # Nettoyage préventif des espaces
@@ -123,26 +126,10 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
     print(f"Debug: Correspondance: {verify_password(request.mot_de_passe, utilisateur.mot_de_passe)}")
     
     if not verify_password(request.mot_de_passe, utilisateur.mot_de_passe):
-        # Enregistrer la tentative échouée
-        tentative = TentativeConnexion(
-            email=request.email,
-            succes=False
-        )
-        db.add(tentative)
-        db.commit()
-        
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail={"code": "AUTH_01", "message": "Identifiants invalides"}
-        )
+        raise _echec_connexion(request.email)
     
-    # Étape 5: Enregistrer la tentative réussie
-    tentative = TentativeConnexion(
-        email=request.email,
-        succes=True
-    )
-    db.add(tentative)
-    db.commit()
+    # Étape 5: Connexion réussie, les échecs précédents sont oubliés
+    limiteur_connexions.reinitialiser(request.email)
     
     # Étape 6: Vérifier si l'utilisateur doit changer son mot de passe temporaire
     if utilisateur.mot_de_passe_temporaire:
@@ -167,13 +154,7 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
         }
     
     # Étape 7: Générer le token JWT
-    token_jwt = generer_token_jwt({
-        "identifiant": utilisateur.identifiant,
-        "email": utilisateur.email,
-        "nom": utilisateur.nom,
-        "prenom": utilisateur.prenom,
-        "role": utilisateur.role
-    })
+    token_jwt = generer_token_utilisateur(db, utilisateur.identifiant)
     
     return {
         "statut": "SUCCESS",
@@ -215,16 +196,12 @@ def changer_mot_de_passe(request: ChangePasswordRequest, db: Session = Depends(g
     utilisateur.mot_de_passe_temporaire = False
     utilisateur.token_activation = None
     utilisateur.date_expiration_token = None
+    revoquer_tokens(utilisateur)
     db.commit()
+    invalider_identite(utilisateur.identifiant)
     
     # Étape 5: Générer le token JWT
-    token_jwt = generer_token_jwt({
-        "identifiant": utilisateur.identifiant,
-        "email": utilisateur.email,
-        "nom": utilisateur.nom,
-        "prenom": utilisateur.prenom,
-        "role": utilisateur.role
-    })
+    token_jwt = generer_token_utilisateur(db, utilisateur.identifiant)
     
     return {
         "statut": "SUCCESS",
@@ -278,13 +255,7 @@ def activer_compte(request: ActivateAccountRequest, db: Session = Depends(get_db
     db.commit()
     
     # Étape 6: Générer le token JWT
-    token_jwt = generer_token_jwt({
-        "identifiant": utilisateur.identifiant,
-        "email": utilisateur.email,
-        "nom": utilisateur.nom,
-        "prenom": utilisateur.prenom,
-        "role": utilisateur.role
-    })
+    token_jwt = generer_token_utilisateur(db, utilisateur.identifiant)
     
     return {
         "statut": "SUCCESS",
@@ -301,26 +272,14 @@ def activer_compte(request: ActivateAccountRequest, db: Session = Depends(get_db
 
 
 @router.post("/reset-tentatives")
-def reset_tentatives(request: ResetTentativesRequest, db: Session = Depends(get_db)):
+def reset_tentatives(request: ResetTentativesRequest):
     """
     Route temporaire pour réinitialiser les tentatives de connexion
+    (le journal des échecs en base est conservé)
     """
-    from datetime import datetime, timedelta
-
-    email = request.email
-
-    # Supprimer toutes les tentatives échouées pour cet email datant de moins de 15 minutes
-    date_limite = datetime.utcnow() - timedelta(minutes=15)
-
-    db.query(TentativeConnexion).filter(
-        TentativeConnexion.email == email,
-        TentativeConnexion.succes == False,
-        TentativeConnexion.date_tentative > date_limite
-    ).delete()
-
-    db.commit()
+    limiteur_connexions.reinitialiser(request.email)
 
-    return {"message": f"Tentatives de connexion réinitialisées pour {email}"}
+    return {"message": f"Tentatives de connexion réinitialisées pour {request.email}"}
 
 
 @router.post("/test-connexion")
@@ -428,7 +387,9 @@ def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db))
     utilisateur.mot_de_passe_temporaire = False
     utilisateur.token_activation = None
     utilisateur.date_expiration_token = None
+    revoquer_tokens(utilisateur)
     db.commit()
+    invalider_identite(utilisateur.identifiant)
     
     return {
         "message": "Mot de passe réinitialisé avec succès"
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, and_, distinct
 from datetime import datetime, date
 from typing import Dict, Any, List
 
 from database.database import get_db
-from core.auth import get_current_user
+from core.auth import get_current_user, get_current_principal, Principal
+from core.cache import obtenir_tableau_de_bord
+from utils.classement import cache_classements
+from utils.statistiques import calculer_tableau_de_bord_de
 from models import (
     Utilisateur, RoleEnum, Filiere, Matiere, Promotion, 
     Etudiant, Formateur, EspacePedagogique, Travail, 
@@ -29,135 +32,15 @@ def get_de_dashboard(
             detail="Accès réservé au Directeur d'Établissement"
         )
     
-    # 1. Statistiques générales
-    total_etudiants = db.query(Etudiant).count()
-    etudiants_actifs = db.query(Etudiant).filter(Etudiant.statut == StatutEtudiantEnum.ACTIF).count()
-    total_formateurs = db.query(Formateur).count()
-    total_filieres = db.query(Filiere).count()
-    total_promotions = db.query(Promotion).count()
-    total_espaces = db.query(EspacePedagogique).count()
-    total_travaux = db.query(Travail).count()
-    
-    # 2. Répartition des étudiants par filière
-    repartition_filieres = db.query(
-        Filiere.nom_filiere,
-        func.count(Etudiant.id_etudiant).label('nombre_etudiants')
-    ).join(
-        Promotion, Filiere.id_filiere == Promotion.id_filiere
-    ).join(
-        Etudiant, Promotion.id_promotion == Etudiant.id_promotion
-    ).group_by(Filiere.nom_filiere).all()
-    
-    # 3. Activité récente (derniers travaux créés)
-    travaux_recents = db.query(
-        Travail.titre,
-        Travail.date_creation,
-        Matiere.nom_matiere,
-        Promotion.libelle.label('promotion')
-    ).join(
-        EspacePedagogique, Travail.id_espace == EspacePedagogique.id_espace
-    ).join(
-        Matiere, EspacePedagogique.id_matiere == Matiere.id_matiere
-    ).join(
-        Promotion, EspacePedagogique.id_promotion == Promotion.id_promotion
-    ).order_by(Travail.date_creation.desc()).limit(5).all()
-    
-    # 4. Espaces pédagogiques sans formateur
-    espaces_sans_formateur = db.query(
-        EspacePedagogique.id_espace,
-        Matiere.nom_matiere,
-        Promotion.libelle.label('promotion')
-    ).join(
-        Matiere, EspacePedagogique.id_matiere == Matiere.id_matiere
-    ).join(
-        Promotion, EspacePedagogique.id_promotion == Promotion.id_promotion
-    ).filter(EspacePedagogique.id_formateur.is_(None)).all()
-    
-    # 5. Statistiques des travaux
-    travaux_en_cours = db.query(Assignation).filter(
-        Assignation.statut == StatutAssignationEnum.EN_COURS
-    ).count()
-    
-    travaux_rendus = db.query(Assignation).filter(
-        Assignation.statut == StatutAssignationEnum.RENDU
-    ).count()
-    
-    travaux_notes = db.query(Assignation).filter(
-        Assignation.statut == StatutAssignationEnum.NOTE
-    ).count()
-    
-    # 6. Promotions actives (année académique en cours)
-    annee_actuelle = datetime.now().year
-    promotions_actives = db.query(
-        Promotion.libelle,
-        Promotion.annee_academique,
-        Filiere.nom_filiere,
-        func.count(Etudiant.id_etudiant).label('nombre_etudiants')
-    ).join(
-        Filiere, Promotion.id_filiere == Filiere.id_filiere
-    ).outerjoin(
-        Etudiant, Promotion.id_promotion == Etudiant.id_promotion
-    ).filter(
-        Promotion.annee_academique.like(f"%{annee_actuelle}%")
-    ).group_by(
-        Promotion.id_promotion, Promotion.libelle, 
-        Promotion.annee_academique, Filiere.nom_filiere
-    ).all()
-    
-    return {
-        "statistiques_generales": {
-            "total_etudiants": total_etudiants,
-            "etudiants_actifs": etudiants_actifs,
-            "total_formateurs": total_formateurs,
-            "total_filieres": total_filieres,
-            "total_promotions": total_promotions,
-            "total_espaces": total_espaces,
-            "total_travaux": total_travaux
-        },
-        "repartition_filieres": [
-            {
-                "filiere": row.nom_filiere,
-                "nombre_etudiants": row.nombre_etudiants
-            }
-            for row in repartition_filieres
-        ],
-        "activite_recente": [
-            {
-                "titre": row.titre,
-                "date_creation": row.date_creation.isoformat(),
-                "matiere": row.nom_matiere,
-                "promotion": row.promotion
-            }
-            for row in travaux_recents
-        ],
-        "espaces_sans_formateur": [
-            {
-                "id_espace": row.id_espace,
-                "matiere": row.nom_matiere,
-                "promotion": row.promotion
-            }
-            for row in espaces_sans_formateur
-        ],
-        "statistiques_travaux": {
-            "en_cours": travaux_en_cours,
-            "rendus": travaux_rendus,
-            "notes": travaux_notes,
-            "total": travaux_en_cours + travaux_rendus + travaux_notes
-        },
-        "promotions_actives": [
-            {
-                "libelle": row.libelle,
-                "annee_academique": row.annee_academique,
-                "filiere": row.nom_filiere,
-                "nombre_etudiants": row.nombre_etudiants or 0
-            }
-            for row in promotions_actives
-        ]
-    }
+    # Compteurs en une requête, puis répartition, activité récente et espaces sans formateur
+    return obtenir_tableau_de_bord(
+        RoleEnum.DE, current_user.identifiant,
+        lambda: calculer_tableau_de_bord_de(db)
+    )
 
 @router.get("/formateur")
 def get_formateur_dashboard(
-    current_user: Utilisateur = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """
@@ -169,8 +52,17 @@ def get_formateur_dashboard(
             detail="Accès réservé aux Formateurs"
         )
     
-    # Récupérer le formateur
-    formateur = db.query(Formateur).filter(Formateur.identifiant == current_user.identifiant).first()
+    return obtenir_tableau_de_bord(
+        RoleEnum.FORMATEUR, current_user.identifiant,
+        lambda: _calculer_tableau_de_bord_formateur(db, current_user)
+    )
+
+def _calculer_tableau_de_bord_formateur(db: Session, current_user: Principal) -> Dict[str, Any]:
+    """Calcule le tableau de bord du formateur (hors cache)"""
+    # Récupérer le formateur (identifiant issu du token) et sa matière
+    formateur = db.query(Formateur).options(
+        joinedload(Formateur.matiere)
+    ).filter(Formateur.id_formateur == current_user.id_formateur).first()
     if not formateur:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -337,7 +229,7 @@ def get_formateur_dashboard(
 
 @router.get("/etudiant")
 def get_etudiant_dashboard(
-    current_user: Utilisateur = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """
@@ -349,8 +241,17 @@ def get_etudiant_dashboard(
             detail="Accès réservé aux Étudiants"
         )
     
-    # Récupérer l'étudiant
-    etudiant = db.query(Etudiant).filter(Etudiant.identifiant == current_user.identifiant).first()
+    return obtenir_tableau_de_bord(
+        RoleEnum.ETUDIANT, current_user.identifiant,
+        lambda: _calculer_tableau_de_bord_etudiant(db, current_user)
+    )
+
+def _calculer_tableau_de_bord_etudiant(db: Session, current_user: Principal) -> Dict[str, Any]:
+    """Calcule le tableau de bord de l'étudiant (hors cache)"""
+    # Récupérer l'étudiant (identifiant issu du token) et sa promotion
+    etudiant = db.query(Etudiant).options(
+        joinedload(Etudiant.promotion)
+    ).filter(Etudiant.id_etudiant == current_user.id_etudiant).first()
     if not etudiant:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -393,12 +294,15 @@ def get_etudiant_dashboard(
 
 @router.get("/etudiant/classement")
 def get_classement_promotion(
-    current_user: Utilisateur = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db)
 ):
     """
     Classement général de la promotion de l'étudiant (US 11.1)
-    Calcule la moyenne de chaque étudiant et retourne le classement
+    Servi depuis l'instantané de la promotion ; l'ETag permet au client
+    de recevoir un 304 tant que le classement n'a pas changé
     """
     if current_user.role != RoleEnum.ETUDIANT:
         raise HTTPException(
@@ -406,56 +310,33 @@ def get_classement_promotion(
             detail="Accès réservé aux Étudiants"
         )
     
-    # Récupérer l'étudiant actuel
-    etudiant_actuel = db.query(Etudiant).filter(
-        Etudiant.identifiant == current_user.identifiant
-    ).first()
-    
-    if not etudiant_actuel or not etudiant_actuel.id_promotion:
+    # Étudiant et promotion issus du token
+    if not current_user.id_etudiant or not current_user.id_promotion:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Profil étudiant ou promotion non trouvé"
         )
     
-    # Récupérer tous les étudiants de la même promotion
-    etudiants_promotion = db.query(Etudiant).filter(
-        Etudiant.id_promotion == etudiant_actuel.id_promotion,
-        Etudiant.statut == StatutEtudiantEnum.ACTIF
-    ).all()
+    # Moyennes, nombre de notes et rangs de toute la promotion (instantané partagé)
+    instantane = cache_classements.obtenir(db, current_user.id_promotion)
     
-    # Calculer la moyenne pour chaque étudiant
-    classement = []
-    for etudiant in etudiants_promotion:
-        # Récupérer toutes les notes de l'étudiant
-        notes = db.query(Assignation.note).filter(
-            Assignation.id_etudiant == etudiant.id_etudiant,
-            Assignation.statut == StatutAssignationEnum.NOTE,
-            Assignation.note.isnot(None)
-        ).all()
-        
-        if notes:
-            moyenne = sum(float(note[0]) for note in notes) / len(notes)
-            nombre_travaux_notes = len(notes)
-        else:
-            moyenne = 0.0
-            nombre_travaux_notes = 0
-        
-        classement.append({
-            "id_etudiant": etudiant.id_etudiant,
-            "nom": etudiant.utilisateur.nom,
-            "prenom": etudiant.utilisateur.prenom,
-            "matricule": etudiant.matricule,
-            "moyenne": round(moyenne, 2),
-            "nombre_travaux_notes": nombre_travaux_notes,
-            "est_moi": etudiant.id_etudiant == etudiant_actuel.id_etudiant
-        })
+    etag = f'"{instantane.etag}-{current_user.id_etudiant}"'
+    entetes_cache = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=entetes_cache)
+    response.headers.update(entetes_cache)
     
-    # Trier par moyenne décroissante
-    classement.sort(key=lambda x: x["moyenne"], reverse=True)
+    promotion = db.get(Promotion, current_user.id_promotion)
+    if not promotion:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profil étudiant ou promotion non trouvé"
+        )
     
-    # Ajouter le rang
-    for index, item in enumerate(classement, start=1):
-        item["rang"] = index
+    classement = [
+        {**item, "est_moi": item["id_etudiant"] == current_user.id_etudiant}
+        for item in instantane.classement
+    ]
     
     # Trouver le rang de l'étudiant actuel
     mon_rang = next(
@@ -469,8 +350,8 @@ def get_classement_promotion(
     )
     
     return {
-        "promotion": etudiant_actuel.promotion.libelle,
-        "annee_academique": etudiant_actuel.promotion.annee_academique,
+        "promotion": promotion.libelle,
+        "annee_academique": promotion.annee_academique,
         "mon_rang": mon_rang,
         "ma_moyenne": ma_moyenne,
         "total_etudiants": len(classement),
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
@@ -7,10 +8,13 @@ from pydantic import BaseModel
 from database.database import get_db
 from models import (
     Utilisateur, Formateur, Etudiant, Filiere, Promotion,
-    EspacePedagogique, Matiere, Inscription, RoleEnum
+    EspacePedagogique, Matiere, Inscription, Travail, Assignation,
+    RoleEnum, StatutAssignationEnum
 )
-from core.auth import get_current_user
+from core.auth import get_current_user, get_current_principal, Principal
+from core.cache import invalider_tableaux_de_bord
 from utils.generators import generer_identifiant_unique
+from utils.inscriptions import inscrire_etudiants
 import secrets
 
 router = APIRouter()
@@ -26,7 +30,9 @@ class AssignFormateurRequest(BaseModel):
     id_formateur: Optional[str] = None
 
 class AddEtudiantsRequest(BaseModel):
-    etudiants_ids: List[str]
+    etudiants_ids: List[str] = []
+    # Inscrit en plus tous les étudiants de cette promotion
+    id_promotion: Optional[str] = None
 
 # ==================== ROUTES DE ====================
 
@@ -79,6 +85,8 @@ async def creer_espace_pedagogique(
     db.commit()
     db.refresh(espace)
     
+    invalider_tableaux_de_bord(RoleEnum.DE)
+    
     return {
         "message": "Espace pédagogique créé avec succès",
         "espace": {
@@ -107,19 +115,38 @@ async def lister_espaces_pedagogiques(
             detail="Accès réservé au DE"
         )
     
-    espaces = db.query(EspacePedagogique).all()
+    # Comptages groupés (inscriptions et travaux par espace)
+    nb_inscriptions = db.query(
+        Inscription.id_espace,
+        func.count(Inscription.id_inscription).label('nb_etudiants')
+    ).group_by(Inscription.id_espace).subquery()
+    
+    nb_travaux = db.query(
+        Travail.id_espace,
+        func.count(Travail.id_travail).label('nb_travaux')
+    ).group_by(Travail.id_espace).subquery()
+    
+    # Une seule requête : espaces + matière, promotion, filière, formateur et comptages
+    espaces = db.query(
+        EspacePedagogique,
+        func.coalesce(nb_inscriptions.c.nb_etudiants, 0),
+        func.coalesce(nb_travaux.c.nb_travaux, 0)
+    ).outerjoin(
+        nb_inscriptions, nb_inscriptions.c.id_espace == EspacePedagogique.id_espace
+    ).outerjoin(
+        nb_travaux, nb_travaux.c.id_espace == EspacePedagogique.id_espace
+    ).options(
+        joinedload(EspacePedagogique.matiere),
+        joinedload(EspacePedagogique.promotion).joinedload(Promotion.filiere),
+        joinedload(EspacePedagogique.formateur).joinedload(Formateur.utilisateur)
+    ).all()
     
     result = []
-    for espace in espaces:
-        # Récupérer les informations du formateur assigné
+    for espace, nb_etudiants, nb_travaux_espace in espaces:
+        # Informations du formateur assigné
         formateur_info = "Non assigné"
-        if espace.id_formateur:
-            formateur = db.query(Formateur).filter(Formateur.id_formateur == espace.id_formateur).first()
-            if formateur and formateur.utilisateur:
-                formateur_info = f"{formateur.utilisateur.prenom} {formateur.utilisateur.nom}"
-        
-        # Compter les étudiants inscrits
-        nb_etudiants = db.query(Inscription).filter(Inscription.id_espace == espace.id_espace).count()
+        if espace.formateur and espace.formateur.utilisateur:
+            formateur_info = f"{espace.formateur.utilisateur.prenom} {espace.formateur.utilisateur.nom}"
         
         result.append({
             "id_espace": espace.id_espace,
@@ -132,7 +159,7 @@ async def lister_espaces_pedagogiques(
             "filiere": espace.promotion.filiere.nom_filiere if (espace.promotion and espace.promotion.filiere) else "Inconnue",
             "formateur": formateur_info,
             "nb_etudiants": nb_etudiants,
-            "nb_travaux": 0,
+            "nb_travaux": nb_travaux_espace,
             "date_creation": espace.date_creation.isoformat() if espace.date_creation else None
         })
     
@@ -173,6 +200,10 @@ async def assigner_formateur_espace(
 
     db.commit()
     
+    # L'ancien et le nouveau formateur voient leurs espaces changer
+    invalider_tableaux_de_bord(RoleEnum.DE)
+    invalider_tableaux_de_bord(RoleEnum.FORMATEUR)
+    
     return {"message": "Formateur mis à jour avec succès"}
 
 @router.post("/{id_espace}/etudiants")
@@ -190,29 +221,16 @@ async def ajouter_etudiants_espace(
     if not espace:
         raise HTTPException(status_code=404, detail="Espace non trouvé")
 
-    count = 0
-    for id_etudiant in data.etudiants_ids:
-        # Vérifier si déjà inscrit
-        exists = db.query(Inscription).filter(
-            Inscription.id_espace == id_espace,
-            Inscription.id_etudiant == id_etudiant
-        ).first()
-        
-        if not exists:
-            # Vérifier que l'étudiant existe
-            etudiant = db.query(Etudiant).filter(Etudiant.id_etudiant == id_etudiant).first()
-            if etudiant:
-                inscription = Inscription(
-                    id_inscription=generer_identifiant_unique("INS"),
-                    id_espace=id_espace,
-                    id_etudiant=id_etudiant,
-                    date_inscription=datetime.utcnow()
-                )
-                db.add(inscription)
-                count += 1
-    
+    rapport = inscrire_etudiants(db, id_espace, data.etudiants_ids, data.id_promotion)
     db.commit()
-    return {"message": f"{count} étudiant(s) ajouté(s) avec succès"}
+    
+    # Le nombre d'étudiants de l'espace change pour son formateur
+    if rapport["ajoutes"]:
+        invalider_tableaux_de_bord(RoleEnum.FORMATEUR)
+    return {
+        "message": f"{rapport['ajoutes']} étudiant(s) ajouté(s) avec succès",
+        **rapport
+    }
 
 @router.get("/promotion/{id_promotion}/etudiants")
 async def lister_etudiants_candidats(
@@ -246,15 +264,18 @@ async def consulter_statistiques_espace(
     current_user: Utilisateur = Depends(get_current_user)
 ):
     """Consulter les statistiques détaillées d'un espace pédagogique (DE ou Formateur assigné)"""
-    # Vérifier que l'espace existe
-    espace = db.query(EspacePedagogique).filter(EspacePedagogique.id_espace == id_espace).first()
+    # Vérifier que l'espace existe (matière, promotion, filière et formateur chargés d'un coup)
+    espace = db.query(EspacePedagogique).options(
+        joinedload(EspacePedagogique.matiere),
+        joinedload(EspacePedagogique.promotion).joinedload(Promotion.filiere),
+        joinedload(EspacePedagogique.formateur).joinedload(Formateur.utilisateur)
+    ).filter(EspacePedagogique.id_espace == id_espace).first()
     if not espace:
         raise HTTPException(status_code=404, detail="Espace pédagogique non trouvé")
 
     # Vérifier les permissions
     if current_user.role == RoleEnum.FORMATEUR:
-        formateur = db.query(Formateur).filter(Formateur.identifiant == current_user.identifiant).first()
-        if not formateur or espace.id_formateur != formateur.id_formateur:
+        if not espace.formateur or espace.formateur.identifiant != current_user.identifiant:
             raise HTTPException(
                 status_code=403, 
                 detail="Vous n'êtes pas le formateur assigné à cet espace"
@@ -264,18 +285,18 @@ async def consulter_statistiques_espace(
 
     # Informations générales de l'espace
     formateur_info = None
-    if espace.id_formateur:
-        formateur = db.query(Formateur).filter(Formateur.id_formateur == espace.id_formateur).first()
-        if formateur and formateur.utilisateur:
-            formateur_info = {
-                "nom": formateur.utilisateur.nom,
-                "prenom": formateur.utilisateur.prenom,
-                "email": formateur.utilisateur.email,
-                "numero_employe": formateur.numero_employe
-            }
+    if espace.formateur and espace.formateur.utilisateur:
+        formateur_info = {
+            "nom": espace.formateur.utilisateur.nom,
+            "prenom": espace.formateur.utilisateur.prenom,
+            "email": espace.formateur.utilisateur.email,
+            "numero_employe": espace.formateur.numero_employe
+        }
 
     # Statistiques des étudiants inscrits
-    inscriptions = db.query(Inscription).filter(Inscription.id_espace == id_espace).all()
+    inscriptions = db.query(Inscription).options(
+        joinedload(Inscription.etudiant).joinedload(Etudiant.utilisateur)
+    ).filter(Inscription.id_espace == id_espace).all()
     nb_etudiants_inscrits = len(inscriptions)
     
     etudiants_details = []
@@ -291,63 +312,54 @@ async def consulter_statistiques_espace(
                 "statut": inscription.etudiant.statut
             })
 
-    # Statistiques des travaux (si le modèle Travail existe)
-    try:
-        from models import Travail, Assignation, StatutAssignationEnum
-        
-        travaux = db.query(Travail).filter(Travail.id_espace == id_espace).all()
-        nb_travaux = len(travaux)
-        
-        # Statistiques des assignations
-        assignations_stats = {
-            "total": 0,
-            "assignees": 0,
-            "en_cours": 0,
-            "rendues": 0,
-            "notees": 0
-        }
-        
-        travaux_details = []
-        for travail in travaux:
-            assignations = db.query(Assignation).filter(Assignation.id_travail == travail.id_travail).all()
-            
-            assignations_travail = {
-                "total": len(assignations),
-                "assignees": len([a for a in assignations if a.statut == StatutAssignationEnum.ASSIGNE]),
-                "en_cours": len([a for a in assignations if a.statut == StatutAssignationEnum.EN_COURS]),
-                "rendues": len([a for a in assignations if a.statut == StatutAssignationEnum.RENDU]),
-                "notees": len([a for a in assignations if a.statut == StatutAssignationEnum.NOTE])
-            }
-            
-            assignations_stats["total"] += assignations_travail["total"]
-            assignations_stats["assignees"] += assignations_travail["assignees"]
-            assignations_stats["en_cours"] += assignations_travail["en_cours"]
-            assignations_stats["rendues"] += assignations_travail["rendues"]
-            assignations_stats["notees"] += assignations_travail["notees"]
-            
-            travaux_details.append({
-                        "id_travail": travail.id_travail,
-                        "id_espace": travail.id_espace,
-                        "titre": travail.titre,
-                        "description": travail.description,
-                        "type_travail": travail.type_travail,
-                        "date_creation": travail.date_creation.isoformat(),
-                        "date_echeance": travail.date_echeance.isoformat() if travail.date_echeance else None,
-                        "note_max": float(travail.note_max) if travail.note_max else None,
-                        "assignations": assignations_travail
-                    })
-            
-    except ImportError:
-        # Si les modèles Travail/Assignation n'existent pas encore
-        nb_travaux = 0
-        assignations_stats = {
-            "total": 0,
-            "assignees": 0,
-            "en_cours": 0,
-            "rendues": 0,
-            "notees": 0
+    # Statistiques des travaux
+    travaux = db.query(Travail).filter(Travail.id_espace == id_espace).all()
+    nb_travaux = len(travaux)
+    
+    # Nombre d'assignations par (travail, statut) en une seule requête groupée
+    comptes_statuts = db.query(
+        Assignation.id_travail,
+        Assignation.statut,
+        func.count(Assignation.id_assignation).label('nombre')
+    ).join(
+        Travail, Assignation.id_travail == Travail.id_travail
+    ).filter(
+        Travail.id_espace == id_espace
+    ).group_by(Assignation.id_travail, Assignation.statut).all()
+    
+    cles_statuts = {
+        StatutAssignationEnum.ASSIGNE: "assignees",
+        StatutAssignationEnum.EN_COURS: "en_cours",
+        StatutAssignationEnum.RENDU: "rendues",
+        StatutAssignationEnum.NOTE: "notees"
+    }
+    
+    def compteurs_vides():
+        return {"total": 0, "assignees": 0, "en_cours": 0, "rendues": 0, "notees": 0}
+    
+    # Statistiques des assignations
+    assignations_stats = compteurs_vides()
+    assignations_par_travail = {}
+    for row in comptes_statuts:
+        compteurs = assignations_par_travail.setdefault(row.id_travail, compteurs_vides())
+        for cible in (compteurs, assignations_stats):
+            cible["total"] += row.nombre
+            cible[cles_statuts[row.statut]] += row.nombre
+    
+    travaux_details = [
+        {
+            "id_travail": travail.id_travail,
+            "id_espace": travail.id_espace,
+            "titre": travail.titre,
+            "description": travail.description,
+            "type_travail": travail.type_travail,
+            "date_creation": travail.date_creation.isoformat(),
+            "date_echeance": travail.date_echeance.isoformat() if travail.date_echeance else None,
+            "note_max": float(travail.note_max) if travail.note_max else None,
+            "assignations": assignations_par_travail.get(travail.id_travail, compteurs_vides())
         }
-        travaux_details = []
+        for travail in travaux
+    ]
 
     return {
         "espace": {
@@ -379,7 +391,7 @@ async def consulter_statistiques_espace(
 async def lister_etudiants_espace(
     id_espace: str,
     db: Session = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """Lister les étudiants inscrits dans un espace spécifique (DE ou Formateur assigné)"""
     
@@ -390,8 +402,7 @@ async def lister_etudiants_espace(
     
     # Vérifier les permissions
     if current_user.role == RoleEnum.FORMATEUR:
-        formateur = db.query(Formateur).filter(Formateur.identifiant == current_user.identifiant).first()
-        if not formateur or espace.id_formateur != formateur.id_formateur:
+        if not current_user.id_formateur or espace.id_formateur != current_user.id_formateur:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Vous n'êtes pas le formateur assigné à cet espace"
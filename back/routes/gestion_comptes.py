@@ -1,24 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Response, UploadFile, status, BackgroundTasks
 from fastapi.background import BackgroundTasks as FastBackgroundTasks  # Pour être sûr
 from sqlalchemy.orm import Session
+from sqlalchemy import or_
+import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from database.database import get_db
 from models import Utilisateur, Formateur, Etudiant, Promotion, Filiere, Matiere, RoleEnum, StatutEtudiantEnum
 import models
-from core.auth import get_password_hash as hash_password, get_current_user
+from core.auth import get_password_hash as hash_password, get_current_user, revoquer_tokens
+from core.cache import invalider_tableaux_de_bord, invalider_identite
+from core.pagination import motif_prefixe, paginer
 from utils.generators import (
     generer_identifiant_unique, 
     generer_mot_de_passe_aleatoire, 
-    generer_token_activation,
-    generer_matricule_unique,
-    generer_numero_employe
+    generer_token_activation
 )
+from utils.sequences import allouer_matricules, allouer_numeros_employe
 from utils.email_service import email_service
+from utils.email_outbox import mettre_en_file
+from utils.classement import cache_classements
+from utils.import_etudiants import FormatImportInvalide, ImportEtudiants, lire_lignes
 
 router = APIRouter()
 
+# Les listes de comptes alimentent aussi des menus déroulants : sans `limite`, tous les
+# comptes sont renvoyés ; avec `limite`, la liste est paginée par curseur
+LIMITE_COMPTES_MAX = 1000
+
 # Schémas Pydantic pour la validation
 from pydantic import BaseModel, EmailStr
 
@@ -31,7 +41,6 @@ class FormateurCreate(BaseModel):
 @router.post("/creer-formateur", status_code=status.HTTP_201_CREATED)
 async def creer_compte_formateur(
     formateur_data: FormateurCreate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: Utilisateur = Depends(get_current_user)
 ):
@@ -53,7 +62,7 @@ async def creer_compte_formateur(
     identifiant = generer_identifiant_unique("FORMATEUR")
     mot_de_passe = generer_mot_de_passe_aleatoire()
     id_formateur = generer_identifiant_unique("FORMATEUR")
-    numero_employe = generer_numero_employe()
+    numero_employe = allouer_numeros_employe(db)[0]
 
     # Hacher le mot de passe
     mot_de_passe_hache = hash_password(mot_de_passe)
@@ -87,32 +96,29 @@ async def creer_compte_formateur(
     try:
         db.add(nouvel_utilisateur)
         db.add(nouveau_formateur)
+        # Email avec identifiants, enregistré dans la même transaction que le compte
+        mettre_en_file(
+            db, "creation_compte", formateur_data.email,
+            prenom=formateur_data.prenom,
+            email=formateur_data.email,
+            mot_de_passe=mot_de_passe,
+            role="FORMATEUR"
+        )
         db.commit()
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     
-    # Tracé pour le débogage en production
-    print(f"DEBUG: Planification de l'envoi d'email pour {formateur_data.email}...", flush=True)
+    invalider_tableaux_de_bord(RoleEnum.DE)
     
-    # Envoi de l'email en tâche de fond pour ne pas bloquer l'interface
-    background_tasks.add_task(
-        email_service.envoyer_email_creation_compte,
-        destinataire=formateur_data.email,
-        prenom=formateur_data.prenom,
-        email=formateur_data.email,
-        mot_de_passe=mot_de_passe,
-        role="FORMATEUR"
-    )
-    
-    return {"message": "Succès", "identifiant": identifiant, "version": "v1.2-background-fix"}
+    return {"message": "Succès", "identifiant": identifiant}
 
 
 @router.post("/test-email")
 async def test_email_direct(destinataire: str, db: Session = Depends(get_db)):
-    """Route de test pour vérifier l'envoi d'email en direct (synchrone)"""
+    """Route de test pour vérifier l'envoi d'email en direct (attendu avant la réponse)"""
     print(f"TEST: Tentative d'envoi direct à {destinataire}...", flush=True)
-    success = email_service.envoyer_email_creation_compte(
+    success = await email_service.envoyer_email_creation_compte(
         destinataire=destinataire,
         prenom="Test",
         email=destinataire,
@@ -210,10 +216,20 @@ async def lister_matieres(
 
 @router.get("/formateurs")
 async def lister_formateurs(
+    response: Response,
+    recherche: Optional[str] = Query(None, description="Début du nom, du prénom ou de l'email"),
+    id_matiere: Optional[str] = None,
+    actif: Optional[bool] = None,
+    curseur: Optional[str] = None,
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_COMPTES_MAX),
+    avec_total: bool = True,
     db: Session = Depends(get_db),
     current_user: Utilisateur = Depends(get_current_user)
 ):
-    """Liste tous les formateurs disponibles"""
+    """
+    Liste les formateurs par ordre alphabétique ; paginée par curseur si `limite`
+    est fourni (en-têtes X-Curseur-Suivant et X-Total-Count)
+    """
     
     if current_user.role != RoleEnum.DE:
         raise HTTPException(
@@ -221,30 +237,60 @@ async def lister_formateurs(
             detail="Seul un DE peut accéder à cette information"
         )
     
-    formateurs = db.query(Formateur).join(Utilisateur).all()
+    requete = db.query(
+        Formateur.id_formateur, Formateur.id_matiere, Matiere.nom_matiere,
+        Utilisateur.nom, Utilisateur.prenom, Utilisateur.email, Utilisateur.actif
+    ).join(Utilisateur, Utilisateur.identifiant == Formateur.identifiant) \
+     .outerjoin(Matiere, Matiere.id_matiere == Formateur.id_matiere)
+    if recherche:
+        motif = motif_prefixe(recherche)
+        requete = requete.filter(or_(
+            Utilisateur.nom.like(motif, escape="\\"),
+            Utilisateur.prenom.like(motif, escape="\\"),
+            Utilisateur.email.like(motif, escape="\\")
+        ))
+    if id_matiere:
+        requete = requete.filter(Formateur.id_matiere == id_matiere)
+    if actif is not None:
+        requete = requete.filter(Utilisateur.actif == actif)
+
+    formateurs = paginer(
+        requete, (Utilisateur.nom, Utilisateur.prenom, Formateur.id_formateur), response,
+        curseur=curseur, limite=limite, avec_total=avec_total, descendant=False
+    )
     
     return {
         "formateurs": [
             {
                 "id_formateur": f.id_formateur,
-                "nom": f.utilisateur.nom,
-                "prenom": f.utilisateur.prenom,
-                "email": f.utilisateur.email,
-                "telephone": getattr(f.utilisateur, 'telephone', None),
-                "actif": f.utilisateur.actif,
+                "nom": f.nom,
+                "prenom": f.prenom,
+                "email": f.email,
+                "telephone": None,
+                "actif": f.actif,
                 "id_matiere": f.id_matiere,
-                "nom_matiere": f.matiere.nom_matiere if f.matiere else None,
-                "specialite": f.matiere.nom_matiere if f.matiere else None
+                "nom_matiere": f.nom_matiere,
+                "specialite": f.nom_matiere
             } for f in formateurs
         ]
     }
 
 @router.get("/etudiants")
 async def lister_etudiants(
+    response: Response,
+    recherche: Optional[str] = Query(None, description="Début du nom, du prénom, de l'email ou du matricule"),
+    id_promotion: Optional[str] = None,
+    statut: Optional[StatutEtudiantEnum] = None,
+    curseur: Optional[str] = None,
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_COMPTES_MAX),
+    avec_total: bool = True,
     db: Session = Depends(get_db),
     current_user: Utilisateur = Depends(get_current_user)
 ):
-    """Liste tous les étudiants disponibles"""
+    """
+    Liste les étudiants par ordre alphabétique ; paginée par curseur si `limite`
+    est fourni (en-têtes X-Curseur-Suivant et X-Total-Count)
+    """
     
     if current_user.role != RoleEnum.DE:
         raise HTTPException(
@@ -252,20 +298,43 @@ async def lister_etudiants(
             detail="Seul un DE peut accéder à cette information"
         )
     
-    etudiants = db.query(Etudiant).join(Utilisateur).join(Promotion).join(Filiere).all()
+    requete = db.query(
+        Etudiant.id_etudiant, Etudiant.matricule, Etudiant.date_inscription, Etudiant.statut,
+        Utilisateur.nom, Utilisateur.prenom, Utilisateur.email, Utilisateur.actif,
+        Promotion.libelle, Filiere.nom_filiere
+    ).join(Utilisateur, Utilisateur.identifiant == Etudiant.identifiant) \
+     .join(Promotion, Promotion.id_promotion == Etudiant.id_promotion) \
+     .join(Filiere, Filiere.id_filiere == Promotion.id_filiere)
+    if recherche:
+        motif = motif_prefixe(recherche)
+        requete = requete.filter(or_(
+            Utilisateur.nom.like(motif, escape="\\"),
+            Utilisateur.prenom.like(motif, escape="\\"),
+            Utilisateur.email.like(motif, escape="\\"),
+            Etudiant.matricule.like(motif, escape="\\")
+        ))
+    if id_promotion:
+        requete = requete.filter(Etudiant.id_promotion == id_promotion)
+    if statut:
+        requete = requete.filter(Etudiant.statut == statut)
+
+    etudiants = paginer(
+        requete, (Utilisateur.nom, Utilisateur.prenom, Etudiant.id_etudiant), response,
+        curseur=curseur, limite=limite, avec_total=avec_total, descendant=False
+    )
     
     return {
         "etudiants": [
             {
                 "id_etudiant": e.id_etudiant,
-                "nom": e.utilisateur.nom,
-                "prenom": e.utilisateur.prenom,
-                "email": e.utilisateur.email,
-                "telephone": getattr(e.utilisateur, 'telephone', None),
-                "actif": e.utilisateur.actif,
+                "nom": e.nom,
+                "prenom": e.prenom,
+                "email": e.email,
+                "telephone": None,
+                "actif": e.actif,
                 "matricule": e.matricule,
-                "promotion": e.promotion.libelle,
-                "filiere": e.promotion.filiere.nom_filiere,
+                "promotion": e.libelle,
+                "filiere": e.nom_filiere,
                 "date_inscription": e.date_inscription.isoformat() if e.date_inscription else None,
                 "statut": e.statut
             } for e in etudiants
@@ -281,7 +350,6 @@ class EtudiantCreate(BaseModel):
 @router.post("/creer-etudiant", status_code=status.HTTP_201_CREATED)
 async def creer_compte_etudiant(
     etudiant_data: EtudiantCreate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: Utilisateur = Depends(get_current_user)
 ):
@@ -314,7 +382,7 @@ async def creer_compte_etudiant(
     identifiant = generer_identifiant_unique("ETUDIANT")
     mot_de_passe = generer_mot_de_passe_aleatoire()
     id_etudiant = generer_identifiant_unique("ETUDIANT")
-    matricule = generer_matricule_unique()
+    matricule = allouer_matricules(db)[0]
 
     # Hacher le mot de passe
     mot_de_passe_hache = hash_password(mot_de_passe)
@@ -355,6 +423,14 @@ async def creer_compte_etudiant(
     try:
         db.add(nouvel_utilisateur)
         db.add(nouvel_etudiant)
+        # 6. Email avec identifiants, enregistré dans la même transaction que le compte
+        mettre_en_file(
+            db, "creation_compte", etudiant_data.email,
+            prenom=etudiant_data.prenom,
+            email=etudiant_data.email,
+            mot_de_passe=mot_de_passe,
+            role="ETUDIANT"
+        )
         db.commit()
         db.refresh(nouvel_utilisateur)
         db.refresh(nouvel_etudiant)
@@ -365,15 +441,9 @@ async def creer_compte_etudiant(
             detail=f"Erreur lors de la création du compte: {str(e)}"
         )
     
-    # 6. Envoi email avec identifiants en tâche de fond
-    background_tasks.add_task(
-        email_service.envoyer_email_creation_compte,
-        destinataire=etudiant_data.email,
-        prenom=etudiant_data.prenom,
-        email=etudiant_data.email,
-        mot_de_passe=mot_de_passe,
-        role="ETUDIANT"
-    )
+    # Le nouvel étudiant apparaît dans le classement de sa promotion
+    cache_classements.invalider(promotion.id_promotion)
+    invalider_tableaux_de_bord(RoleEnum.DE)
     
     return {
         "message": "Compte étudiant créé avec succès",
@@ -381,9 +451,43 @@ async def creer_compte_etudiant(
         "identifiant": identifiant,
         "id_etudiant": id_etudiant,
         "matricule": matricule,
-        "note": "L'envoi de l'email est en cours en arrière-plan"
+        "note": "L'email est en file d'envoi"
     }
 
+@router.post("/importer-etudiants")
+async def importer_etudiants(
+    fichier: UploadFile = File(..., description="CSV (email, nom, prenom, id_promotion) ou XLSX"),
+    id_promotion: Optional[str] = Form(None, description="Promotion des lignes qui n'en précisent pas"),
+    db: Session = Depends(get_db),
+    current_user: Utilisateur = Depends(get_current_user)
+):
+    """
+    Crée les comptes étudiants d'un fichier CSV/XLSX, par lots (réservée au DE).
+    Retourne un rapport par ligne ; les identifiants sont envoyés par email.
+    """
+    
+    if current_user.role != RoleEnum.DE:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seul un Directeur d'Établissement peut créer des comptes étudiants"
+        )
+    
+    import_etudiants = ImportEtudiants(db)
+    try:
+        # Lecture et écritures en base synchrones : hors de la boucle d'événements
+        rapport = await asyncio.to_thread(
+            lambda: import_etudiants.traiter(lire_lignes(fichier.file, fichier.filename or "", id_promotion))
+        )
+    except FormatImportInvalide as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    for id_promo in import_etudiants.promotions_modifiees:
+        cache_classements.invalider(id_promo)
+    if import_etudiants.promotions_modifiees:
+        invalider_tableaux_de_bord(RoleEnum.DE)
+    
+    return rapport
+
 class PromotionCreate(BaseModel):
     id_filiere: str
     annee_academique: str
@@ -437,6 +541,8 @@ async def creer_promotion(
     db.add(promotion)
     db.commit()
 
+    invalider_tableaux_de_bord(RoleEnum.DE)
+
     return {"message": "Promotion créée avec succès", "id_promotion": promotion.id_promotion}
 
 
@@ -474,11 +580,13 @@ async def reinitialiser_mot_de_passe(
     date_expiration = datetime.utcnow() + timedelta(hours=24)
     utilisateur.token_activation = token_activation
     utilisateur.date_expiration_token = date_expiration
+    revoquer_tokens(utilisateur)
 
     db.commit()
+    invalider_identite(utilisateur.identifiant)
 
     # Envoyer l'email avec les nouveaux identifiants
-    success = email_service.envoyer_email_creation_compte(
+    success = await email_service.envoyer_email_creation_compte(
         destinataire=utilisateur.email,
         prenom=utilisateur.prenom,
         email=utilisateur.email,
@@ -529,7 +637,8 @@ async def reparer_tous_utilisateurs(
 
     if problemes_avant > 0:
         # Réparer les utilisateurs
-        reparer_utilisateurs_douteux(db)
+        await reparer_utilisateurs_douteux(db)
+        invalider_identite()
 
         # Vérifier l'intégrité après
         problemes_apres = verifier_integrite_utilisateurs(db)
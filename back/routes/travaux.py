@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File, Form
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import insert, or_, update
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import formatdate
 from pydantic import BaseModel
 from decimal import Decimal
+import mimetypes
 import os
-import shutil
 from pathlib import Path
 
 from database.database import get_db
@@ -14,9 +17,14 @@ from models import (
     Travail, Assignation, Inscription, RoleEnum, TypeTravailEnum, StatutAssignationEnum,
     Matiere
 )
-from core.auth import get_current_user
-from utils.generators import generer_identifiant_unique
-from utils.email_service import email_service
+from core.auth import get_current_user, get_current_principal, Principal
+from core.cache import invalider_tableaux_de_bord
+from core.pagination import LIMITE_DEFAUT, LIMITE_MAX, motif_prefixe, paginer
+from utils.generators import generer_identifiant_unique, generer_identifiants
+from utils.email_outbox import mettre_en_file, mettre_en_file_lot
+from utils.classement import cache_classements
+from utils.stockage import FichierTropVolumineux, dereferencer, referencer, stockage_blobs
+from utils.archives import flux_zip, lister_livraisons
 
 router = APIRouter(prefix="", tags=["Travaux"])
 
@@ -80,7 +88,7 @@ class MesTravauxResponse(BaseModel):
     id_assignation: str
     id_travail: str
     titre_travail: str
-    description_travail: str
+    description_travail: Optional[str] = None  # Omise avec include_description=false
     nom_matiere: str
     type_travail: TypeTravailEnum
     date_assignment: datetime
@@ -99,18 +107,17 @@ class MesTravauxResponse(BaseModel):
 async def creer_travail(
     data: TravailCreate,
     db: Session = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     if current_user.role != RoleEnum.FORMATEUR:
         raise HTTPException(status_code=403, detail="Seuls les formateurs peuvent créer des travaux")
     
-    formateur = db.query(Formateur).filter(Formateur.identifiant == current_user.identifiant).first()
-    if not formateur:
+    if not current_user.id_formateur:
         raise HTTPException(status_code=404, detail="Profil formateur non trouvé")
     
     espace = db.query(EspacePedagogique).filter(
         EspacePedagogique.id_espace == data.id_espace,
-        EspacePedagogique.id_formateur == formateur.id_formateur
+        EspacePedagogique.id_formateur == current_user.id_formateur
     ).first()
     
     if not espace:
@@ -130,6 +137,9 @@ async def creer_travail(
     db.add(nouveau_travail)
     db.commit()
     db.refresh(nouveau_travail)
+
+    invalider_tableaux_de_bord(RoleEnum.DE)
+    invalider_tableaux_de_bord(RoleEnum.FORMATEUR, current_user.identifiant)
     return nouveau_travail
 
 @router.get("/espace/{id_espace}", response_model=List[TravailResponse])
@@ -144,104 +154,197 @@ async def lister_travaux_espace(
 @router.post("/assigner", status_code=status.HTTP_201_CREATED)
 async def assigner_travail(
     data: AssignationRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: Utilisateur = Depends(get_current_user)
 ):
     if current_user.role != RoleEnum.FORMATEUR:
         raise HTTPException(status_code=403, detail="Accès réservé aux formateurs")
 
-    travail = db.query(Travail).filter(Travail.id_travail == data.id_travail).first()
+    travail = db.query(Travail).options(
+        joinedload(Travail.espace_pedagogique).joinedload(EspacePedagogique.matiere)
+    ).filter(Travail.id_travail == data.id_travail).first()
     if not travail:
         raise HTTPException(status_code=404, detail="Travail non trouvé")
 
     if data.date_echeance:
         travail.date_echeance = data.date_echeance
 
-    resultats = []
-    for id_etudiant in data.etudiants_ids:
-        existe = db.query(Assignation).filter(
-            Assignation.id_travail == data.id_travail,
-            Assignation.id_etudiant == id_etudiant
-        ).first()
-
-        if existe:
-            existe.statut = StatutAssignationEnum.ASSIGNE
-            existe.date_assignment = datetime.utcnow()
-        else:
-            id_assignation = generer_identifiant_unique("ASG")
-            nouvelle_assignation = Assignation(
-                id_assignation=id_assignation,
-                id_travail=data.id_travail,
-                id_etudiant=id_etudiant,
-                date_assignment=datetime.utcnow(),
-                statut=StatutAssignationEnum.ASSIGNE
+    # Identifiants demandés, sans doublons et dans l'ordre d'origine
+    ids_demandes = list(dict.fromkeys(data.etudiants_ids))
+
+    # Assignations existantes et étudiants concernés : deux requêtes IN (...)
+    existantes = {}
+    etudiants = {}
+    if ids_demandes:
+        existantes = {
+            row.id_etudiant: row
+            for row in db.query(
+                Assignation.id_assignation, Assignation.id_etudiant, Assignation.statut
+            ).filter(
+                Assignation.id_travail == data.id_travail,
+                Assignation.id_etudiant.in_(ids_demandes)
             )
-            db.add(nouvelle_assignation)
-        
-        etudiant = db.query(Etudiant).filter(Etudiant.id_etudiant == id_etudiant).first()
-        if etudiant and etudiant.utilisateur:
-            try:
-                date_echeance_str = travail.date_echeance.strftime("%d/%m/%Y à %H:%M") if travail.date_echeance else "Non définie"
-                background_tasks.add_task(
-                    email_service.envoyer_email_assignation_travail,
-                    destinataire=etudiant.utilisateur.email,
-                    prenom=etudiant.utilisateur.prenom,
-                    titre_travail=travail.titre,
-                    nom_matiere=travail.espace_pedagogique.matiere.nom_matiere,
-                    formateur=f"{current_user.prenom} {current_user.nom}",
-                    date_echeance=date_echeance_str,
-                    description=travail.description
-                )
-            except: pass
-        
-        resultats.append(id_etudiant)
+        }
+        etudiants = {
+            row.id_etudiant: row
+            for row in db.query(
+                Etudiant.id_etudiant, Etudiant.identifiant,
+                Utilisateur.email, Utilisateur.prenom
+            ).join(
+                Utilisateur, Etudiant.identifiant == Utilisateur.identifiant
+            ).filter(Etudiant.id_etudiant.in_(ids_demandes))
+        }
+
+    resultats = [id_etudiant for id_etudiant in ids_demandes if id_etudiant in etudiants]
+    inconnus = [id_etudiant for id_etudiant in ids_demandes if id_etudiant not in etudiants]
+
+    maintenant = datetime.utcnow()
+    a_reassigner = [existantes[id_etudiant] for id_etudiant in resultats if id_etudiant in existantes]
+    a_creer = [id_etudiant for id_etudiant in resultats if id_etudiant not in existantes]
+    notes_reinitialisees = any(row.statut == StatutAssignationEnum.NOTE for row in a_reassigner)
+
+    # Réassignations : un seul UPDATE
+    if a_reassigner:
+        db.execute(
+            update(Assignation)
+            .where(Assignation.id_assignation.in_([row.id_assignation for row in a_reassigner]))
+            .values(statut=StatutAssignationEnum.ASSIGNE, date_assignment=maintenant)
+        )
+
+    # Nouvelles assignations : un seul INSERT multi-lignes
+    if a_creer:
+        ids_assignations = generer_identifiants("ASSIGNATION", len(a_creer))
+        db.execute(insert(Assignation), [
+            {
+                "id_assignation": id_assignation,
+                "id_travail": data.id_travail,
+                "id_etudiant": id_etudiant,
+                "date_assignment": maintenant,
+                "statut": StatutAssignationEnum.ASSIGNE
+            }
+            for id_etudiant, id_assignation in zip(a_creer, ids_assignations)
+        ])
+
+    # Notifications enregistrées dans la même transaction que les assignations
+    notification = {
+        "titre_travail": travail.titre,
+        "nom_matiere": travail.espace_pedagogique.matiere.nom_matiere,
+        "formateur": f"{current_user.prenom} {current_user.nom}",
+        "date_echeance": travail.date_echeance.strftime("%d/%m/%Y à %H:%M") if travail.date_echeance else "Non définie",
+        "description": travail.description
+    }
+    mettre_en_file_lot(db, "assignation_travail", [
+        {"destinataire": etudiants[i].email, "prenom": etudiants[i].prenom, **notification}
+        for i in resultats
+    ])
+
+    # Valeurs lues avant le commit, qui expire les objets de la session
+    id_promotion = travail.espace_pedagogique.id_promotion
+    identifiant_formateur = current_user.identifiant
 
     db.commit()
-    return {"message": f"{len(resultats)} assignation(s) créée(s)", "assignes": resultats}
+
+    # Une réassignation retire des notes du classement de la promotion
+    if notes_reinitialisees:
+        cache_classements.invalider(id_promotion)
+
+    invalider_tableaux_de_bord(RoleEnum.DE)
+    invalider_tableaux_de_bord(RoleEnum.FORMATEUR, identifiant_formateur)
+    invalider_tableaux_de_bord(RoleEnum.ETUDIANT, *(etudiants[i].identifiant for i in resultats))
+
+    return {
+        "message": f"{len(resultats)} assignation(s) créée(s)",
+        "assignes": resultats,
+        "inconnus": inconnus
+    }
 
 @router.get("/mes-assignations", response_model=List[AssignationResponse])
 async def lister_mes_assignations(
+    response: Response,
+    statut: Optional[StatutAssignationEnum] = None,
+    id_espace: Optional[str] = None,
+    id_travail: Optional[str] = None,
+    recherche: Optional[str] = Query(None, description="Début du nom, du prénom ou du matricule de l'étudiant"),
+    curseur: Optional[str] = None,
+    limite: int = Query(LIMITE_DEFAUT, ge=1, le=LIMITE_MAX),
+    avec_total: bool = True,
     db: Session = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
+    """
+    Assignations des espaces du formateur, des plus récentes aux plus anciennes.
+    Paginé par curseur : passer l'en-tête X-Curseur-Suivant de la réponse en `curseur`
+    pour obtenir la page suivante ; X-Total-Count est omis si avec_total=false.
+    """
     if current_user.role != RoleEnum.FORMATEUR:
         raise HTTPException(status_code=403)
-    
-    formateur = db.query(Formateur).filter(Formateur.identifiant == current_user.identifiant).first()
-    
-    assignations = db.query(Assignation).join(Travail).join(EspacePedagogique).filter(
-        EspacePedagogique.id_formateur == formateur.id_formateur
-    ).order_by(Assignation.date_assignment.desc()).all()
+
+    if not current_user.id_formateur:
+        raise HTTPException(status_code=404, detail="Profil formateur non trouvé")
+
+    # Une seule requête, limitée aux colonnes de la réponse
+    requete = db.query(
+        Assignation.id_assignation, Assignation.date_assignment, Assignation.statut,
+        Assignation.date_soumission, Assignation.note, Assignation.commentaire_formateur,
+        Assignation.commentaire_etudiant, Assignation.fichier_path,
+        Travail.titre, Travail.date_echeance, Travail.type_travail,
+        Matiere.nom_matiere, Utilisateur.nom, Utilisateur.prenom
+    ).join(Travail, Travail.id_travail == Assignation.id_travail) \
+     .join(EspacePedagogique, EspacePedagogique.id_espace == Travail.id_espace) \
+     .outerjoin(Matiere, Matiere.id_matiere == EspacePedagogique.id_matiere) \
+     .join(Etudiant, Etudiant.id_etudiant == Assignation.id_etudiant) \
+     .join(Utilisateur, Utilisateur.identifiant == Etudiant.identifiant) \
+     .filter(EspacePedagogique.id_formateur == current_user.id_formateur)
+
+    if statut:
+        requete = requete.filter(Assignation.statut == statut)
+    if id_espace:
+        requete = requete.filter(EspacePedagogique.id_espace == id_espace)
+    if id_travail:
+        requete = requete.filter(Assignation.id_travail == id_travail)
+    if recherche:
+        motif = motif_prefixe(recherche)
+        requete = requete.filter(or_(
+            Utilisateur.nom.like(motif, escape="\\"),
+            Utilisateur.prenom.like(motif, escape="\\"),
+            Etudiant.matricule.like(motif, escape="\\")
+        ))
+
+    lignes = paginer(
+        requete, (Assignation.date_assignment, Assignation.id_assignation),
+        response, curseur=curseur, limite=limite, avec_total=avec_total
+    )
 
     # Formater manuellement pour inclure le nesting 'livraison'
     result = []
-    for a in assignations:
-        livraison = None
-        if a.statut in [StatutAssignationEnum.RENDU, StatutAssignationEnum.NOTE]:
-            livraison = LivraisonSimulated(
-                id_livraison=a.id_assignation,
-                date_livraison=a.date_soumission,
-                note_attribuee=a.note,
-                feedback=a.commentaire_formateur,
-                commentaire=a.commentaire_etudiant,
-                fichier_path=a.fichier_path
-            )
-        
+    for a in lignes:
         result.append(AssignationResponse(
             id_assignation=a.id_assignation,
-            titre_travail=a.travail.titre,
-            nom_matiere=a.travail.espace_pedagogique.matiere.nom_matiere,
-            nom_etudiant=a.etudiant.utilisateur.nom,
-            prenom_etudiant=a.etudiant.utilisateur.prenom,
+            titre_travail=a.titre,
+            nom_matiere=a.nom_matiere,
+            nom_etudiant=a.nom,
+            prenom_etudiant=a.prenom,
             date_assignment=a.date_assignment,
-            date_echeance=a.travail.date_echeance,
+            date_echeance=a.date_echeance,
             statut=a.statut,
-            type_travail=a.travail.type_travail,
-            livraison=livraison
+            type_travail=a.type_travail,
+            livraison=_livraison(a)
         ))
     return result
 
+def _livraison(a) -> Optional[LivraisonSimulated]:
+    """Livraison simulée (compatibilité frontend) à partir d'une ligne projetée d'assignation"""
+    if a.statut not in [StatutAssignationEnum.RENDU, StatutAssignationEnum.NOTE]:
+        return None
+    return LivraisonSimulated(
+        id_livraison=a.id_assignation,
+        date_livraison=a.date_soumission,
+        note_attribuee=a.note,
+        feedback=a.commentaire_formateur,
+        commentaire=a.commentaire_etudiant,
+        fichier_path=a.fichier_path
+    )
+
 @router.get("/travail/{id_travail}/livraisons")
 async def lister_livraisons_travail(
     id_travail: str,
@@ -281,102 +384,179 @@ async def lister_livraisons_travail(
         "assignations": result_assignations
     }
 
+@router.get("/travail/{id_travail}/livraisons/archive")
+async def telecharger_archive_livraisons_travail(
+    id_travail: str,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Archive ZIP de toutes les livraisons d'un travail (un fichier par matricule), produite à la volée"""
+    travail = db.query(Travail.id_travail, EspacePedagogique.id_formateur).join(
+        EspacePedagogique, EspacePedagogique.id_espace == Travail.id_espace
+    ).filter(Travail.id_travail == id_travail).first()
+    if not travail:
+        raise HTTPException(status_code=404, detail="Travail non trouvé")
+    _verifier_acces_livraisons(current_user, travail.id_formateur)
+
+    return _reponse_archive(lister_livraisons(db, id_travail=id_travail), f"livraisons_{id_travail}.zip")
+
+@router.get("/espace/{id_espace}/livraisons/archive")
+async def telecharger_archive_livraisons_espace(
+    id_espace: str,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Archive ZIP des livraisons de tous les travaux d'un espace (un dossier par travail)"""
+    espace = db.query(EspacePedagogique.id_formateur).filter(EspacePedagogique.id_espace == id_espace).first()
+    if not espace:
+        raise HTTPException(status_code=404, detail="Espace pédagogique non trouvé")
+    _verifier_acces_livraisons(current_user, espace.id_formateur)
+
+    return _reponse_archive(lister_livraisons(db, id_espace=id_espace), f"livraisons_{id_espace}.zip")
+
+def _verifier_acces_livraisons(current_user: Principal, id_formateur_espace: Optional[str]):
+    if current_user.role == RoleEnum.FORMATEUR:
+        if not id_formateur_espace or id_formateur_espace != current_user.id_formateur:
+            raise HTTPException(status_code=403, detail="Vous n'êtes pas le formateur assigné à cet espace")
+    elif current_user.role != RoleEnum.DE:
+        raise HTTPException(status_code=403, detail="Accès réservé au DE ou au formateur assigné")
+
+def _reponse_archive(entrees, nom_archive: str) -> StreamingResponse:
+    if not entrees:
+        raise HTTPException(status_code=404, detail="Aucune livraison à télécharger")
+    return StreamingResponse(
+        flux_zip(entrees),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{nom_archive}"'}
+    )
+
 @router.get("/mes-travaux", response_model=List[MesTravauxResponse])
 async def lister_mes_travaux_etudiant(
+    statut: Optional[List[StatutAssignationEnum]] = Query(None),
+    echeance_apres: Optional[datetime] = None,
+    echeance_avant: Optional[datetime] = None,
+    include_description: bool = True,
     db: Session = Depends(get_db),
-    current_user: Utilisateur = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
+    """
+    Travaux de l'étudiant, par échéance. Une seule requête, limitée aux colonnes de la
+    réponse ; include_description=false évite de lire la consigne (texte long) de chaque travail.
+    """
     if current_user.role != RoleEnum.ETUDIANT:
         raise HTTPException(status_code=403)
-    
-    etudiant = db.query(Etudiant).filter(Etudiant.identifiant == current_user.identifiant).first()
-    
-    assignations = db.query(Assignation).filter(Assignation.id_etudiant == etudiant.id_etudiant).all()
 
-    result = []
-    for a in assignations:
-        livraison = None
-        if a.statut in [StatutAssignationEnum.RENDU, StatutAssignationEnum.NOTE]:
-            livraison = LivraisonSimulated(
-                id_livraison=a.id_assignation,
-                date_livraison=a.date_soumission,
-                note_attribuee=a.note,
-                feedback=a.commentaire_formateur,
-                commentaire=a.commentaire_etudiant,
-                fichier_path=a.fichier_path
-            )
-        
-        result.append(MesTravauxResponse(
+    colonnes = [
+        Assignation.id_assignation, Assignation.id_travail, Assignation.date_assignment,
+        Assignation.statut, Assignation.date_soumission, Assignation.note,
+        Assignation.commentaire_formateur, Assignation.commentaire_etudiant, Assignation.fichier_path,
+        Travail.titre, Travail.type_travail, Travail.date_echeance, Travail.note_max,
+        Matiere.nom_matiere
+    ]
+    if include_description:
+        colonnes.append(Travail.description)
+
+    requete = db.query(*colonnes) \
+        .join(Travail, Travail.id_travail == Assignation.id_travail) \
+        .join(EspacePedagogique, EspacePedagogique.id_espace == Travail.id_espace) \
+        .join(Matiere, Matiere.id_matiere == EspacePedagogique.id_matiere) \
+        .filter(Assignation.id_etudiant == current_user.id_etudiant)
+    if statut:
+        requete = requete.filter(Assignation.statut.in_(statut))
+    if echeance_apres:
+        requete = requete.filter(Travail.date_echeance >= echeance_apres)
+    if echeance_avant:
+        requete = requete.filter(Travail.date_echeance <= echeance_avant)
+
+    return [
+        MesTravauxResponse(
             id_assignation=a.id_assignation,
             id_travail=a.id_travail,
-            titre_travail=a.travail.titre,
-            description_travail=a.travail.description,
-            nom_matiere=a.travail.espace_pedagogique.matiere.nom_matiere,
-            type_travail=a.travail.type_travail,
+            titre_travail=a.titre,
+            description_travail=a.description if include_description else None,
+            nom_matiere=a.nom_matiere,
+            type_travail=a.type_travail,
             date_assignment=a.date_assignment,
-            date_echeance=a.travail.date_echeance,
+            date_echeance=a.date_echeance,
             statut=a.statut,
-            note_max=a.travail.note_max,
-            livraison=livraison
-        ))
-    return result
+            note_max=a.note_max,
+            livraison=_livraison(a)
+        )
+        for a in requete.order_by(Travail.date_echeance, Assignation.id_assignation)
+    ]
 
 @router.post("/livrer/{id_assignation}", status_code=status.HTTP_201_CREATED)
 async def livrer_travail(
     id_assignation: str,
     commentaire: Optional[str] = Form(None),
     fichier: UploadFile = File(...),
-    background_tasks: BackgroundTasks = BackgroundTasks(),
     db: Session = Depends(get_db),
     current_user: Utilisateur = Depends(get_current_user)
 ):
     assignation = db.query(Assignation).filter(Assignation.id_assignation == id_assignation).first()
     if not assignation: raise HTTPException(404)
 
-    upload_dir = Path("uploads/travaux")
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    unique_filename = f"{id_assignation}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{Path(fichier.filename).suffix}"
-    full_path = upload_dir / unique_filename
-    
-    with open(full_path, "wb") as buffer:
-        shutil.copyfileobj(fichier.file, buffer)
-
+    try:
+        enregistre = await stockage_blobs.ajouter(fichier)
+    except FichierTropVolumineux as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    # Le fichier précédent n'est plus référencé par cette assignation
+    ancien_sha256 = assignation.fichier_sha256
+    if ancien_sha256 != enregistre.sha256:
+        referencer(db, enregistre)
+        if ancien_sha256:
+            dereferencer(db, ancien_sha256)
+    # Référence prise : le fichier ne peut plus être collecté, il est recréé s'il l'a été
+    await stockage_blobs.confirmer(enregistre)
+
+    etait_notee = assignation.statut == StatutAssignationEnum.NOTE
     assignation.statut = StatutAssignationEnum.RENDU
     assignation.date_soumission = datetime.utcnow()
     assignation.commentaire_etudiant = commentaire
-    assignation.fichier_path = str(full_path)
+    assignation.fichier_path = str(enregistre.chemin)
+    assignation.fichier_nom = Path(fichier.filename or "").name or None
+    assignation.fichier_taille = enregistre.taille
+    assignation.fichier_sha256 = enregistre.sha256
+
+    # Notification formateur, enregistrée dans la même transaction
+    formateur_espace = assignation.travail.espace_pedagogique.formateur
+    if formateur_espace and formateur_espace.utilisateur:
+        mettre_en_file(
+            db, "soumission_travail", formateur_espace.utilisateur.email,
+            prenom_formateur=formateur_espace.utilisateur.prenom,
+            prenom_etudiant=current_user.prenom,
+            nom_etudiant=current_user.nom,
+            titre_travail=assignation.travail.titre,
+            nom_matiere=assignation.travail.espace_pedagogique.matiere.nom_matiere,
+            date_soumission=assignation.date_soumission.strftime("%d/%m/%Y à %H:%M"),
+            commentaire=commentaire or ""
+        )
+    identifiant_formateur = formateur_espace.identifiant if formateur_espace else None
 
     db.commit()
-    
-    # Notification formateur
-    try:
-        f = assignation.travail.espace_pedagogique.formateur
-        if f and f.utilisateur:
-            background_tasks.add_task(
-                email_service.envoyer_email_soumission_travail,
-                destinataire=f.utilisateur.email,
-                prenom_formateur=f.utilisateur.prenom,
-                prenom_etudiant=current_user.prenom,
-                nom_etudiant=current_user.nom,
-                titre_travail=assignation.travail.titre,
-                nom_matiere=assignation.travail.espace_pedagogique.matiere.nom_matiere,
-                date_soumission=assignation.date_soumission.strftime("%d/%m/%Y à %H:%M"),
-                commentaire=commentaire or ""
-            )
-    except: pass
+
+    # Une nouvelle soumission d'un travail noté retire sa note du classement
+    if etait_notee:
+        cache_classements.mettre_a_jour_etudiant(db, assignation.id_etudiant)
+
+    invalider_tableaux_de_bord(RoleEnum.DE)
+    invalider_tableaux_de_bord(RoleEnum.ETUDIANT, current_user.identifiant)
+    invalider_tableaux_de_bord(RoleEnum.FORMATEUR, identifiant_formateur)
 
     # On retourne un objet livraison pour la compatibilité frontend
     return {
         "id_livraison": assignation.id_assignation,
         "date_livraison": assignation.date_soumission,
-        "commentaire": assignation.commentaire_etudiant
+        "commentaire": assignation.commentaire_etudiant,
+        "fichier_taille": enregistre.taille,
+        "fichier_sha256": enregistre.sha256
     }
 
 @router.post("/evaluer/{id_assignation}")
 async def evaluer_travail(
     id_assignation: str,
     data: EvaluationRequest,
-    background_tasks: BackgroundTasks = BackgroundTasks(),
     db: Session = Depends(get_db),
     current_user: Utilisateur = Depends(get_current_user)
 ):
@@ -388,39 +568,80 @@ async def evaluer_travail(
     assignation.note = data.note_attribuee
     assignation.commentaire_formateur = data.feedback
 
+    # Notification étudiant, enregistrée dans la même transaction
+    et = assignation.etudiant
+    if et and et.utilisateur:
+        mettre_en_file(
+            db, "evaluation_travail", et.utilisateur.email,
+            prenom_etudiant=et.utilisateur.prenom,
+            titre_travail=assignation.travail.titre,
+            nom_matiere=assignation.travail.espace_pedagogique.matiere.nom_matiere,
+            note=float(data.note_attribuee),
+            note_max=float(assignation.travail.note_max),
+            commentaire=data.feedback,
+            formateur=f"{current_user.prenom} {current_user.nom}"
+        )
+
     db.commit()
 
-    try:
-        et = assignation.etudiant
-        if et and et.utilisateur:
-            background_tasks.add_task(
-                email_service.envoyer_email_evaluation_travail,
-                destinataire=et.utilisateur.email,
-                prenom_etudiant=et.utilisateur.prenom,
-                titre_travail=assignation.travail.titre,
-                nom_matiere=assignation.travail.espace_pedagogique.matiere.nom_matiere,
-                note=float(data.note_attribuee),
-                note_max=float(assignation.travail.note_max),
-                commentaire=data.feedback,
-                formateur=f"{current_user.prenom} {current_user.nom}"
-            )
-    except: pass
+    # Mettre à jour le classement de la promotion pour cet étudiant uniquement
+    cache_classements.mettre_a_jour_etudiant(db, assignation.id_etudiant)
+
+    invalider_tableaux_de_bord(RoleEnum.DE)
+    invalider_tableaux_de_bord(RoleEnum.FORMATEUR, current_user.identifiant)
+    invalider_tableaux_de_bord(RoleEnum.ETUDIANT, assignation.etudiant.identifiant)
 
     return {"message": "Note enregistrée", "note_attribuee": assignation.note}
 
 @router.get("/telecharger/{id_assignation}")
 async def telecharger_fichier_travail(
     id_assignation: str,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: Utilisateur = Depends(get_current_user)
 ):
-    assignation = db.query(Assignation).filter(Assignation.id_assignation == id_assignation).first()
-    if not assignation or not assignation.fichier_path:
+    """
+    Télécharge le fichier livré. L'ETag est l'empreinte SHA-256 du contenu : un client
+    qui possède déjà le fichier reçoit un 304, et un téléchargement interrompu reprend
+    là où il s'était arrêté (Range/If-Range, réponse 206).
+    """
+    fichier = db.query(
+        Assignation.fichier_path, Assignation.fichier_nom,
+        Assignation.fichier_sha256, Assignation.date_soumission
+    ).filter(Assignation.id_assignation == id_assignation).first()
+    if not fichier or not fichier.fichier_path:
         raise HTTPException(status_code=404)
-    
-    from fastapi.responses import FileResponse
+
+    nom = fichier.fichier_nom or os.path.basename(fichier.fichier_path)
+    entetes = {"Cache-Control": "private, no-cache"}
+    if fichier.fichier_sha256:
+        entetes["ETag"] = f'"{fichier.fichier_sha256}"'
+        if _etag_correspond(request.headers.get("if-none-match"), entetes["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=entetes)
+    if fichier.date_soumission:
+        entetes["Last-Modified"] = formatdate(
+            fichier.date_soumission.replace(tzinfo=timezone.utc).timestamp(), usegmt=True
+        )
+
+    if not os.path.isfile(fichier.fichier_path):
+        raise HTTPException(status_code=404, detail="Fichier introuvable sur le serveur")
+
+    # FileResponse gère Range/If-Range et l'envoi zéro copie (extension ASGI pathsend)
     return FileResponse(
-        path=assignation.fichier_path,
-        filename=os.path.basename(assignation.fichier_path),
-        media_type='application/octet-stream'
+        path=fichier.fichier_path,
+        filename=nom,
+        media_type=mimetypes.guess_type(nom)[0] or "application/octet-stream",
+        headers=entetes
+    )
+
+
+def _etag_correspond(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparaison faible de If-None-Match (liste d'ETags ou "*") avec l'ETag du fichier"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidat.strip().removeprefix("W/") == etag
+        for candidat in if_none_match.split(",")
     )
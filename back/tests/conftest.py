@@ -0,0 +1,198 @@
+import itertools
+from datetime import datetime, date
+from decimal import Decimal
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from core.auth import get_current_user, get_current_principal, Principal
+from database.database import Base, get_db
+from models import (
+    Utilisateur, Filiere, Matiere, Promotion, Etudiant, Formateur,
+    EspacePedagogique, Inscription, Travail, Assignation,
+    RoleEnum, StatutEtudiantEnum, StatutAssignationEnum, TypeTravailEnum
+)
+
+
+@pytest.fixture
+def db():
+    """Session SQLite en mémoire, isolée pour chaque test"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def compteur_requetes(db):
+    """Liste des requêtes SQL émises pendant le test (remise à zéro via .clear())"""
+    requetes = []
+
+    def enregistrer(conn, cursor, statement, parameters, context, executemany):
+        requetes.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", enregistrer)
+    yield requetes
+    event.remove(engine, "before_cursor_execute", enregistrer)
+
+
+class Fabrique:
+    """Création rapide des entités nécessaires aux tests"""
+
+    def __init__(self, db):
+        self.db = db
+        self._compteur = itertools.count(1)
+
+    def _id(self, prefixe):
+        return f"{prefixe}_{next(self._compteur)}"
+
+    def utilisateur(self, role, nom="Nom", prenom="Prenom", actif=True):
+        identifiant = self._id("USR")
+        utilisateur = Utilisateur(
+            identifiant=identifiant,
+            email=f"{identifiant.lower()}@example.com",
+            mot_de_passe="x" * 64,
+            nom=nom,
+            prenom=prenom,
+            role=role,
+            actif=actif
+        )
+        self.db.add(utilisateur)
+        return utilisateur
+
+    def promotion(self, annee_academique="2025-2026", nom_filiere=None):
+        filiere = Filiere(
+            id_filiere=self._id("FIL"),
+            nom_filiere=nom_filiere or self._id("Filière"),
+            date_debut=date(2025, 9, 1)
+        )
+        promotion = Promotion(
+            id_promotion=self._id("PRM"),
+            id_filiere=filiere.id_filiere,
+            annee_academique=annee_academique,
+            libelle=f"Promotion {annee_academique}",
+            date_debut=date(2025, 9, 1),
+            date_fin=date(2026, 6, 30)
+        )
+        self.db.add_all([filiere, promotion])
+        return promotion
+
+    def etudiant(self, promotion, nom="Nom", prenom="Prenom", statut=StatutEtudiantEnum.ACTIF):
+        utilisateur = self.utilisateur(RoleEnum.ETUDIANT, nom=nom, prenom=prenom)
+        etudiant = Etudiant(
+            id_etudiant=self._id("ETD"),
+            identifiant=utilisateur.identifiant,
+            matricule=self._id("MAT"),
+            id_promotion=promotion.id_promotion,
+            date_inscription=date(2025, 9, 1),
+            statut=statut
+        )
+        self.db.add(etudiant)
+        return etudiant
+
+    def formateur(self, nom="Formateur", prenom="Prenom"):
+        utilisateur = self.utilisateur(RoleEnum.FORMATEUR, nom=nom, prenom=prenom)
+        formateur = Formateur(
+            id_formateur=self._id("FMT"),
+            identifiant=utilisateur.identifiant
+        )
+        self.db.add(formateur)
+        return formateur
+
+    def espace(self, promotion, formateur=None):
+        matiere = Matiere(
+            id_matiere=self._id("MAT"),
+            id_filiere=promotion.id_filiere,
+            nom_matiere=self._id("Matière")
+        )
+        espace = EspacePedagogique(
+            id_espace=self._id("ESP"),
+            id_promotion=promotion.id_promotion,
+            id_matiere=matiere.id_matiere,
+            id_formateur=formateur.id_formateur if formateur else None,
+            date_creation=datetime(2025, 10, 1)
+        )
+        self.db.add_all([matiere, espace])
+        return espace
+
+    def inscription(self, espace, etudiant):
+        inscription = Inscription(
+            id_inscription=self._id("INS"),
+            id_espace=espace.id_espace,
+            id_etudiant=etudiant.id_etudiant,
+            date_inscription=datetime(2025, 10, 1)
+        )
+        self.db.add(inscription)
+        return inscription
+
+    def travail(self, espace, titre="Travail", date_creation=None):
+        travail = Travail(
+            id_travail=self._id("TRV"),
+            id_espace=espace.id_espace,
+            titre=titre,
+            description="Consigne",
+            type_travail=TypeTravailEnum.INDIVIDUEL,
+            date_echeance=datetime(2026, 1, 31),
+            date_creation=date_creation or datetime(2025, 11, 1)
+        )
+        self.db.add(travail)
+        return travail
+
+    def assignation(self, travail, etudiant, statut=StatutAssignationEnum.ASSIGNE, note=None):
+        assignation = Assignation(
+            id_assignation=self._id("ASG"),
+            id_travail=travail.id_travail,
+            id_etudiant=etudiant.id_etudiant,
+            date_assignment=datetime(2025, 11, 2),
+            statut=statut,
+            note=Decimal(str(note)) if note is not None else None
+        )
+        self.db.add(assignation)
+        return assignation
+
+
+@pytest.fixture
+def fabrique(db):
+    return Fabrique(db)
+
+
+@pytest.fixture
+def client(db):
+    """
+    Construit un TestClient pour un router donné, branché sur la session de test
+    et authentifié en tant que l'utilisateur fourni (utilisateur et principal)
+    """
+    def construire(module_routes, prefixe, utilisateur):
+        formateur = db.query(Formateur).filter(Formateur.identifiant == utilisateur.identifiant).first()
+        etudiant = db.query(Etudiant).filter(Etudiant.identifiant == utilisateur.identifiant).first()
+        principal = Principal(
+            identifiant=utilisateur.identifiant,
+            email=utilisateur.email,
+            role=utilisateur.role,
+            nom=utilisateur.nom,
+            prenom=utilisateur.prenom,
+            id_formateur=formateur.id_formateur if formateur else None,
+            id_etudiant=etudiant.id_etudiant if etudiant else None,
+            id_promotion=etudiant.id_promotion if etudiant else None
+        )
+        app = FastAPI()
+        app.include_router(module_routes.router, prefix=prefixe)
+        app.dependency_overrides[get_db] = lambda: db
+        app.dependency_overrides[get_current_user] = lambda: utilisateur
+        app.dependency_overrides[get_current_principal] = lambda: principal
+        return TestClient(app)
+
+    return construire
@@ -0,0 +1,100 @@
+import pytest
+from fastapi import HTTPException
+
+from core.auth import (
+    get_current_user, get_current_principal, generer_token_jwt,
+    generer_token_utilisateur, revoquer_tokens
+)
+from core.jwt import verify_token
+from core.cache import cache_identites, invalider_identite
+from models import RoleEnum
+
+
+def _token(utilisateur):
+    return generer_token_jwt({
+        "identifiant": utilisateur.identifiant,
+        "email": utilisateur.email,
+        "role": utilisateur.role.value,
+        "nom": utilisateur.nom,
+        "prenom": utilisateur.prenom
+    })
+
+
+def test_identite_servie_depuis_le_cache(db, fabrique, compteur_requetes):
+    cache_identites.vider()
+    promotion = fabrique.promotion()
+    etudiant = fabrique.etudiant(promotion, nom="Durand")
+    db.commit()
+    utilisateur = etudiant.utilisateur
+    token = _token(utilisateur)
+
+    compteur_requetes.clear()
+    premier = get_current_user(token=token, credentials=None, db=db)
+    second = get_current_user(token=token, credentials=None, db=db)
+
+    assert len(compteur_requetes) == 1
+    assert (second.identifiant, second.nom, second.role) == (utilisateur.identifiant, "Durand", RoleEnum.ETUDIANT)
+    assert premier is not second
+    identite = cache_identites.obtenir(utilisateur.identifiant)
+    assert identite.id_etudiant == etudiant.id_etudiant
+    assert identite.id_promotion == promotion.id_promotion
+    assert identite.id_formateur is None
+
+
+def test_desactivation_prise_en_compte_apres_invalidation(db, fabrique):
+    cache_identites.vider()
+    utilisateur = fabrique.utilisateur(RoleEnum.FORMATEUR)
+    db.commit()
+    token = _token(utilisateur)
+    get_current_user(token=token, credentials=None, db=db)
+
+    utilisateur.actif = False
+    db.commit()
+    get_current_user(token=token, credentials=None, db=db)  # encore en cache
+
+    invalider_identite(utilisateur.identifiant)
+    with pytest.raises(HTTPException) as erreur:
+        get_current_user(token=token, credentials=None, db=db)
+    assert erreur.value.status_code == 401
+    assert cache_identites.obtenir(utilisateur.identifiant) is None
+
+
+def test_principal_issu_des_claims_du_token(db, fabrique, compteur_requetes):
+    cache_identites.vider()
+    promotion = fabrique.promotion()
+    etudiant = fabrique.etudiant(promotion)
+    db.commit()
+    identifiant = etudiant.identifiant
+    token = generer_token_utilisateur(db, identifiant)
+
+    claims = verify_token(token)
+    assert claims["id_etudiant"] == etudiant.id_etudiant
+    assert claims["id_promotion"] == promotion.id_promotion
+    assert "id_formateur" not in claims
+
+    compteur_requetes.clear()
+    principal = get_current_principal(token=token, credentials=None, db=db)
+
+    assert compteur_requetes == []
+    assert principal.identifiant == identifiant
+    assert principal.role == RoleEnum.ETUDIANT
+    assert (principal.id_etudiant, principal.id_promotion) == (etudiant.id_etudiant, promotion.id_promotion)
+
+
+def test_revocation_par_version_de_token(db, fabrique):
+    cache_identites.vider()
+    formateur = fabrique.formateur()
+    db.commit()
+    utilisateur = formateur.utilisateur
+    ancien_token = generer_token_utilisateur(db, utilisateur.identifiant)
+
+    revoquer_tokens(utilisateur)
+    db.commit()
+    invalider_identite(utilisateur.identifiant)
+    nouveau_token = generer_token_utilisateur(db, utilisateur.identifiant)
+
+    for dependance in (get_current_user, get_current_principal):
+        with pytest.raises(HTTPException) as erreur:
+            dependance(token=ancien_token, credentials=None, db=db)
+        assert erreur.value.status_code == 401
+    assert get_current_principal(token=nouveau_token, credentials=None, db=db).id_formateur == formateur.id_formateur
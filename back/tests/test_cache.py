@@ -0,0 +1,51 @@
+import time
+
+from core.cache import (
+    CacheTTL, cache_tableaux_de_bord, obtenir_tableau_de_bord, invalider_tableaux_de_bord
+)
+from models import RoleEnum
+
+
+def test_eviction_lru():
+    cache = CacheTTL(taille_max=2, duree_vie=60)
+    cache.enregistrer("a", 1)
+    cache.enregistrer("b", 2)
+    assert cache.obtenir("a") == 1  # "a" devient la plus récente
+    cache.enregistrer("c", 3)
+
+    assert cache.obtenir("b") is None
+    assert cache.obtenir("a") == 1
+    assert cache.obtenir("c") == 3
+
+
+def test_expiration():
+    cache = CacheTTL(taille_max=10, duree_vie=60)
+    cache.enregistrer("court", "valeur", duree_vie=0.01)
+    cache.enregistrer("long", "valeur")
+    time.sleep(0.02)
+
+    assert cache.obtenir("court") is None
+    assert cache.obtenir("long") == "valeur"
+
+
+def test_tableau_de_bord_calcule_une_fois_puis_invalide():
+    cache_tableaux_de_bord.vider()
+    appels = []
+
+    def calculer():
+        appels.append(1)
+        return {"numero": len(appels)}
+
+    assert obtenir_tableau_de_bord(RoleEnum.FORMATEUR, "FMT_1", calculer) == {"numero": 1}
+    assert obtenir_tableau_de_bord(RoleEnum.FORMATEUR, "FMT_1", calculer) == {"numero": 1}
+    obtenir_tableau_de_bord(RoleEnum.FORMATEUR, "FMT_2", calculer)
+    obtenir_tableau_de_bord(RoleEnum.DE, "DE_1", calculer)
+    assert len(appels) == 3
+
+    invalider_tableaux_de_bord(RoleEnum.FORMATEUR, "FMT_1")
+    assert obtenir_tableau_de_bord(RoleEnum.FORMATEUR, "FMT_1", calculer) == {"numero": 4}
+    assert obtenir_tableau_de_bord(RoleEnum.FORMATEUR, "FMT_2", calculer) == {"numero": 2}
+
+    invalider_tableaux_de_bord(RoleEnum.FORMATEUR)
+    assert obtenir_tableau_de_bord(RoleEnum.FORMATEUR, "FMT_2", calculer) == {"numero": 5}
+    assert obtenir_tableau_de_bord(RoleEnum.DE, "DE_1", calculer) == {"numero": 3}
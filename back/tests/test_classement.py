@@ -0,0 +1,94 @@
+from models import StatutAssignationEnum, StatutEtudiantEnum
+from routes import dashboard
+from utils.classement import CacheClassements, calculer_classement_promotion, cache_classements
+
+
+def _noter(fabrique, travail, etudiant, note):
+    return fabrique.assignation(travail, etudiant, statut=StatutAssignationEnum.NOTE, note=note)
+
+
+def test_classement_une_seule_requete_avec_ex_aequo(db, fabrique, compteur_requetes):
+    promotion = fabrique.promotion()
+    espace = fabrique.espace(promotion)
+    t1, t2 = fabrique.travail(espace), fabrique.travail(espace)
+
+    alice = fabrique.etudiant(promotion, nom="Adjovi", prenom="Alice")
+    bruno = fabrique.etudiant(promotion, nom="Bio", prenom="Bruno")
+    chloe = fabrique.etudiant(promotion, nom="Chabi", prenom="Chloé")
+    david = fabrique.etudiant(promotion, nom="Dossou", prenom="David")
+    fabrique.etudiant(promotion, nom="Exclu", statut=StatutEtudiantEnum.EXCLU)
+
+    _noter(fabrique, t1, alice, 14)
+    _noter(fabrique, t2, alice, 16)
+    _noter(fabrique, t1, bruno, 17)
+    _noter(fabrique, t1, chloe, 15)
+    _noter(fabrique, t2, chloe, 15)
+    # Rendu mais pas encore noté : ne compte pas dans la moyenne
+    fabrique.assignation(t2, bruno, statut=StatutAssignationEnum.RENDU)
+    db.commit()
+    id_promotion, matricule_david = promotion.id_promotion, david.matricule
+
+    compteur_requetes.clear()
+    classement = calculer_classement_promotion(db, id_promotion)
+
+    assert len(compteur_requetes) == 1
+    assert [(c["nom"], c["moyenne"], c["rang"]) for c in classement] == [
+        ("Bio", 17.0, 1),
+        ("Adjovi", 15.0, 2),
+        ("Chabi", 15.0, 2),
+        ("Dossou", 0.0, 4),
+    ]
+    assert classement[0]["nombre_travaux_notes"] == 1
+    assert classement[1]["nombre_travaux_notes"] == 2
+    assert classement[3]["nombre_travaux_notes"] == 0
+    assert classement[3]["matricule"] == matricule_david
+
+
+def test_cache_mis_a_jour_pour_le_seul_etudiant_evalue(db, fabrique, compteur_requetes):
+    promotion = fabrique.promotion()
+    travail = fabrique.travail(fabrique.espace(promotion))
+    alice = fabrique.etudiant(promotion, nom="Adjovi")
+    bruno = fabrique.etudiant(promotion, nom="Bio")
+    _noter(fabrique, travail, alice, 12)
+    assignation_bruno = fabrique.assignation(travail, bruno, statut=StatutAssignationEnum.RENDU)
+    db.commit()
+    id_promotion, id_bruno = promotion.id_promotion, bruno.id_etudiant
+
+    cache = CacheClassements(duree_vie=300)
+    avant = cache.obtenir(db, id_promotion)
+    assert [c["nom"] for c in avant.classement] == ["Adjovi", "Bio"]
+
+    compteur_requetes.clear()
+    assert cache.obtenir(db, id_promotion) is avant
+    assert compteur_requetes == []
+
+    assignation_bruno.statut = StatutAssignationEnum.NOTE
+    assignation_bruno.note = 18
+    db.commit()
+    cache.mettre_a_jour_etudiant(db, id_bruno)
+
+    apres = cache.obtenir(db, id_promotion)
+    assert apres.etag != avant.etag
+    assert [(c["nom"], c["rang"]) for c in apres.classement] == [("Bio", 1), ("Adjovi", 2)]
+    # L'instantané précédent reste intact pour les lecteurs en cours
+    assert [(c["nom"], c["rang"]) for c in avant.classement] == [("Adjovi", 1), ("Bio", 2)]
+
+
+def test_endpoint_classement_repond_304_si_inchange(db, fabrique, client):
+    promotion = fabrique.promotion()
+    alice = fabrique.etudiant(promotion, nom="Adjovi")
+    fabrique.etudiant(promotion, nom="Bio")
+    db.commit()
+    utilisateur = alice.utilisateur
+    cache_classements.invalider()
+
+    api = client(dashboard, "/api/dashboard", utilisateur)
+
+    reponse = api.get("/api/dashboard/etudiant/classement")
+    assert reponse.status_code == 200
+    assert reponse.json()["total_etudiants"] == 2
+    assert reponse.json()["classement"][0]["est_moi"] is True
+    etag = reponse.headers["etag"]
+
+    reponse = api.get("/api/dashboard/etudiant/classement", headers={"If-None-Match": etag})
+    assert reponse.status_code == 304
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from models import EmailOutbox, StatutEmailEnum
+from utils import email_outbox
+from utils.email_outbox import LimiteurDebit, WorkerOutbox, mettre_en_file, mettre_en_file_lot
+from utils.email_service import EmailService, TransportLocal
+
+
+def _worker(db, transport, **reglages):
+    service = EmailService(transport=transport)
+    service.delai_initial = 0
+    service.tentatives_max = 1
+    fabrique_sessions = sessionmaker(bind=db.get_bind(), autoflush=False)
+    return WorkerOutbox(fabrique_sessions, service, debits={}, **reglages)
+
+
+def _creation_compte(db, destinataire):
+    mettre_en_file(
+        db, "creation_compte", destinataire,
+        prenom="A", email=destinataire, mot_de_passe="secret", role="ETUDIANT"
+    )
+
+
+def test_file_liee_a_la_transaction(db):
+    _creation_compte(db, "annule@example.com")
+    db.rollback()
+    _creation_compte(db, "valide@example.com")
+    db.commit()
+
+    assert [e.destinataire for e in db.query(EmailOutbox)] == ["valide@example.com"]
+
+
+def test_worker_envoie_par_lots(db):
+    mettre_en_file_lot(db, "creation_compte", [
+        {"destinataire": f"u{i}@example.com", "prenom": "U", "email": f"u{i}@example.com",
+         "mot_de_passe": "secret", "role": "ETUDIANT"}
+        for i in range(5)
+    ])
+    db.commit()
+    transport = TransportLocal()
+    worker = _worker(db, transport, taille_lot=3)
+
+    assert asyncio.run(worker.traiter_lot()) == {"envoyes": 3, "reessais": 0, "echecs": 0}
+    assert asyncio.run(worker.traiter_lot()) == {"envoyes": 2, "reessais": 0, "echecs": 0}
+    assert asyncio.run(worker.traiter_lot()) == {"envoyes": 0, "reessais": 0, "echecs": 0}
+
+    db.expire_all()
+    emails = db.query(EmailOutbox).all()
+    assert all(e.statut == StatutEmailEnum.ENVOYE and e.parametres is None for e in emails)
+    assert len(transport.messages) == 5
+
+
+def test_nouvelle_tentative_puis_lettre_morte(db, monkeypatch):
+    monkeypatch.setattr(email_outbox, "TENTATIVES_MAX", 2)
+    _creation_compte(db, "injoignable@example.com")
+    db.commit()
+    worker = _worker(db, TransportLocal(echecs=10))
+
+    assert asyncio.run(worker.traiter_lot())["reessais"] == 1
+    db.expire_all()
+    email = db.query(EmailOutbox).one()
+    assert email.statut == StatutEmailEnum.EN_ATTENTE
+    assert email.date_disponible > datetime.utcnow()
+    assert json.loads(email.parametres)["role"] == "ETUDIANT"
+
+    # Replanifié : rien à envoyer tant que le délai n'est pas écoulé
+    assert asyncio.run(worker.traiter_lot())["reessais"] == 0
+    email.date_disponible = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+
+    assert asyncio.run(worker.traiter_lot())["echecs"] == 1
+    db.expire_all()
+    email = db.query(EmailOutbox).one()
+    assert email.statut == StatutEmailEnum.ECHEC
+    assert email.tentatives == 2
+    assert email.derniere_erreur
+
+
+def test_limite_de_debit_par_modele():
+    limiteur = LimiteurDebit(par_seconde=50)
+
+    async def scenario():
+        debut = time.monotonic()
+        await asyncio.gather(*(limiteur.acquerir() for _ in range(60)))
+        return time.monotonic() - debut
+
+    # 50 jetons disponibles d'emblée, les 10 suivants au rythme de 50/s
+    assert asyncio.run(scenario()) >= 0.15
+
+
+def test_debit_inferieur_a_un_par_seconde(monkeypatch):
+    horloge = [1000.0]
+    attentes = []
+
+    async def dormir(secondes):
+        attentes.append(secondes)
+        horloge[0] += secondes
+
+    monkeypatch.setattr(email_outbox.time, "monotonic", lambda: horloge[0])
+    monkeypatch.setattr(email_outbox.asyncio, "sleep", dormir)
+    limiteur = LimiteurDebit(par_seconde=0.5)
+
+    async def scenario():
+        for _ in range(3):
+            await limiteur.acquerir()
+
+    asyncio.run(scenario())
+    # Un envoi immédiat, puis un toutes les 2 secondes
+    assert horloge[0] == 1004.0
+    assert attentes == [2.0, 2.0]
+
+
+def test_debits_invalides_refuses(monkeypatch):
+    monkeypatch.setenv("EMAIL_DEBITS_MODELES", "creation_compte=0")
+    with pytest.raises(ValueError):
+        email_outbox.lire_debits_modeles()
+    with pytest.raises(ValueError):
+        LimiteurDebit(par_seconde=-1)
+
+
+def _soumissions(db, destinataire, nombre, prenom_formateur="F"):
+    mettre_en_file_lot(db, "soumission_travail", [
+        {"destinataire": destinataire, "prenom_formateur": prenom_formateur,
+         "prenom_etudiant": f"E{i}", "nom_etudiant": "N", "titre_travail": "TP",
+         "nom_matiere": "Maths", "date_soumission": "01/01/2026 10:00", "commentaire": ""}
+        for i in range(nombre)
+    ])
+    db.commit()
+
+
+def test_regroupement_en_recapitulatif(db, monkeypatch):
+    monkeypatch.setattr(email_outbox, "FENETRE_DIGEST", 300)
+    transport = TransportLocal()
+    worker = _worker(db, transport)
+
+    # Première notification de la fenêtre : envoyée tout de suite, seule
+    _soumissions(db, "formateur@example.com", 1)
+    assert asyncio.run(worker.traiter_lot())["envoyes"] == 1
+    assert len(transport.messages) == 1
+
+    # Les suivantes attendent la fin de la fenêtre ; un autre destinataire n'attend pas
+    _soumissions(db, "formateur@example.com", 30)
+    _soumissions(db, "autre@example.com", 1, prenom_formateur="G")
+    assert asyncio.run(worker.traiter_lot())["envoyes"] == 1
+    assert len(transport.messages) == 2
+    db.expire_all()
+    reportees = db.query(EmailOutbox).filter(EmailOutbox.statut == StatutEmailEnum.EN_ATTENTE).all()
+    assert len(reportees) == 30
+    assert all(e.date_disponible > datetime.utcnow() + timedelta(seconds=200) for e in reportees)
+    assert asyncio.run(worker.traiter_lot())["envoyes"] == 0
+
+    # Fin de la fenêtre : un seul récapitulatif pour les 30
+    for email in db.query(EmailOutbox).filter(EmailOutbox.statut == StatutEmailEnum.ENVOYE):
+        email.date_envoi -= timedelta(seconds=300)
+    for email in reportees:
+        email.date_disponible -= timedelta(seconds=300)
+    db.commit()
+    assert asyncio.run(worker.traiter_lot())["envoyes"] == 30
+    assert len(transport.messages) == 3
+    assert "30 travaux rendus" in json.dumps(transport.messages[2], ensure_ascii=False)
+    db.expire_all()
+    assert {e.statut for e in db.query(EmailOutbox)} == {StatutEmailEnum.ENVOYE}
+
+
+def test_fenetre_nulle_envoi_immediat(db, monkeypatch):
+    monkeypatch.setattr(email_outbox, "FENETRE_DIGEST", 0)
+    transport = TransportLocal()
+    worker = _worker(db, transport)
+    for _ in range(2):
+        mettre_en_file(
+            db, "assignation_travail", "etudiant@example.com",
+            prenom="E", titre_travail="TP", nom_matiere="Maths",
+            formateur="F G", date_echeance="01/01/2026 10:00", description=""
+        )
+        db.commit()
+        assert asyncio.run(worker.traiter_lot())["envoyes"] == 1
+
+    assert len(transport.messages) == 2
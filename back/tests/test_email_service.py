@@ -0,0 +1,69 @@
+import asyncio
+
+from utils.email_service import EmailService, TransportLocal
+
+
+def _service(transport, **reglages):
+    service = EmailService(transport=transport)
+    service.delai_initial = 0
+    for nom, valeur in reglages.items():
+        setattr(service, nom, valeur)
+    return service
+
+
+def test_lot_envoye_avec_client_partage():
+    transport = TransportLocal()
+    service = _service(transport, concurrence_max=3)
+
+    async def scenario():
+        resultats = await service.envoyer_lot(
+            service.envoyer_email_assignation_travail,
+            [
+                {
+                    "destinataire": f"etudiant{i}@example.com", "prenom": f"E{i}",
+                    "titre_travail": "TP", "nom_matiere": "Algo", "formateur": "F",
+                    "date_echeance": "01/01/2026", "description": "Consigne"
+                }
+                for i in range(20)
+            ]
+        )
+        client = service._client
+        await service.fermer()
+        return resultats, client
+
+    resultats, client = asyncio.run(scenario())
+
+    assert resultats == [True] * 20
+    assert client is not None and client.is_closed
+    assert sorted(m["to"][0]["email"] for m in transport.messages) == sorted(
+        f"etudiant{i}@example.com" for i in range(20)
+    )
+    assert transport.messages[0]["subject"] == "Nouveau travail : TP - Algo"
+
+
+def test_nouvelles_tentatives_sur_erreur_transitoire():
+    transport = TransportLocal(echecs=2)
+    service = _service(transport, tentatives_max=3)
+
+    envoye = asyncio.run(service.envoyer_email_creation_compte(
+        destinataire="a@example.com", prenom="A", email="a@example.com",
+        mot_de_passe="x", role="ETUDIANT"
+    ))
+
+    assert envoye is True
+    assert transport.nb_requetes == 3
+    assert len(transport.messages) == 1
+
+
+def test_abandon_apres_le_nombre_maximal_de_tentatives():
+    transport = TransportLocal(echecs=5)
+    service = _service(transport, tentatives_max=2)
+
+    envoye = asyncio.run(service.envoyer_email_creation_compte(
+        destinataire="a@example.com", prenom="A", email="a@example.com",
+        mot_de_passe="x", role="ETUDIANT"
+    ))
+
+    assert envoye is False
+    assert transport.nb_requetes == 2
+    assert transport.messages == []
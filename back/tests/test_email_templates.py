@@ -0,0 +1,46 @@
+import pytest
+
+from utils.email_templates import Gabarit, modeles
+
+
+def test_rendu_identique_au_formatage():
+    texte = "Bonjour '{prenom}', 100% {note:.1f}/{note_max} \"{prenom}\""
+    variables = {"prenom": "Awa", "note": 15.25, "note_max": 20}
+
+    assert Gabarit(texte).rendre(variables) == texte.format(**variables)
+
+
+def test_rendu_par_lot_avec_variables_communes():
+    modele = modeles["assignation_travail"]
+    communes = {
+        "titre_travail": "TP 1", "nom_matiere": "Réseaux", "formateur": "Jean Dupont",
+        "date_echeance": "15/01/2026 23:59", "description": "Configurer un routeur"
+    }
+    lot = [{"prenom": f"E{i}"} for i in range(3)]
+
+    assert modele.rendre_lot(lot, communes) == [modele.rendre({**communes, **v}) for v in lot]
+    sujet, corps = modele.rendre_lot(lot, communes)[2]
+    assert sujet == "Nouveau travail : TP 1 - Réseaux"
+    assert "<strong>E2</strong>" in corps and "Configurer un routeur" in corps
+
+
+def test_conversions_et_caracteres_speciaux():
+    texte = "{nom!r} {nom!s:>6} {nom!a} {note:'^7}"
+    variables = {"nom": "Awa'é\"", "note": 12}
+
+    assert Gabarit(texte).rendre(variables) == texte.format(**variables)
+    assert Gabarit(texte).specialiser({"nom": "x"}).rendre({"note": 1}) == texte.format(nom="x", note=1)
+    lot = [{"nom": n, "note": i} for i, n in enumerate(["a", "b'", "ç"])]
+    assert Gabarit(texte).rendre_lot(iter(lot)) == [texte.format(**v) for v in lot]
+    assert Gabarit("{nom} statique").rendre_lot(lot[:2], {"nom": "x"}) == ["x statique"] * 2
+
+
+def test_variables_manquantes_ou_invalides():
+    with pytest.raises(KeyError):
+        modeles["creation_compte"].rendre({"prenom": "Awa"})
+    with pytest.raises(ValueError):
+        Gabarit("Bonjour {utilisateur.prenom}")
+    with pytest.raises(ValueError):
+        Gabarit("Bonjour {prenom!x}")
+    with pytest.raises(ValueError):
+        Gabarit("Note {note:{largeur}}")
@@ -0,0 +1,131 @@
+from models import Inscription, RoleEnum, StatutAssignationEnum
+from routes import espaces_pedagogiques
+
+
+def _peupler(fabrique, nb_espaces):
+    promotion = fabrique.promotion()
+    etudiants = [fabrique.etudiant(promotion) for _ in range(3)]
+    for i in range(nb_espaces):
+        formateur = fabrique.formateur(nom=f"Formateur{i}") if i % 2 == 0 else None
+        espace = fabrique.espace(promotion, formateur)
+        for etudiant in etudiants[:i % 4]:
+            fabrique.inscription(espace, etudiant)
+        for _ in range(i % 3):
+            fabrique.travail(espace)
+    fabrique.db.commit()
+
+
+def test_liste_espaces_une_seule_requete(db, fabrique, compteur_requetes, client):
+    de = fabrique.utilisateur(RoleEnum.DE)
+    _peupler(fabrique, nb_espaces=6)
+    db.refresh(de)
+    api = client(espaces_pedagogiques, "/api/espaces-pedagogiques", de)
+
+    compteur_requetes.clear()
+    reponse = api.get("/api/espaces-pedagogiques/liste")
+
+    assert reponse.status_code == 200
+    assert len(compteur_requetes) == 1
+    espaces = reponse.json()["espaces"]
+    assert reponse.json()["total"] == 6
+    assert sorted(e["nb_etudiants"] for e in espaces) == [0, 0, 1, 1, 2, 3]
+    assert sorted(e["nb_travaux"] for e in espaces) == [0, 0, 1, 1, 2, 2]
+    assert sum(e["formateur"] != "Non assigné" for e in espaces) == 3
+    assert all(e["filiere"] != "Inconnue" for e in espaces)
+
+
+def _peupler_espace(fabrique, formateur, nb_travaux, nb_etudiants):
+    promotion = fabrique.promotion()
+    espace = fabrique.espace(promotion, formateur)
+    etudiants = [fabrique.etudiant(promotion) for _ in range(nb_etudiants)]
+    for etudiant in etudiants:
+        fabrique.inscription(espace, etudiant)
+    statuts = list(StatutAssignationEnum)
+    for i in range(nb_travaux):
+        travail = fabrique.travail(espace)
+        for j, etudiant in enumerate(etudiants):
+            fabrique.assignation(travail, etudiant, statut=statuts[(i + j) % len(statuts)])
+    fabrique.db.commit()
+    return espace.id_espace
+
+
+def _statistiques(db, fabrique, compteur_requetes, client, nb_travaux, nb_etudiants):
+    formateur = fabrique.formateur()
+    id_espace = _peupler_espace(fabrique, formateur, nb_travaux, nb_etudiants)
+    utilisateur = formateur.utilisateur
+    db.refresh(utilisateur)
+    api = client(espaces_pedagogiques, "/api/espaces-pedagogiques", utilisateur)
+
+    compteur_requetes.clear()
+    reponse = api.get(f"/api/espaces-pedagogiques/{id_espace}/statistiques")
+    assert reponse.status_code == 200
+    return reponse.json(), len(compteur_requetes)
+
+
+def test_statistiques_espace_nombre_de_requetes_constant(db, fabrique, compteur_requetes, client):
+    _, requetes_petit = _statistiques(db, fabrique, compteur_requetes, client, 1, 1)
+    donnees, requetes_grand = _statistiques(db, fabrique, compteur_requetes, client, 5, 6)
+
+    assert requetes_grand == requetes_petit <= 4
+    stats = donnees["statistiques"]
+    assert stats["nb_etudiants_inscrits"] == 6
+    assert stats["nb_travaux"] == 5
+    assert stats["assignations"] == {
+        "total": 30, "assignees": 8, "en_cours": 8, "rendues": 7, "notees": 7
+    }
+    for travail in donnees["travaux"]:
+        compteurs = travail["assignations"]
+        assert compteurs["total"] == 6
+        assert sum(v for k, v in compteurs.items() if k != "total") == 6
+    assert donnees["espace"]["formateur"]["nom"] == "Formateur"
+    assert len(donnees["etudiants"]) == 6
+
+
+def test_statistiques_espace_refusees_a_un_autre_formateur(db, fabrique, client):
+    id_espace = _peupler_espace(fabrique, fabrique.formateur(), 1, 1)
+    autre = fabrique.formateur()
+    db.commit()
+    db.refresh(autre.utilisateur)
+    api = client(espaces_pedagogiques, "/api/espaces-pedagogiques", autre.utilisateur)
+
+    reponse = api.get(f"/api/espaces-pedagogiques/{id_espace}/statistiques")
+
+    assert reponse.status_code == 403
+
+
+def test_ajout_etudiants_ensembliste(db, fabrique, compteur_requetes, client):
+    de = fabrique.utilisateur(RoleEnum.DE)
+    promotion = fabrique.promotion()
+    autre_promotion = fabrique.promotion()
+    espace = fabrique.espace(promotion)
+    etudiants = [fabrique.etudiant(promotion) for _ in range(5)]
+    externe = fabrique.etudiant(autre_promotion)
+    fabrique.inscription(espace, etudiants[0])
+    db.commit()
+    id_espace = espace.id_espace
+    ids = [e.id_etudiant for e in etudiants]
+    id_externe = externe.id_etudiant
+    db.refresh(de)
+    api = client(espaces_pedagogiques, "/api/espaces-pedagogiques", de)
+
+    compteur_requetes.clear()
+    reponse = api.post(f"/api/espaces-pedagogiques/{id_espace}/etudiants", json={
+        "etudiants_ids": [ids[0], ids[1], ids[1], id_externe, "ETD_INCONNU"]
+    })
+
+    assert reponse.status_code == 200
+    assert reponse.json()["ajoutes"] == 2
+    assert reponse.json()["deja_inscrits"] == 1
+    assert reponse.json()["invalides"] == 1
+    # espace, validation + dédoublonnage, INSERT multi-lignes
+    requetes = [r for r in compteur_requetes if not r.lstrip().upper().startswith(("BEGIN", "COMMIT"))]
+    assert len(requetes) == 3
+
+    reponse = api.post(f"/api/espaces-pedagogiques/{id_espace}/etudiants", json={
+        "id_promotion": promotion.id_promotion
+    })
+
+    assert reponse.json()["ajoutes"] == 3
+    assert reponse.json()["deja_inscrits"] == 2
+    inscrits = {i.id_etudiant for i in db.query(Inscription).filter(Inscription.id_espace == id_espace)}
+    assert inscrits == set(ids) | {id_externe}
@@ -0,0 +1,32 @@
+from utils import generators
+from utils.generators import GenerateurIdentifiants
+
+
+def test_identifiants_uniques_et_croissants():
+    generateur = GenerateurIdentifiants(noeud=7)
+    ids = generateur.generer("ASSIGNATION", 10000) + generateur.generer("ASG", 10)
+
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    assert all(i.startswith("ASG_") and len(i) == 18 for i in ids)
+
+
+def test_prefixes_par_type():
+    assert generators.generer_identifiant_unique("TRAVAIL").startswith("TRV_")
+    assert generators.generer_identifiant_unique("PROMO").startswith("PRM_")
+    assert generators.generer_identifiant_unique("INS").startswith("INS_")
+    assert generators.generer_identifiant_unique("inconnu").startswith("USR_")
+
+
+def test_horloge_qui_recule_et_noeuds_distincts(monkeypatch):
+    horloge = iter([1000.0, 999.0])
+    monkeypatch.setattr(generators.time, "time", lambda: next(horloge))
+    generateur = GenerateurIdentifiants(noeud=1)
+
+    premier = generateur.generer("ESPACE", 1)[0]
+    second = generateur.generer("ESPACE", 1)[0]
+    assert premier < second
+
+    monkeypatch.setattr(generators.time, "time", lambda: 1000.0)
+    autre_noeud = GenerateurIdentifiants(noeud=2).generer("ESPACE", 1)[0]
+    assert autre_noeud not in (premier, second)
@@ -0,0 +1,185 @@
+from models import RoleEnum, StatutEtudiantEnum
+from routes import gestion_comptes
+
+
+def _peupler_etudiants(fabrique):
+    promotion = fabrique.promotion()
+    autre = fabrique.promotion(annee_academique="2024-2025")
+    noms = ["Martin", "Bernard", "Dubois", "Durand", "Petit", "Moreau", "Martinez"]
+    for i, nom in enumerate(noms):
+        fabrique.etudiant(promotion if i % 2 == 0 else autre, nom=nom,
+                          statut=StatutEtudiantEnum.SUSPENDU if i == 3 else StatutEtudiantEnum.ACTIF)
+    fabrique.db.commit()
+    return promotion
+
+
+def test_etudiants_pages_par_curseur(db, fabrique, compteur_requetes, client):
+    de = fabrique.utilisateur(RoleEnum.DE)
+    _peupler_etudiants(fabrique)
+    api = client(gestion_comptes, "/api/gestion-comptes", de)
+
+    compteur_requetes.clear()
+    premiere = api.get("/api/gestion-comptes/etudiants", params={"limite": 4})
+
+    assert premiere.status_code == 200
+    # Un comptage et une page
+    assert len(compteur_requetes) == 2
+    assert premiere.headers["X-Total-Count"] == "7"
+    assert [e["nom"] for e in premiere.json()["etudiants"]] == ["Bernard", "Dubois", "Durand", "Martin"]
+    assert premiere.json()["etudiants"][0]["promotion"] == "Promotion 2024-2025"
+
+    seconde = api.get("/api/gestion-comptes/etudiants", params={
+        "limite": 4, "curseur": premiere.headers["X-Curseur-Suivant"], "avec_total": False
+    })
+    assert [e["nom"] for e in seconde.json()["etudiants"]] == ["Martinez", "Moreau", "Petit"]
+    assert "X-Curseur-Suivant" not in seconde.headers
+    assert "X-Total-Count" not in seconde.headers
+
+    # Sans limite : tous les comptes, comme avant la pagination
+    toutes = api.get("/api/gestion-comptes/etudiants")
+    assert len(toutes.json()["etudiants"]) == 7
+    assert "X-Curseur-Suivant" not in toutes.headers
+
+
+def test_etudiants_recherche_et_filtres(db, fabrique, client):
+    de = fabrique.utilisateur(RoleEnum.DE)
+    promotion = _peupler_etudiants(fabrique)
+    api = client(gestion_comptes, "/api/gestion-comptes", de)
+
+    def noms(**params):
+        reponse = api.get("/api/gestion-comptes/etudiants", params=params)
+        assert reponse.status_code == 200
+        return [e["nom"] for e in reponse.json()["etudiants"]]
+
+    assert noms(recherche="mart") == ["Martin", "Martinez"]
+    # Recherche par préfixe uniquement, jokers de la saisie neutralisés
+    assert noms(recherche="tin") == []
+    assert noms(recherche="%") == []
+    assert noms(id_promotion=promotion.id_promotion) == ["Dubois", "Martin", "Martinez", "Petit"]
+    assert noms(statut="SUSPENDU") == ["Durand"]
+    assert api.get("/api/gestion-comptes/etudiants", params={"curseur": "???"}).status_code == 400
+
+
+def test_formateurs_pagines_et_filtres(db, fabrique, client):
+    de = fabrique.utilisateur(RoleEnum.DE)
+    for nom in ["Zola", "Hugo", "Camus"]:
+        fabrique.formateur(nom=nom)
+    inactif = fabrique.formateur(nom="Balzac")
+    db.flush()
+    db.query(gestion_comptes.Utilisateur).filter(
+        gestion_comptes.Utilisateur.identifiant == inactif.identifiant
+    ).update({"actif": False})
+    db.commit()
+    api = client(gestion_comptes, "/api/gestion-comptes", de)
+
+    reponse = api.get("/api/gestion-comptes/formateurs", params={"limite": 2})
+    assert reponse.headers["X-Total-Count"] == "4"
+    assert [f["nom"] for f in reponse.json()["formateurs"]] == ["Balzac", "Camus"]
+
+    actifs = api.get("/api/gestion-comptes/formateurs", params={"actif": True, "recherche": "hu"})
+    assert [f["nom"] for f in actifs.json()["formateurs"]] == ["Hugo"]
+
+    etudiant = fabrique.etudiant(fabrique.promotion())
+    db.commit()
+    interdit = client(gestion_comptes, "/api/gestion-comptes", db.get(gestion_comptes.Utilisateur, etudiant.identifiant))
+    assert interdit.get("/api/gestion-comptes/formateurs").status_code == 403
+
+
+def test_import_etudiants_par_lots(db, fabrique, compteur_requetes, client, monkeypatch):
+    from models import EmailOutbox, Etudiant
+    from utils import import_etudiants
+
+    monkeypatch.setattr(import_etudiants, "TAILLE_LOT", 3)
+    de = fabrique.utilisateur(RoleEnum.DE)
+    promotion = fabrique.promotion()
+    existant = fabrique.etudiant(promotion)
+    db.commit()
+    email_existant = db.get(gestion_comptes.Utilisateur, existant.identifiant).email
+    api = client(gestion_comptes, "/api/gestion-comptes", de)
+
+    contenu = "\n".join([
+        "Email;Nom;Prénom",
+        "ada@example.com;Lovelace;Ada",
+        "pas-un-email;Turing;Alan",
+        f"{email_existant};Deja;La",
+        "",
+        "grace@example.com;Hopper;Grace",
+        "ADA@example.com;Double;Ada",
+        "linus@example.com;Torvalds;Linus",
+        "ken@example.com;Thompson;",
+    ])
+    compteur_requetes.clear()
+    reponse = api.post(
+        "/api/gestion-comptes/importer-etudiants",
+        files={"fichier": ("etudiants.csv", ("\ufeff" + contenu).encode(), "text/csv")},
+        data={"id_promotion": promotion.id_promotion}
+    )
+
+    assert reponse.status_code == 200
+    rapport = reponse.json()
+    assert (rapport["total"], rapport["crees"], rapport["erreurs"]) == (7, 3, 4)
+    statuts = {l["ligne"]: (l["statut"], l.get("erreur")) for l in rapport["lignes"]}
+    assert statuts[2][0] == statuts[6][0] == statuts[8][0] == "cree"
+    assert statuts[3] == ("erreur", "Champ invalide ou manquant : email")
+    assert statuts[4] == ("erreur", "Cet email est déjà utilisé")
+    assert statuts[7] == ("erreur", "Email en double dans le fichier")
+    assert statuts[9] == ("erreur", "Champ invalide ou manquant : prenom")
+
+    assert db.query(Etudiant).count() == 4
+    assert db.query(EmailOutbox).filter(EmailOutbox.modele == "creation_compte").count() == 3
+    # 3 INSERT multi-lignes par lot créant des comptes (+ création du compteur de matricules)
+    assert len([r for r in compteur_requetes if r.lstrip().upper().startswith("INSERT")]) == 7
+    matricules = sorted(l["matricule"] for l in rapport["lignes"] if l["statut"] == "cree")
+    assert [int(m[-4:]) for m in matricules] == [1, 2, 3]
+
+
+def test_import_etudiants_fichier_invalide(db, fabrique, client):
+    de = fabrique.utilisateur(RoleEnum.DE)
+    db.commit()
+    api = client(gestion_comptes, "/api/gestion-comptes", de)
+
+    reponse = api.post(
+        "/api/gestion-comptes/importer-etudiants",
+        files={"fichier": ("etudiants.csv", b"email,nom\nx@example.com,X\n", "text/csv")}
+    )
+    assert reponse.status_code == 400
+    assert "prenom" in reponse.json()["detail"]
+
+    inconnue = api.post(
+        "/api/gestion-comptes/importer-etudiants",
+        files={"fichier": ("etudiants.csv", b"email,nom,prenom,id_promotion\nx@example.com,X,Y,PRM_X\n", "text/csv")}
+    )
+    assert inconnue.json()["lignes"][0]["erreur"] == "Promotion introuvable"
+
+
+def test_import_etudiants_xlsx(db, fabrique, client):
+    import io
+    from openpyxl import Workbook
+
+    de = fabrique.utilisateur(RoleEnum.DE)
+    promotion = fabrique.promotion()
+    db.commit()
+    classeur = Workbook()
+    feuille = classeur.active
+    feuille.append(["Email", "Nom", "Prénom", "id_promotion"])
+    feuille.append(["ada@example.com", "Lovelace", "Ada", promotion.id_promotion])
+    feuille.append([None, None, None, None])
+    feuille.append(["alan@example.com", "Turing", None, promotion.id_promotion])
+    contenu = io.BytesIO()
+    classeur.save(contenu)
+    api = client(gestion_comptes, "/api/gestion-comptes", de)
+
+    reponse = api.post(
+        "/api/gestion-comptes/importer-etudiants",
+        files={"fichier": ("etudiants.xlsx", contenu.getvalue(),
+                           "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
+    )
+
+    assert reponse.status_code == 200
+    assert [(l["ligne"], l["statut"]) for l in reponse.json()["lignes"]] == [(2, "cree"), (4, "erreur")]
+
+    illisible = api.post(
+        "/api/gestion-comptes/importer-etudiants",
+        files={"fichier": ("etudiants.xlsx", b"pas un classeur", "application/octet-stream")}
+    )
+    assert illisible.status_code == 400
@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from core import limiteur
+from core.limiteur import LimiteurConnexions, StockageMemoire, limiteur_connexions
+from core.jwt import get_password_hash
+from models import RoleEnum, TentativeConnexion
+from routes import auth
+
+
+def test_fenetre_glissante(monkeypatch):
+    horloge = [1000.0]
+    monkeypatch.setattr(limiteur.time, "time", lambda: horloge[0])
+    limiteur_test = LimiteurConnexions(StockageMemoire(), echecs_max=3, fenetre=60)
+
+    for secondes in (0, 10, 20):
+        horloge[0] = 1000 + secondes
+        assert limiteur_test.attente("Ada@Example.com ") is None
+        limiteur_test.enregistrer_echec("ada@example.com")
+
+    assert limiteur_test.attente("ada@example.com") == pytest.approx(40)
+    # Le premier échec sort de la fenêtre : une tentative est de nouveau permise
+    horloge[0] = 1061
+    assert limiteur_test.attente("ada@example.com") is None
+    limiteur_test.enregistrer_echec("ada@example.com")
+    assert limiteur_test.attente("ada@example.com") == pytest.approx(9)
+
+    limiteur_test.reinitialiser("ADA@example.com")
+    assert limiteur_test.attente("ada@example.com") is None
+
+
+def test_stockage_memoire_borne():
+    stockage = StockageMemoire(taille_max=2)
+    for cle in ("a", "b", "c"):
+        stockage.ajouter(cle, 1000.0, 60, 5)
+    assert stockage.lister("a", 0) == []
+    assert stockage.lister("c", 0) == [1000.0]
+
+
+def test_login_limite_sans_requete_et_journalise_les_echecs(db, fabrique, compteur_requetes, client, monkeypatch):
+    monkeypatch.setattr(auth, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    monkeypatch.setattr(limiteur_connexions, "stockage", StockageMemoire())
+    utilisateur = fabrique.utilisateur(RoleEnum.FORMATEUR)
+    utilisateur.mot_de_passe = get_password_hash("secret")
+    db.commit()
+    api = client(auth, "/api/auth", utilisateur)
+
+    for _ in range(limiteur_connexions.echecs_max):
+        reponse = api.post("/api/auth/login", json={"email": utilisateur.email, "mot_de_passe": "faux"})
+        assert reponse.status_code == 401
+
+    compteur_requetes.clear()
+    bloque = api.post("/api/auth/login", json={"email": utilisateur.email, "mot_de_passe": "secret"})
+    assert bloque.status_code == 429
+    assert int(bloque.headers["Retry-After"]) > 0
+    assert not any("tentative_connexion" in r for r in compteur_requetes)
+
+    limiteur._journal.submit(lambda: None).result()
+    journal = db.query(TentativeConnexion).all()
+    assert len(journal) == limiteur_connexions.echecs_max
+    assert not any(t.succes for t in journal)
+
+    api.post("/api/auth/reset-tentatives", json={"email": utilisateur.email})
+    connecte = api.post("/api/auth/login", json={"email": utilisateur.email, "mot_de_passe": "secret"})
+    assert connecte.status_code == 200
+    assert db.query(TentativeConnexion).count() == limiteur_connexions.echecs_max
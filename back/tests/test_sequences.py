@@ -0,0 +1,46 @@
+from models import CompteurSequence
+from utils import generators
+from utils.generators import GenerateurIdentifiants
+from utils.sequences import allouer_matricules, allouer_numeros_employe, attribuer_noeud_identifiants
+
+
+def test_blocs_consecutifs_par_annee(db, fabrique):
+    assert allouer_matricules(db, 3, annee=2026) == ["MAT20260001", "MAT20260002", "MAT20260003"]
+    assert allouer_matricules(db, annee=2026) == ["MAT20260004"]
+    assert allouer_matricules(db, 2, annee=2027) == ["MAT20270001", "MAT20270002"]
+    assert allouer_numeros_employe(db, annee=2026) == ["EMP2026001"]
+    assert allouer_matricules(db, 0) == []
+
+
+def test_compteur_repart_des_numeros_existants(db, fabrique):
+    promotion = fabrique.promotion()
+    for matricule in ["MAT20264821", "MAT20261200", "MAT2025999", "AUTRE"]:
+        fabrique.etudiant(promotion).matricule = matricule
+    db.commit()
+
+    assert allouer_matricules(db, 2, annee=2026) == ["MAT20264822", "MAT20264823"]
+
+
+def test_reservation_annulee_avec_la_transaction(db):
+    allouer_matricules(db, 5, annee=2026)
+    db.commit()
+    allouer_matricules(db, 10, annee=2026)
+    db.rollback()
+
+    assert db.get(CompteurSequence, ("matricule", 2026)).valeur == 5
+    assert allouer_matricules(db, annee=2026) == ["MAT20260006"]
+
+
+def test_noeuds_distincts_par_processus(db, monkeypatch):
+    noeuds = []
+    for _ in range(3):
+        # Un générateur par processus démarré, sans ID_NOEUD
+        monkeypatch.delenv("ID_NOEUD", raising=False)
+        monkeypatch.setattr(generators, "generateur_identifiants", GenerateurIdentifiants())
+        monkeypatch.setattr("utils.sequences.generateur_identifiants", generators.generateur_identifiants)
+        noeuds.append(attribuer_noeud_identifiants(db))
+    assert noeuds == [1, 2, 3]
+
+    explicite = GenerateurIdentifiants(noeud=42)
+    monkeypatch.setattr("utils.sequences.generateur_identifiants", explicite)
+    assert attribuer_noeud_identifiants(db) == 42
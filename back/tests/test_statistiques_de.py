@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from models import StatutAssignationEnum, StatutEtudiantEnum
+from utils.statistiques import calculer_tableau_de_bord_de
+
+# Compteurs + effectifs par promotion + travaux récents + espaces sans formateur
+NB_REQUETES_MAX = 4
+
+
+def _peupler(fabrique, nb_etudiants):
+    annee = datetime.now().year
+    promo_courante = fabrique.promotion(f"{annee}-{annee + 1}", nom_filiere="Informatique")
+    promo_ancienne = fabrique.promotion("2019-2020", nom_filiere="Gestion")
+    formateur = fabrique.formateur()
+    espace = fabrique.espace(promo_courante, formateur)
+    fabrique.espace(promo_ancienne)
+    travail = fabrique.travail(espace)
+
+    statuts = list(StatutAssignationEnum)
+    for i in range(nb_etudiants):
+        statut = StatutEtudiantEnum.SUSPENDU if i == 0 else StatutEtudiantEnum.ACTIF
+        etudiant = fabrique.etudiant(promo_courante, statut=statut)
+        fabrique.assignation(travail, etudiant, statut=statuts[i % len(statuts)])
+    fabrique.etudiant(promo_ancienne)
+    fabrique.db.commit()
+
+
+def test_tableau_de_bord_de_nombre_de_requetes_constant(db, fabrique, compteur_requetes):
+    _peupler(fabrique, nb_etudiants=8)
+
+    compteur_requetes.clear()
+    resultat = calculer_tableau_de_bord_de(db)
+    assert len(compteur_requetes) <= NB_REQUETES_MAX
+
+    assert resultat["statistiques_generales"] == {
+        "total_etudiants": 9,
+        "etudiants_actifs": 8,
+        "total_formateurs": 1,
+        "total_filieres": 2,
+        "total_promotions": 2,
+        "total_espaces": 2,
+        "total_travaux": 1
+    }
+    assert resultat["statistiques_travaux"] == {"en_cours": 2, "rendus": 2, "notes": 2, "total": 6}
+    assert resultat["repartition_filieres"] == [
+        {"filiere": "Gestion", "nombre_etudiants": 1},
+        {"filiere": "Informatique", "nombre_etudiants": 8},
+    ]
+    assert [p["nombre_etudiants"] for p in resultat["promotions_actives"]] == [8]
+    assert len(resultat["activite_recente"]) == 1
+    assert len(resultat["espaces_sans_formateur"]) == 1
+
+
+def test_tableau_de_bord_de_ne_depend_pas_du_volume(db, fabrique, compteur_requetes):
+    _peupler(fabrique, nb_etudiants=60)
+
+    compteur_requetes.clear()
+    calculer_tableau_de_bord_de(db)
+    assert len(compteur_requetes) <= NB_REQUETES_MAX
+
+
+def test_tableau_de_bord_de_base_vide(db, compteur_requetes):
+    resultat = calculer_tableau_de_bord_de(db)
+    assert len(compteur_requetes) <= NB_REQUETES_MAX
+    assert resultat["statistiques_generales"]["total_etudiants"] == 0
+    assert resultat["statistiques_travaux"]["total"] == 0
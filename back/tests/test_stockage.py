@@ -0,0 +1,85 @@
+import asyncio
+import io
+import os
+import time
+from datetime import datetime, timedelta
+
+from models import FichierStocke
+from utils.stockage import StockageLocal, collecter_fichiers, recompter_references, referencer
+
+
+def _blob(stockage, sha256, age_heures):
+    chemin = stockage.chemin(sha256)
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    chemin.write_bytes(b"contenu")
+    horodatage = time.time() - age_heures * 3600
+    os.utime(chemin, (horodatage, horodatage))
+
+
+def test_ramasse_miettes(db, tmp_path):
+    stockage = StockageLocal(tmp_path)
+    il_y_a_2_jours = datetime.utcnow() - timedelta(days=2)
+    for sha256, references, date in [
+        ("a" * 64, 1, il_y_a_2_jours),                 # référencé
+        ("b" * 64, 0, il_y_a_2_jours),                 # plus référencé
+        ("c" * 64, 0, datetime.utcnow()),              # dé-référencé récemment
+    ]:
+        _blob(stockage, sha256, 48)
+        db.add(FichierStocke(sha256=sha256, taille=7, nb_references=references,
+                             date_creation=date, date_modification=date))
+    _blob(stockage, "d" * 64, 48)                      # orphelin (livraison interrompue)
+    _blob(stockage, "e" * 64, 0)                       # livraison en cours
+    for nom, age in [("ancien.part", 48), ("ancien", 48), ("recent.part", 0)]:
+        temporaire = tmp_path / "tmp" / nom            # envois interrompus / en cours
+        temporaire.parent.mkdir(exist_ok=True)
+        temporaire.write_bytes(b"partiel")
+        os.utime(temporaire, (time.time() - age * 3600,) * 2)
+    db.commit()
+
+    resultat = collecter_fichiers(db, stockage, timedelta(hours=24))
+
+    assert resultat == {"supprimes": 1, "orphelins": 1, "temporaires": 2}
+    assert [p.name for p in (tmp_path / "tmp").iterdir()] == ["recent.part"]
+    assert sorted(stockage.lister()) == ["a" * 64, "c" * 64, "e" * 64]
+    assert {f.sha256 for f in db.query(FichierStocke)} == {"a" * 64, "c" * 64}
+
+
+def test_recompter_references(db, fabrique):
+    promotion = fabrique.promotion()
+    travail = fabrique.travail(fabrique.espace(promotion))
+    for _ in range(3):
+        fabrique.assignation(travail, fabrique.etudiant(promotion)).fichier_sha256 = "a" * 64
+    db.add(FichierStocke(sha256="a" * 64, taille=7, nb_references=1))
+    db.add(FichierStocke(sha256="b" * 64, taille=7, nb_references=2))
+    db.commit()
+
+    assert recompter_references(db) == 2
+    assert {f.sha256: f.nb_references for f in db.query(FichierStocke)} == {"a" * 64: 3, "b" * 64: 0}
+
+
+def test_fichier_collecte_pendant_une_livraison_recree(db, tmp_path):
+    from fastapi import UploadFile
+
+    stockage = StockageLocal(tmp_path)
+    contenu = b"rendu identique"
+    premier = asyncio.run(stockage.ajouter(UploadFile(io.BytesIO(contenu))))
+    date = datetime.utcnow() - timedelta(days=2)
+    db.add(FichierStocke(sha256=premier.sha256, taille=len(contenu), nb_references=0,
+                         date_creation=date, date_modification=date))
+    db.commit()
+
+    # Même contenu reçu : le fichier existe encore, la copie reçue est mise de côté
+    second = asyncio.run(stockage.ajouter(UploadFile(io.BytesIO(contenu))))
+    assert second.temporaire is not None and second.temporaire.exists()
+
+    # Le ramasse-miettes passe avant la prise de référence
+    assert collecter_fichiers(db, stockage, timedelta(hours=24))["supprimes"] == 1
+    assert not second.chemin.exists()
+
+    referencer(db, second)
+    asyncio.run(stockage.confirmer(second))
+    db.commit()
+
+    assert second.chemin.read_bytes() == contenu
+    assert not second.temporaire.exists()
+    assert db.get(FichierStocke, second.sha256).nb_references == 1
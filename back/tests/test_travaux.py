@@ -0,0 +1,325 @@
+import hashlib
+import io
+import json
+import zipfile
+from datetime import datetime
+
+from models import Assignation, EmailOutbox, Etudiant, FichierStocke, RoleEnum, StatutAssignationEnum
+from routes import travaux
+from utils import stockage
+
+
+def _preparer(fabrique, nb_etudiants, nb_deja_assignes):
+    formateur = fabrique.formateur()
+    promotion = fabrique.promotion()
+    espace = fabrique.espace(promotion, formateur)
+    travail = fabrique.travail(espace)
+    etudiants = [fabrique.etudiant(promotion) for _ in range(nb_etudiants)]
+    for etudiant in etudiants[:nb_deja_assignes]:
+        fabrique.assignation(travail, etudiant, statut=StatutAssignationEnum.NOTE, note=12)
+    fabrique.db.commit()
+    return formateur, travail.id_travail, [e.id_etudiant for e in etudiants]
+
+
+def _assigner(db, fabrique, compteur_requetes, client, nb_etudiants, nb_deja_assignes):
+    formateur, id_travail, ids_etudiants = _preparer(fabrique, nb_etudiants, nb_deja_assignes)
+    utilisateur = formateur.utilisateur
+    db.refresh(utilisateur)
+    api = client(travaux, "/api/travaux", utilisateur)
+
+    compteur_requetes.clear()
+    reponse = api.post("/api/travaux/assigner", json={
+        "id_travail": id_travail,
+        "etudiants_ids": ids_etudiants + ids_etudiants[:1] + ["ETD_INCONNU"]
+    })
+    assert reponse.status_code == 201
+    requetes = [r for r in compteur_requetes if not r.lstrip().upper().startswith(("BEGIN", "COMMIT"))]
+    return reponse.json(), id_travail, ids_etudiants, len(requetes)
+
+
+def test_assignation_en_masse_nombre_de_requetes_constant(db, fabrique, compteur_requetes, client):
+    _, _, _, requetes_petit = _assigner(db, fabrique, compteur_requetes, client, 2, 1)
+    db.query(EmailOutbox).delete()
+    db.commit()
+    donnees, id_travail, ids_etudiants, requetes_grand = _assigner(
+        db, fabrique, compteur_requetes, client, 40, 10
+    )
+
+    # travail, assignations existantes, étudiants, UPDATE, INSERT assignations, INSERT emails
+    assert requetes_grand == requetes_petit <= 6
+    assert donnees["assignes"] == ids_etudiants
+    assert donnees["inconnus"] == ["ETD_INCONNU"]
+
+    emails = db.query(EmailOutbox).all()
+    assert len(emails) == 40
+    assert all(e.modele == "assignation_travail" for e in emails)
+    assert json.loads(emails[0].parametres)["nom_matiere"]
+
+    assignations = db.query(Assignation).filter(Assignation.id_travail == id_travail).all()
+    assert len(assignations) == 40
+    assert len({a.id_assignation for a in assignations}) == 40
+    assert all(a.statut == StatutAssignationEnum.ASSIGNE for a in assignations)
+
+
+def test_assignation_reservee_aux_formateurs(db, fabrique, client):
+    etudiant = fabrique.utilisateur(RoleEnum.ETUDIANT)
+    db.commit()
+    api = client(travaux, "/api/travaux", etudiant)
+
+    reponse = api.post("/api/travaux/assigner", json={"id_travail": "TRV_X", "etudiants_ids": []})
+
+    assert reponse.status_code == 403
+
+
+def _preparer_livraison(db, fabrique, client, nb_etudiants=1):
+    formateur, id_travail, ids_etudiants = _preparer(fabrique, nb_etudiants, 0)
+    for i, id_etudiant in enumerate(ids_etudiants):
+        db.add(Assignation(
+            id_assignation="ASG_LIVRAISON" + (f"_{i}" if i else ""),
+            id_travail=id_travail, id_etudiant=id_etudiant
+        ))
+    db.commit()
+    etudiant = db.query(Etudiant).filter(Etudiant.id_etudiant == ids_etudiants[0]).one()
+    return client(travaux, "/api/travaux", etudiant.utilisateur)
+
+
+def test_livraison_par_morceaux_avec_empreinte(db, fabrique, client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(stockage, "TAILLE_MORCEAU", 1000)
+    api = _preparer_livraison(db, fabrique, client)
+    contenu = bytes(range(256)) * 40
+
+    reponse = api.post(
+        "/api/travaux/livrer/ASG_LIVRAISON",
+        data={"commentaire": "Voici mon rendu"},
+        files={"fichier": ("rapport.pdf", contenu, "application/pdf")}
+    )
+
+    assert reponse.status_code == 201
+    assert reponse.json()["fichier_sha256"] == hashlib.sha256(contenu).hexdigest()
+    assignation = db.get(Assignation, "ASG_LIVRAISON")
+    db.refresh(assignation)
+    assert assignation.statut == StatutAssignationEnum.RENDU
+    assert assignation.fichier_taille == len(contenu)
+    assert assignation.fichier_sha256 == hashlib.sha256(contenu).hexdigest()
+    assert assignation.fichier_nom == "rapport.pdf"
+    assert (tmp_path / assignation.fichier_path).read_bytes() == contenu
+
+
+def test_livraison_trop_volumineuse_refusee(db, fabrique, client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(stockage, "TAILLE_MORCEAU", 1000)
+    monkeypatch.setattr(stockage, "TAILLE_MAX", 4096)
+    api = _preparer_livraison(db, fabrique, client)
+
+    reponse = api.post(
+        "/api/travaux/livrer/ASG_LIVRAISON",
+        files={"fichier": ("rapport.pdf", b"x" * 5000, "application/pdf")}
+    )
+
+    assert reponse.status_code == 413
+    assert not [f for f in (tmp_path / "uploads").rglob("*") if f.is_file()]
+    assignation = db.get(Assignation, "ASG_LIVRAISON")
+    db.refresh(assignation)
+    assert assignation.statut == StatutAssignationEnum.ASSIGNE
+    assert assignation.fichier_path is None
+
+
+def test_livraisons_identiques_stockees_une_fois(db, fabrique, client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    api = _preparer_livraison(db, fabrique, client, nb_etudiants=2)
+
+    def livrer(id_assignation, contenu):
+        reponse = api.post(
+            f"/api/travaux/livrer/{id_assignation}",
+            files={"fichier": ("rendu.zip", contenu, "application/zip")}
+        )
+        assert reponse.status_code == 201
+        return reponse.json()["fichier_sha256"]
+
+    # Travail collectif : même archive livrée pour deux assignations
+    commun = livrer("ASG_LIVRAISON", b"archive du groupe")
+    assert livrer("ASG_LIVRAISON_1", b"archive du groupe") == commun
+    blobs = [f for f in (tmp_path / "uploads" / "blobs").rglob("*") if f.is_file()]
+    assert [f.name for f in blobs] == [commun]
+    assert db.get(FichierStocke, commun).nb_references == 2
+
+    # Nouvelle soumission : l'ancien fichier perd une référence
+    nouveau = livrer("ASG_LIVRAISON_1", b"archive corrigee")
+    db.expire_all()
+    assert db.get(FichierStocke, commun).nb_references == 1
+    assert db.get(FichierStocke, nouveau).nb_references == 1
+
+
+def test_telechargement_conditionnel_et_partiel(db, fabrique, client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    api = _preparer_livraison(db, fabrique, client)
+    contenu = b"%PDF-1.4 " + bytes(range(256)) * 20
+    sha256 = api.post(
+        "/api/travaux/livrer/ASG_LIVRAISON",
+        files={"fichier": ("rapport final.pdf", contenu, "application/octet-stream")}
+    ).json()["fichier_sha256"]
+
+    complet = api.get("/api/travaux/telecharger/ASG_LIVRAISON")
+    assert complet.status_code == 200
+    assert complet.content == contenu
+    assert complet.headers["etag"] == f'"{sha256}"'
+    assert complet.headers["content-type"] == "application/pdf"
+    assert complet.headers["accept-ranges"] == "bytes"
+    assert "rapport%20final.pdf" in complet.headers["content-disposition"]
+    assert "last-modified" in complet.headers
+
+    inchange = api.get("/api/travaux/telecharger/ASG_LIVRAISON",
+                       headers={"If-None-Match": f'W/"autre", "{sha256}"'})
+    assert inchange.status_code == 304
+    assert inchange.content == b""
+
+    # Reprise d'un téléchargement interrompu
+    partiel = api.get("/api/travaux/telecharger/ASG_LIVRAISON",
+                      headers={"Range": "bytes=1000-", "If-Range": f'"{sha256}"'})
+    assert partiel.status_code == 206
+    assert partiel.content == contenu[1000:]
+    assert partiel.headers["content-range"] == f"bytes 1000-{len(contenu) - 1}/{len(contenu)}"
+
+    # Fichier modifié depuis : If-Range ne correspond plus, le fichier complet est renvoyé
+    perime = api.get("/api/travaux/telecharger/ASG_LIVRAISON",
+                     headers={"Range": "bytes=1000-", "If-Range": '"ancien"'})
+    assert perime.status_code == 200
+    assert perime.content == contenu
+
+
+def test_archive_des_livraisons(db, fabrique, client, compteur_requetes, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    api = _preparer_livraison(db, fabrique, client, nb_etudiants=3)
+    for i, id_assignation in enumerate(["ASG_LIVRAISON", "ASG_LIVRAISON_1"]):
+        api.post(f"/api/travaux/livrer/{id_assignation}",
+                 files={"fichier": (f"rendu{i}.pdf", f"contenu {i}".encode() * 1000, "application/pdf")})
+    assignation = db.get(Assignation, "ASG_LIVRAISON")
+    travail = assignation.travail
+    espace = travail.espace_pedagogique
+    matricules = [db.get(Assignation, i).etudiant.matricule for i in ["ASG_LIVRAISON", "ASG_LIVRAISON_1"]]
+    api_formateur = client(travaux, "/api/travaux", espace.formateur.utilisateur)
+
+    compteur_requetes.clear()
+    reponse = api_formateur.get(f"/api/travaux/travail/{travail.id_travail}/livraisons/archive")
+    assert reponse.status_code == 200
+    assert reponse.headers["content-type"] == "application/zip"
+    # Accès (travail + espace) puis liste des fichiers
+    assert len(compteur_requetes) <= 2
+
+    archive = zipfile.ZipFile(io.BytesIO(reponse.content))
+    assert sorted(archive.namelist()) == sorted(f"{m}.pdf" for m in matricules)
+    assert archive.read(f"{matricules[1]}.pdf") == b"contenu 1" * 1000
+
+    reponse = api_formateur.get(f"/api/travaux/espace/{espace.id_espace}/livraisons/archive")
+    noms = zipfile.ZipFile(io.BytesIO(reponse.content)).namelist()
+    assert sorted(noms) == sorted(f"Travail_{travail.id_travail}/{m}.pdf" for m in matricules)
+
+    autre = fabrique.formateur()
+    db.commit()
+    interdit = client(travaux, "/api/travaux", autre.utilisateur)
+    assert interdit.get(f"/api/travaux/travail/{travail.id_travail}/livraisons/archive").status_code == 403
+
+
+def test_mes_assignations_pagination_par_curseur(db, fabrique, client, compteur_requetes):
+    formateur, id_travail, ids_etudiants = _preparer(fabrique, 7, 0)
+    promotion_autre = fabrique.promotion()
+    autre_travail = fabrique.travail(fabrique.espace(promotion_autre, fabrique.formateur()))
+    fabrique.assignation(autre_travail, fabrique.etudiant(promotion_autre))
+    for i, id_etudiant in enumerate(ids_etudiants):
+        db.add(Assignation(
+            id_assignation=f"ASG_P{i}", id_travail=id_travail, id_etudiant=id_etudiant,
+            # Deux assignations à la même date : départagées par l'identifiant
+            date_assignment=datetime(2025, 11, 1 + i // 2),
+            statut=StatutAssignationEnum.RENDU if i % 3 == 0 else StatutAssignationEnum.ASSIGNE
+        ))
+    db.get(Etudiant, ids_etudiants[4]).utilisateur.nom = "Zinsou"
+    db.commit()
+    api = client(travaux, "/api/travaux", formateur.utilisateur)
+
+    ids, curseur, pages = [], None, 0
+    while True:
+        compteur_requetes.clear()
+        reponse = api.get("/api/travaux/mes-assignations",
+                          params={"limite": 3, **({"curseur": curseur} if curseur else {})})
+        assert reponse.status_code == 200
+        # page + total, quel que soit le nombre de lignes
+        assert len(compteur_requetes) == 2
+        assert reponse.headers["x-total-count"] == "7"
+        ids += [a["id_assignation"] for a in reponse.json()]
+        pages += 1
+        curseur = reponse.headers.get("x-curseur-suivant")
+        if not curseur:
+            break
+
+    assert pages == 3
+    assert ids == [f"ASG_P{i}" for i in [6, 5, 4, 3, 2, 1, 0]]
+    premiere = api.get("/api/travaux/mes-assignations").json()[0]
+    assert premiere["titre_travail"] == "Travail" and premiere["nom_matiere"]
+
+    compteur_requetes.clear()
+    rendus = api.get("/api/travaux/mes-assignations", params={"statut": "RENDU", "avec_total": "false"})
+    assert len(compteur_requetes) == 1
+    assert "x-total-count" not in rendus.headers
+    assert [a["id_assignation"] for a in rendus.json()] == ["ASG_P6", "ASG_P3", "ASG_P0"]
+    assert all(a["livraison"] for a in rendus.json())
+
+    recherche = api.get("/api/travaux/mes-assignations", params={"recherche": "zins"}).json()
+    assert [a["id_assignation"] for a in recherche] == ["ASG_P4"]
+    # Même recherche que les listes de comptes : préfixe, jokers de la saisie neutralisés
+    for saisie in ("sou", "%", "_insou"):
+        assert api.get("/api/travaux/mes-assignations", params={"recherche": saisie}).json() == []
+    assert api.get("/api/travaux/mes-assignations", params={"curseur": "invalide"}).status_code == 400
+
+
+def test_mes_assignations_sans_profil_formateur(db, fabrique, client):
+    promotion = fabrique.promotion()
+    # Espace sans formateur : ne doit pas être visible d'un compte sans profil formateur
+    fabrique.assignation(fabrique.travail(fabrique.espace(promotion)), fabrique.etudiant(promotion))
+    sans_profil = fabrique.utilisateur(RoleEnum.FORMATEUR)
+    db.commit()
+    api = client(travaux, "/api/travaux", sans_profil)
+
+    reponse = api.get("/api/travaux/mes-assignations")
+    assert reponse.status_code == 404
+
+
+def _mes_travaux(db, fabrique, client, compteur_requetes, nb_travaux, **params):
+    promotion = fabrique.promotion()
+    etudiant = fabrique.etudiant(promotion)
+    espace = fabrique.espace(promotion, fabrique.formateur())
+    for i in range(nb_travaux):
+        travail = fabrique.travail(espace, titre=f"T{i}")
+        travail.date_echeance = datetime(2026, 1, 1 + i)
+        fabrique.assignation(travail, etudiant,
+                             statut=StatutAssignationEnum.NOTE if i % 2 else StatutAssignationEnum.ASSIGNE,
+                             note=15 if i % 2 else None)
+    db.commit()
+    api = client(travaux, "/api/travaux", etudiant.utilisateur)
+
+    compteur_requetes.clear()
+    reponse = api.get("/api/travaux/mes-travaux", params=params)
+    assert reponse.status_code == 200
+    return reponse.json(), len(compteur_requetes)
+
+
+def test_mes_travaux_nombre_de_requetes_constant(db, fabrique, client, compteur_requetes):
+    petit, requetes_petit = _mes_travaux(db, fabrique, client, compteur_requetes, 2)
+    grand, requetes_grand = _mes_travaux(db, fabrique, client, compteur_requetes, 30)
+
+    assert requetes_petit == requetes_grand == 1
+    assert [t["titre_travail"] for t in grand] == [f"T{i}" for i in range(30)]
+    assert grand[0]["description_travail"] == "Consigne" and grand[0]["nom_matiere"]
+    assert grand[1]["livraison"]["note_attribuee"] == "15.0"
+
+
+def test_mes_travaux_filtres_sans_description(db, fabrique, client, compteur_requetes):
+    travaux_notes, _ = _mes_travaux(
+        db, fabrique, client, compteur_requetes, 10,
+        statut=["NOTE"], echeance_apres="2026-01-03T00:00:00", echeance_avant="2026-01-08T00:00:00",
+        include_description="false"
+    )
+
+    assert [t["titre_travail"] for t in travaux_notes] == ["T3", "T5", "T7"]
+    assert all(t["description_travail"] is None for t in travaux_notes)
+    assert not any("description" in r for r in compteur_requetes)
@@ -1,6 +1,7 @@
 """
 Script de mise à jour pour corriger les données existantes dans la base de données
 """
+import asyncio
 import sys
 import os
 
@@ -29,7 +30,7 @@ def main():
             print("🔧 Lancement de la procédure de réparation...")
             
             # Réparer les utilisateurs
-            reparer_utilisateurs_douteux(db)
+            asyncio.run(reparer_utilisateurs_douteux(db))
             
             print("\n🔍 Vérification après réparation...")
             problemes_apres = verifier_integrite_utilisateurs(db)
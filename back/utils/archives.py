@@ -0,0 +1,103 @@
+"""
+Archives ZIP des livraisons, produites à la volée
+
+L'archive est écrite morceau par morceau dans un tampon vidé à chaque écriture : rien
+n'est construit en mémoire ni sur disque, la réponse commence dès le premier fichier.
+Les fichiers sont stockés sans recompression (souvent déjà compressés : pdf, zip, docx).
+"""
+import re
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Assignation, Etudiant, StatutAssignationEnum, Travail
+
+TAILLE_MORCEAU = 256 * 1024
+
+
+class _Tampon:
+    """Flux non positionnable : zipfile y écrit, le générateur récupère les octets"""
+
+    def __init__(self):
+        self.morceaux: List[bytes] = []
+        self.position = 0
+
+    def write(self, donnees: bytes) -> int:
+        self.morceaux.append(bytes(donnees))
+        self.position += len(donnees)
+        return len(donnees)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def vider(self) -> bytes:
+        """Octets écrits depuis le dernier appel"""
+        donnees = b"".join(self.morceaux)
+        self.morceaux.clear()
+        return donnees
+
+
+def _nom_sur(texte: str) -> str:
+    return re.sub(r"[^\w.\- ]", "_", texte).strip() or "sans_nom"
+
+
+def lister_livraisons(db: Session, id_travail: Optional[str] = None,
+                      id_espace: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    Fichiers livrés d'un travail ou de tous les travaux d'un espace, en une requête.
+    Retourne (nom dans l'archive, chemin) ; les entrées sont nommées par matricule,
+    dans un dossier par travail pour un espace.
+    """
+    requete = db.query(
+        Assignation.fichier_path, Assignation.fichier_nom, Etudiant.matricule,
+        Travail.id_travail, Travail.titre
+    ).join(Etudiant, Etudiant.id_etudiant == Assignation.id_etudiant) \
+     .join(Travail, Travail.id_travail == Assignation.id_travail) \
+     .filter(
+        Assignation.fichier_path.isnot(None),
+        Assignation.statut.in_([StatutAssignationEnum.RENDU, StatutAssignationEnum.NOTE])
+    )
+    if id_travail:
+        requete = requete.filter(Assignation.id_travail == id_travail)
+    if id_espace:
+        requete = requete.filter(Travail.id_espace == id_espace)
+
+    entrees, noms = [], set()
+    for l in requete.order_by(Travail.titre, Travail.id_travail, Etudiant.matricule):
+        suffixe = Path(l.fichier_nom or l.fichier_path).suffix
+        dossier = "" if id_travail else f"{_nom_sur(l.titre)}_{l.id_travail}/"
+        nom = f"{dossier}{_nom_sur(l.matricule)}{suffixe}"
+        # Plusieurs livraisons pour un même matricule : nom rendu unique
+        base, i = nom, 1
+        while nom in noms:
+            i += 1
+            nom = f"{base[:len(base) - len(suffixe)]}_{i}{suffixe}"
+        noms.add(nom)
+        entrees.append((nom, l.fichier_path))
+    return entrees
+
+
+def flux_zip(entrees: Iterable[Tuple[str, str]]) -> Iterator[bytes]:
+    """
+    Génère l'archive ZIP des fichiers (nom dans l'archive, chemin) par morceaux.
+    Générateur synchrone : StreamingResponse l'exécute dans un thread, les lectures
+    disque ne bloquent donc pas la boucle d'événements. Les fichiers absents sont ignorés.
+    """
+    tampon = _Tampon()
+    with zipfile.ZipFile(tampon, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for nom, chemin in entrees:
+            try:
+                source = open(chemin, "rb")
+            except OSError:
+                continue
+            with source, archive.open(nom, "w", force_zip64=True) as destination:
+                while morceau := source.read(TAILLE_MORCEAU):
+                    destination.write(morceau)
+                    yield tampon.vider()
+    # Descripteurs de la dernière entrée et répertoire central
+    yield tampon.vider()
@@ -0,0 +1,169 @@
+"""
+Calcul du classement d'une promotion (US 11.1)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional
+
+from sqlalchemy import func, and_
+from sqlalchemy.orm import Session
+
+from models import (
+    Utilisateur, Etudiant, Assignation,
+    StatutAssignationEnum, StatutEtudiantEnum
+)
+
+
+def calculer_classement_promotion(db: Session, id_promotion: str) -> List[Dict[str, Any]]:
+    """
+    Calcule la moyenne, le nombre de notes et le rang de chaque étudiant actif
+    d'une promotion en une seule requête groupée.
+
+    Le rang suit la règle des ex aequo : deux étudiants ayant la même moyenne
+    partagent le même rang et le rang suivant est sauté (1, 2, 2, 4).
+    """
+    lignes = _requete_moyennes(db).filter(
+        Etudiant.id_promotion == id_promotion,
+        Etudiant.statut == StatutEtudiantEnum.ACTIF
+    ).all()
+
+    return attribuer_rangs([_formater_ligne(ligne) for ligne in lignes])
+
+
+def _requete_moyennes(db: Session):
+    """Requête groupée (moyenne, nombre de notes) par étudiant, jointe à Utilisateur"""
+    notes_etudiant = and_(
+        Assignation.id_etudiant == Etudiant.id_etudiant,
+        Assignation.statut == StatutAssignationEnum.NOTE,
+        Assignation.note.isnot(None)
+    )
+
+    return db.query(
+        Etudiant.id_etudiant,
+        Etudiant.id_promotion,
+        Etudiant.statut,
+        Etudiant.matricule,
+        Utilisateur.nom,
+        Utilisateur.prenom,
+        func.avg(Assignation.note).label('moyenne'),
+        func.count(Assignation.note).label('nombre_travaux_notes')
+    ).join(
+        Utilisateur, Etudiant.identifiant == Utilisateur.identifiant
+    ).outerjoin(
+        Assignation, notes_etudiant
+    ).group_by(
+        Etudiant.id_etudiant, Etudiant.id_promotion, Etudiant.statut,
+        Etudiant.matricule, Utilisateur.nom, Utilisateur.prenom
+    )
+
+
+def _formater_ligne(ligne) -> Dict[str, Any]:
+    return {
+        "id_etudiant": ligne.id_etudiant,
+        "nom": ligne.nom,
+        "prenom": ligne.prenom,
+        "matricule": ligne.matricule,
+        "moyenne": round(float(ligne.moyenne), 2) if ligne.moyenne is not None else 0.0,
+        "nombre_travaux_notes": ligne.nombre_travaux_notes or 0
+    }
+
+
+def attribuer_rangs(classement: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Trie le classement par moyenne décroissante et attribue les rangs
+    (classement « compétition » : les ex aequo partagent le même rang)
+    """
+    classement.sort(key=lambda x: (-x["moyenne"], x["nom"], x["prenom"]))
+
+    moyenne_precedente = None
+    rang = 0
+    for position, item in enumerate(classement, start=1):
+        if item["moyenne"] != moyenne_precedente:
+            rang = position
+            moyenne_precedente = item["moyenne"]
+        item["rang"] = rang
+
+    return classement
+
+
+@dataclass(frozen=True)
+class InstantaneClassement:
+    """Classement figé d'une promotion, partagé entre tous les lecteurs"""
+    classement: List[Dict[str, Any]]
+    etag: str
+    date_calcul: float
+
+
+def _calculer_etag(classement: List[Dict[str, Any]]) -> str:
+    contenu = json.dumps(classement, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(contenu.encode()).hexdigest()
+
+
+class CacheClassements:
+    """
+    Instantanés de classement par promotion, conservés en mémoire.
+
+    Un instantané est construit au premier accès avec calculer_classement_promotion,
+    puis mis à jour pour le seul étudiant concerné à chaque évaluation.
+    La durée de vie borne le décalage entre plusieurs workers.
+    """
+
+    def __init__(self, duree_vie: int = 300):
+        self.duree_vie = duree_vie
+        self._instantanes: Dict[str, InstantaneClassement] = {}
+        self._verrou = threading.Lock()
+
+    def obtenir(self, db: Session, id_promotion: str) -> InstantaneClassement:
+        """Retourne l'instantané de la promotion, en le (re)construisant si nécessaire"""
+        with self._verrou:
+            instantane = self._instantanes.get(id_promotion)
+        if instantane and time.monotonic() - instantane.date_calcul < self.duree_vie:
+            return instantane
+
+        classement = calculer_classement_promotion(db, id_promotion)
+        instantane = InstantaneClassement(classement, _calculer_etag(classement), time.monotonic())
+        with self._verrou:
+            self._instantanes[id_promotion] = instantane
+        return instantane
+
+    def mettre_a_jour_etudiant(self, db: Session, id_etudiant: str) -> None:
+        """Recalcule la moyenne d'un seul étudiant et reclasse sa promotion en mémoire"""
+        ligne = _requete_moyennes(db).filter(Etudiant.id_etudiant == id_etudiant).first()
+        if not ligne:
+            return
+
+        with self._verrou:
+            instantane = self._instantanes.get(ligne.id_promotion)
+            if not instantane:
+                # Rien en cache : le prochain lecteur construira l'instantané
+                return
+
+            classement = [
+                dict(item) for item in instantane.classement
+                if item["id_etudiant"] != id_etudiant
+            ]
+            if ligne.statut == StatutEtudiantEnum.ACTIF:
+                classement.append(_formater_ligne(ligne))
+            attribuer_rangs(classement)
+
+            self._instantanes[ligne.id_promotion] = InstantaneClassement(
+                classement, _calculer_etag(classement), instantane.date_calcul
+            )
+
+    def invalider(self, id_promotion: Optional[str] = None) -> None:
+        """Supprime l'instantané d'une promotion (ou de toutes)"""
+        with self._verrou:
+            if id_promotion is None:
+                self._instantanes.clear()
+            else:
+                self._instantanes.pop(id_promotion, None)
+
+
+# Instance globale du cache de classement
+cache_classements = CacheClassements(
+    duree_vie=int(os.getenv("CLASSEMENT_CACHE_TTL", "300"))
+)
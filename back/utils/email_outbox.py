@@ -0,0 +1,323 @@
+"""
+File d'envoi persistante des emails (outbox)
+
+Les routes enregistrent les notifications dans la table email_outbox, dans la même
+transaction que le changement métier ; un worker séparé (email_worker.py) les envoie
+par lots, avec nouvelles tentatives, lettre morte et limite de débit par modèle.
+Les notifications regroupables d'un même destinataire sont fusionnées en un récapitulatif :
+la première part tout de suite, les suivantes de la fenêtre partent ensemble à sa fin.
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import func, insert, update, tuple_
+from sqlalchemy.orm import Session
+
+from models import EmailOutbox, StatutEmailEnum
+from utils.email_service import EmailService
+
+
+# Modèle de notification -> méthode d'envoi du service email
+MODELES = {
+    "creation_compte": "envoyer_email_creation_compte",
+    "assignation_travail": "envoyer_email_assignation_travail",
+    "livraison_travail": "envoyer_email_livraison_travail",
+    "soumission_travail": "envoyer_email_soumission_travail",
+    "evaluation_travail": "envoyer_email_evaluation_travail",
+}
+
+# Modèles regroupables -> méthode d'envoi du récapitulatif (digest)
+DIGESTS = {
+    "assignation_travail": "envoyer_email_digest_assignations",
+    "soumission_travail": "envoyer_email_digest_soumissions",
+}
+
+# Fenêtre de regroupement (secondes) : une notification regroupable part tout de suite si
+# son destinataire n'a rien reçu de ce modèle depuis ce délai ; sinon elle attend la fin de
+# la fenêtre et part avec toutes celles arrivées entre-temps, en un récapitulatif.
+# 0 : aucune attente, seules les notifications en attente au même moment sont fusionnées
+FENETRE_DIGEST = float(os.getenv("EMAIL_DIGEST_FENETRE", "300"))
+
+TENTATIVES_MAX = int(os.getenv("EMAIL_OUTBOX_TENTATIVES_MAX", "5"))
+DELAI_NOUVELLE_TENTATIVE = float(os.getenv("EMAIL_OUTBOX_DELAI_NOUVELLE_TENTATIVE", "60"))
+# Durée après laquelle un email réservé par un worker arrêté redevient disponible
+DELAI_RESERVATION = float(os.getenv("EMAIL_OUTBOX_DELAI_RESERVATION", "300"))
+
+
+def _ligne(modele: str, destinataire: str, parametres: Dict[str, Any]) -> Dict[str, Any]:
+    if modele not in MODELES:
+        raise ValueError(f"Modèle d'email inconnu : {modele}")
+    maintenant = datetime.utcnow()
+    return {
+        "modele": modele,
+        "destinataire": destinataire,
+        "parametres": json.dumps(parametres, default=str),
+        "statut": StatutEmailEnum.EN_ATTENTE,
+        "tentatives": 0,
+        "date_creation": maintenant,
+        "date_disponible": maintenant
+    }
+
+
+def mettre_en_file(db: Session, modele: str, destinataire: str, **parametres: Any) -> None:
+    """
+    Ajoute un email à la file. Ne valide pas la transaction : l'email n'existe
+    que si le changement métier de l'appelant est lui-même validé.
+    """
+    db.add(EmailOutbox(**_ligne(modele, destinataire, parametres)))
+
+
+def mettre_en_file_lot(db: Session, modele: str, envois: Iterable[Dict[str, Any]]) -> int:
+    """
+    Ajoute un lot d'emails d'un même modèle en un seul INSERT multi-lignes.
+    Chaque envoi contient "destinataire" et les variables du modèle.
+    """
+    lignes = [
+        _ligne(modele, envoi["destinataire"], {k: v for k, v in envoi.items() if k != "destinataire"})
+        for envoi in envois
+    ]
+    if lignes:
+        db.execute(insert(EmailOutbox), lignes)
+    return len(lignes)
+
+
+# ==================== LIMITE DE DÉBIT ====================
+
+class LimiteurDebit:
+    """Seau à jetons : au plus `par_seconde` envois par seconde (en moyenne)"""
+
+    def __init__(self, par_seconde: float):
+        if par_seconde <= 0:
+            raise ValueError(f"Débit d'envoi invalide : {par_seconde} (doit être > 0)")
+        self.par_seconde = par_seconde
+        # Au moins un jeton de capacité, sinon un débit < 1/s n'en accumulerait jamais un entier
+        self.capacite = max(1.0, par_seconde)
+        self.jetons = self.capacite
+        self.derniere_recharge = time.monotonic()
+        self._verrou = asyncio.Lock()
+
+    async def acquerir(self) -> None:
+        async with self._verrou:
+            while True:
+                maintenant = time.monotonic()
+                self.jetons = min(
+                    self.capacite,
+                    self.jetons + (maintenant - self.derniere_recharge) * self.par_seconde
+                )
+                self.derniere_recharge = maintenant
+                if self.jetons >= 1:
+                    self.jetons -= 1
+                    return
+                await asyncio.sleep((1 - self.jetons) / self.par_seconde)
+
+
+def lire_debits_modeles() -> Dict[str, float]:
+    """
+    Débits par modèle (emails/seconde) depuis EMAIL_DEBITS_MODELES,
+    ex : "assignation_travail=5,creation_compte=2" ; EMAIL_DEBIT_DEFAUT pour les autres
+    """
+    defaut = float(os.getenv("EMAIL_DEBIT_DEFAUT", "10"))
+    debits = {modele: defaut for modele in MODELES}
+    for element in os.getenv("EMAIL_DEBITS_MODELES", "").split(","):
+        if "=" in element:
+            modele, valeur = element.split("=", 1)
+            debits[modele.strip()] = float(valeur)
+    invalides = {modele: debit for modele, debit in debits.items() if not debit > 0}
+    if invalides:
+        raise ValueError(f"Débits d'envoi invalides (doivent être > 0) : {invalides}")
+    return debits
+
+
+# ==================== WORKER ====================
+
+class WorkerOutbox:
+    """Vide la file d'emails par lots : réservation, envoi concurrent, mise à jour des statuts"""
+
+    def __init__(self, session_factory, service: EmailService,
+                 taille_lot: int = 50, debits: Optional[Dict[str, float]] = None):
+        self.session_factory = session_factory
+        self.service = service
+        self.taille_lot = taille_lot
+        self.limiteurs = {
+            modele: LimiteurDebit(debit)
+            for modele, debit in (debits or lire_debits_modeles()).items()
+        }
+
+    def _reserver(self) -> List[Dict[str, Any]]:
+        """
+        Réserve un lot d'emails disponibles (SKIP LOCKED : plusieurs workers possibles),
+        plus les notifications en attente des mêmes destinataires pour les modèles regroupables.
+        Les notifications regroupables d'un destinataire servi dans la fenêtre sont reportées
+        à la fin de celle-ci.
+        """
+        db = self.session_factory()
+        try:
+            maintenant = datetime.utcnow()
+            colonnes = (
+                EmailOutbox.id_email, EmailOutbox.modele,
+                EmailOutbox.destinataire, EmailOutbox.parametres
+            )
+            lignes = db.query(*colonnes).filter(
+                EmailOutbox.statut.in_([StatutEmailEnum.EN_ATTENTE, StatutEmailEnum.EN_COURS]),
+                EmailOutbox.date_disponible <= maintenant
+            ).order_by(EmailOutbox.id_email).limit(self.taille_lot).with_for_update(skip_locked=True).all()
+
+            groupes = {(l.destinataire, l.modele) for l in lignes if l.modele in DIGESTS}
+            if groupes and FENETRE_DIGEST > 0:
+                # Destinataires déjà servis dans la fenêtre : récapitulatif à la fin de celle-ci
+                recents = {
+                    (destinataire, modele): dernier_envoi
+                    for destinataire, modele, dernier_envoi in db.query(
+                        EmailOutbox.destinataire, EmailOutbox.modele, func.max(EmailOutbox.date_envoi)
+                    ).filter(
+                        EmailOutbox.statut == StatutEmailEnum.ENVOYE,
+                        EmailOutbox.date_envoi > maintenant - timedelta(seconds=FENETRE_DIGEST),
+                        tuple_(EmailOutbox.destinataire, EmailOutbox.modele).in_(groupes)
+                    ).group_by(EmailOutbox.destinataire, EmailOutbox.modele)
+                }
+                for groupe, dernier_envoi in recents.items():
+                    db.execute(
+                        update(EmailOutbox)
+                        .where(EmailOutbox.id_email.in_([
+                            l.id_email for l in lignes if (l.destinataire, l.modele) == groupe
+                        ]))
+                        .values(
+                            statut=StatutEmailEnum.EN_ATTENTE,
+                            date_disponible=dernier_envoi + timedelta(seconds=FENETRE_DIGEST)
+                        )
+                    )
+                lignes = [l for l in lignes if (l.destinataire, l.modele) not in recents]
+                groupes -= recents.keys()
+
+            # La fenêtre d'un destinataire se ferme à l'échéance de sa première notification
+            if groupes:
+                ids = {l.id_email for l in lignes}
+                lignes += [
+                    l for l in db.query(*colonnes).filter(
+                        EmailOutbox.statut == StatutEmailEnum.EN_ATTENTE,
+                        tuple_(EmailOutbox.destinataire, EmailOutbox.modele).in_(groupes)
+                    ).order_by(EmailOutbox.id_email).with_for_update(skip_locked=True)
+                    if l.id_email not in ids
+                ]
+
+            if lignes:
+                db.execute(
+                    update(EmailOutbox)
+                    .where(EmailOutbox.id_email.in_([l.id_email for l in lignes]))
+                    .values(
+                        statut=StatutEmailEnum.EN_COURS,
+                        date_disponible=maintenant + timedelta(seconds=DELAI_RESERVATION)
+                    )
+                )
+            db.commit()
+            return [dict(l._mapping) for l in lignes]
+        finally:
+            db.close()
+
+    @staticmethod
+    def _regrouper(emails: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Un groupe par (destinataire, modèle) regroupable, un groupe par email sinon"""
+        groupes: Dict[Any, List[Dict[str, Any]]] = {}
+        for email in emails:
+            cle = (email["destinataire"], email["modele"]) if email["modele"] in DIGESTS else email["id_email"]
+            groupes.setdefault(cle, []).append(email)
+        return list(groupes.values())
+
+    async def _envoyer(self, groupe: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        Envoie un groupe d'emails de la file : tel quel s'il est seul, sinon en récapitulatif.
+        Retourne None en cas de succès, sinon l'erreur
+        """
+        premier = groupe[0]
+        try:
+            limiteur = self.limiteurs.get(premier["modele"])
+            if limiteur:
+                await limiteur.acquerir()
+            notifications = [json.loads(email["parametres"] or "{}") for email in groupe]
+            if len(groupe) == 1:
+                envoi = getattr(self.service, MODELES[premier["modele"]])
+                envoye = await envoi(destinataire=premier["destinataire"], **notifications[0])
+            else:
+                envoi = getattr(self.service, DIGESTS[premier["modele"]])
+                envoye = await envoi(destinataire=premier["destinataire"], notifications=notifications)
+            if envoye:
+                return None
+            return "Envoi refusé par le fournisseur ou injoignable"
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+
+    def _enregistrer_resultats(self, resultats: Dict[int, Optional[str]]) -> Dict[str, int]:
+        db = self.session_factory()
+        try:
+            maintenant = datetime.utcnow()
+            envoyes = [id_email for id_email, erreur in resultats.items() if erreur is None]
+            if envoyes:
+                # Les variables (ex : mots de passe provisoires) ne sont pas conservées
+                db.execute(
+                    update(EmailOutbox)
+                    .where(EmailOutbox.id_email.in_(envoyes))
+                    .values(
+                        statut=StatutEmailEnum.ENVOYE, date_envoi=maintenant,
+                        parametres=None, derniere_erreur=None
+                    )
+                )
+
+            compteurs = {"envoyes": len(envoyes), "reessais": 0, "echecs": 0}
+            echoues = {id_email: erreur for id_email, erreur in resultats.items() if erreur is not None}
+            if echoues:
+                for email in db.query(EmailOutbox).filter(EmailOutbox.id_email.in_(echoues)):
+                    email.tentatives += 1
+                    email.derniere_erreur = echoues[email.id_email]
+                    if email.tentatives >= TENTATIVES_MAX:
+                        email.statut = StatutEmailEnum.ECHEC
+                        compteurs["echecs"] += 1
+                    else:
+                        email.statut = StatutEmailEnum.EN_ATTENTE
+                        email.date_disponible = maintenant + timedelta(
+                            seconds=DELAI_NOUVELLE_TENTATIVE * 2 ** (email.tentatives - 1)
+                        )
+                        compteurs["reessais"] += 1
+            db.commit()
+            return compteurs
+        finally:
+            db.close()
+
+    async def traiter_lot(self) -> Dict[str, int]:
+        """
+        Traite un lot ; retourne le nombre de notifications envoyées, replanifiées et abandonnées
+        (une notification fusionnée dans un récapitulatif compte pour une)
+        """
+        emails = await asyncio.to_thread(self._reserver)
+        if not emails:
+            return {"envoyes": 0, "reessais": 0, "echecs": 0}
+
+        groupes = self._regrouper(emails)
+        erreurs = await asyncio.gather(*(self._envoyer(groupe) for groupe in groupes))
+        resultats = {
+            email["id_email"]: erreur
+            for groupe, erreur in zip(groupes, erreurs)
+            for email in groupe
+        }
+        return await asyncio.to_thread(self._enregistrer_resultats, resultats)
+
+    async def executer(self, intervalle: float = 2.0, arret: Optional[asyncio.Event] = None) -> None:
+        """Boucle principale : enchaîne les lots, attend `intervalle` secondes quand la file est vide"""
+        arret = arret or asyncio.Event()
+        while not arret.is_set():
+            try:
+                compteurs = await self.traiter_lot()
+            except Exception as e:
+                print(f"❌ [OUTBOX] Erreur lors du traitement d'un lot : {e}", flush=True)
+                compteurs = {"envoyes": 0, "reessais": 0, "echecs": 0}
+
+            if any(compteurs.values()):
+                print(f"📬 [OUTBOX] {compteurs}", flush=True)
+            if sum(compteurs.values()) < self.taille_lot:
+                try:
+                    await asyncio.wait_for(arret.wait(), timeout=intervalle)
+                except asyncio.TimeoutError:
+                    pass
@@ -2,16 +2,136 @@ import os
 import httpx
 import json
 import socket
-from typing import Dict
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from utils.email_templates import LIGNE_DIGEST_ASSIGNATION, LIGNE_DIGEST_SOUMISSION, modeles
+
+
+class TransportLocal(httpx.AsyncBaseTransport):
+    """
+    Transport HTTP de substitution : capture les emails au lieu de les envoyer.
+    Utilisé par les tests et en local (EMAIL_TRANSPORT=local) ; peut simuler
+    des échecs transitoires (réponses 503) pour exercer les nouvelles tentatives.
+    """
+
+    def __init__(self, echecs: int = 0):
+        self.messages: List[Dict[str, Any]] = []
+        self.echecs_restants = echecs
+        self.nb_requetes = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.nb_requetes += 1
+        if self.echecs_restants > 0:
+            self.echecs_restants -= 1
+            return httpx.Response(503, json={"errors": ["Service indisponible (simulé)"]})
+        self.messages.append(json.loads(request.content))
+        return httpx.Response(200, json={"success": True})
+
 
 class EmailService:
-    def __init__(self):
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
         # Configuration Mailtrap Sandbox API
         self.api_token = os.getenv("MAILTRAP_TOKEN")
         self.inbox_id = os.getenv("MAILTRAP_INBOX_ID")
         self.api_url = f"https://sandbox.api.mailtrap.io/api/send/{self.inbox_id}" if self.inbox_id else ""
         self.email_sender = os.getenv("EMAIL_SENDER", "admin@uatm.bj")
         self.sender_name = "Administration UATM"
+
+        # Envoi : connexions réutilisées, concurrence bornée, nouvelles tentatives
+        self.concurrence_max = int(os.getenv("EMAIL_CONCURRENCE_MAX", "10"))
+        self.tentatives_max = int(os.getenv("EMAIL_TENTATIVES_MAX", "3"))
+        self.delai_initial = float(os.getenv("EMAIL_DELAI_NOUVELLE_TENTATIVE", "0.5"))
+        self.timeout = float(os.getenv("EMAIL_TIMEOUT", "10"))
+
+        if transport is None and os.getenv("EMAIL_TRANSPORT", "").lower() == "local":
+            transport = TransportLocal()
+        self.transport = transport
+        if self.transport is not None and not self.api_url:
+            self.api_url = "http://mailtrap.local/api/send"
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._boucle: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def est_configure(self) -> bool:
+        return self.transport is not None or bool(self.api_token and self.inbox_id)
+
+    def _obtenir_client(self) -> httpx.AsyncClient:
+        """
+        Client HTTP partagé (keep-alive, pool de connexions), créé à la première utilisation.
+        Recréé si la boucle d'événements a changé, le pool étant lié à sa boucle.
+        """
+        boucle = asyncio.get_running_loop()
+        if self._client is None or self._boucle is not boucle:
+            self._client = httpx.AsyncClient(
+                transport=self.transport,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.concurrence_max,
+                    max_keepalive_connections=self.concurrence_max
+                ),
+                headers={
+                    "Authorization": f"Bearer {self.api_token}",
+                    "Content-Type": "application/json"
+                }
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrence_max)
+            self._boucle = boucle
+        return self._client
+
+    async def fermer(self) -> None:
+        """Ferme le client HTTP partagé (arrêt de l'application)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._semaphore = None
+            self._boucle = None
+
+    async def _envoyer(self, destinataire: str, sujet: str, corps_html: str) -> bool:
+        """
+        Envoie un email via l'API Mailtrap avec le client partagé.
+        Les erreurs réseau, 429 et 5xx sont retentées avec un délai exponentiel.
+        """
+        if not self.est_configure:
+            print("❌ ERREUR: MAILTRAP_TOKEN ou MAILTRAP_INBOX_ID non configurée", flush=True)
+            return False
+
+        payload = {
+            "from": {"email": self.email_sender, "name": self.sender_name},
+            "to": [{"email": destinataire}],
+            "subject": sujet,
+            "html": corps_html
+        }
+
+        client = self._obtenir_client()
+        for tentative in range(self.tentatives_max):
+            erreur = None
+            try:
+                async with self._semaphore:
+                    response = await client.post(self.api_url, json=payload)
+                if response.status_code in [200, 201]:
+                    return True
+                erreur = f"{response.status_code}: {response.text}"
+                if response.status_code != 429 and response.status_code < 500:
+                    break
+            except httpx.HTTPError as e:
+                erreur = str(e)
+
+            if tentative + 1 < self.tentatives_max:
+                await asyncio.sleep(self.delai_initial * 2 ** tentative)
+
+        print(f"❌ Erreur Mailtrap pour <{destinataire}> ({erreur})", flush=True)
+        return False
+
+    async def envoyer_lot(self, envoi: Callable[..., Awaitable[bool]],
+                          parametres: Iterable[Dict[str, Any]]) -> List[bool]:
+        """
+        Envoie un lot d'emails en parallèle (dans la limite de la concurrence configurée).
+        `envoi` est l'une des méthodes envoyer_email_*, appelée avec chaque jeu de paramètres.
+        """
+        return list(await asyncio.gather(*(envoi(**p) for p in parametres)))
         
     def tester_connectivite(self) -> Dict[str, bool]:
         """Teste la connectivité vers Mailtrap"""
@@ -28,226 +148,59 @@ class EmailService:
                 resultats[nom] = False
         return resultats
     
-    def envoyer_email_creation_compte(self, destinataire: str, prenom: str, 
-                                     email: str, mot_de_passe: str, role: str) -> bool:
+    async def envoyer_email_creation_compte(self, destinataire: str, prenom: str, 
+                                           email: str, mot_de_passe: str, role: str) -> bool:
         """Envoie un email via l'API Mailtrap Sandbox"""
-        if not self.api_token or not self.inbox_id:
-            print("❌ ERREUR: MAILTRAP_TOKEN ou MAILTRAP_INBOX_ID non configurée", flush=True)
-            return False
-
         print(f"📧 [MAILTRAP] Capture de l'envoi pour {destinataire}...", flush=True)
         
-        corps_html = f"""
-        <html>
-        <body>
-            <h3>Bonjour {prenom},</h3>
-            <p>Votre compte <b>{role.lower()}</b> a été créé avec succès.</p>
-            <p>Voici vos identifiants de connexion :</p>
-            <ul>
-                <li><b>Email :</b> {email}</li>
-                <li><b>Mot de passe :</b> {mot_de_passe}</li>
-            </ul>
-            <p><i>Note : Ceci est un email de test Mailtrap.</i></p>
-            <br>
-            <p>Cordialement,<br>L'équipe administrative</p>
-        </body>
-        </html>
-        """
-        
-        payload = {
-            "from": {"email": self.email_sender, "name": self.sender_name},
-            "to": [{"email": destinataire}],
-            "subject": f"Création de votre compte {role}",
-            "html": corps_html
-        }
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
-        
-        try:
-            print(f"🚀 Appel API Mailtrap Sandbox vers <{destinataire}>...", flush=True)
-            with httpx.Client() as client:
-                response = client.post(self.api_url, headers=headers, json=payload, timeout=10)
-                
-            if response.status_code in [200, 201]:
-                print(f"✅ Email capturé par Mailtrap !", flush=True)
-                return True
-            else:
-                print(f"❌ Erreur Mailtrap ({response.status_code}): {response.text}", flush=True)
-                return False
-        except Exception as e:
-            print(f"❌ Erreur critique API Mailtrap: {e}", flush=True)
-            return False
+        sujet, corps_html = modeles["creation_compte"].rendre({
+            "prenom": prenom, "email": email, "mot_de_passe": mot_de_passe,
+            "role": role, "role_minuscule": role.lower()
+        })
+        return await self._envoyer(destinataire, sujet, corps_html)
 
-    def envoyer_email_assignation_travail(self, destinataire: str, prenom: str,
-                                         titre_travail: str, nom_matiere: str,
-                                         formateur: str, date_echeance: str,
-                                         description: str) -> bool:
+    async def envoyer_email_assignation_travail(self, destinataire: str, prenom: str,
+                                               titre_travail: str, nom_matiere: str,
+                                               formateur: str, date_echeance: str,
+                                               description: str) -> bool:
         """Envoie un email d'assignation via l'API Mailtrap"""
-        if not self.api_token or not self.inbox_id:
-            print("❌ ERREUR: MAILTRAP_TOKEN ou MAILTRAP_INBOX_ID non configurée", flush=True)
-            return False
-
         print(f"📧 [MAILTRAP] Notification d'assignation pour {destinataire}...", flush=True)
         
-        corps_html = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #e1e1e1; border-radius: 10px;">
-                <h2 style="color: #2563eb;">Nouveau travail assigné !</h2>
-                <p>Bonjour <strong>{prenom}</strong>,</p>
-                <p>Un nouveau travail vous a été assigné dans la matière <strong>{nom_matiere}</strong> par votre formateur <strong>{formateur}</strong>.</p>
-                
-                <div style="background-color: #f8fafc; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                    <p style="margin-top: 0;"><strong>Titre :</strong> {titre_travail}</p>
-                    <p><strong>Échéance :</strong> <span style="color: #dc2626; font-weight: bold;">{date_echeance}</span></p>
-                    <p style="margin-bottom: 0;"><strong>Description :</strong><br>{description}</p>
-                </div>
-                
-                <p>Pour toute question, n'hésitez pas à contacter votre formateur.</p>
-                <br>
-                <p>Cordialement,<br>L'équipe pédagogique</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        payload = {
-            "from": {"email": self.email_sender, "name": self.sender_name},
-            "to": [{"email": destinataire}],
-            "subject": f"Nouveau travail : {titre_travail} - {nom_matiere}",
-            "html": corps_html
-        }
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
-        
-        try:
-            with httpx.Client() as client:
-                response = client.post(self.api_url, headers=headers, json=payload, timeout=10)
-            return response.status_code in [200, 201]
-        except Exception as e:
-            print(f"❌ Erreur critique API Mailtrap: {e}", flush=True)
-            return False
+        sujet, corps_html = modeles["assignation_travail"].rendre({
+            "prenom": prenom, "titre_travail": titre_travail, "nom_matiere": nom_matiere,
+            "formateur": formateur, "date_echeance": date_echeance, "description": description
+        })
+        return await self._envoyer(destinataire, sujet, corps_html)
 
-    def envoyer_email_livraison_travail(self, destinataire: str, prenom_formateur: str,
-                                      nom_etudiant: str, prenom_etudiant: str,
-                                      titre_travail: str, nom_matiere: str) -> bool:
+    async def envoyer_email_livraison_travail(self, destinataire: str, prenom_formateur: str,
+                                            nom_etudiant: str, prenom_etudiant: str,
+                                            titre_travail: str, nom_matiere: str) -> bool:
         """Envoie un email de notification de livraison au formateur"""
-        if not self.api_token or not self.inbox_id:
-            return False
-
-        corps_html = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #e1e1e1; border-radius: 10px;">
-                <h2 style="color: #059669;">Nouvelle livraison reçue !</h2>
-                <p>Bonjour <strong>{prenom_formateur}</strong>,</p>
-                <p>L'étudiant <strong>{prenom_etudiant} {nom_etudiant}</strong> vient de soumettre son travail pour le sujet :</p>
-                <div style="background-color: #f8fafc; padding: 15px; border-radius: 8px; margin: 20px 0;">
-                    <p style="margin: 0;"><strong>Titre :</strong> {titre_travail}</p>
-                    <p style="margin: 5px 0 0 0;"><strong>Matière :</strong> {nom_matiere}</p>
-                </div>
-                <p>Vous pouvez maintenant consulter et noter cette livraison depuis votre espace pédagogique.</p>
-                <br>
-                <p>Cordialement,<br>Le système de suivi pédagogique</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        payload = {
-            "from": {"email": self.email_sender, "name": self.sender_name},
-            "to": [{"email": destinataire}],
-            "subject": f"Livraison reçue : {prenom_etudiant} {nom_etudiant} - {titre_travail}",
-            "html": corps_html
-        }
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
-        
-        try:
-            with httpx.Client() as client:
-                response = client.post(self.api_url, headers=headers, json=payload, timeout=10)
-            return response.status_code in [200, 201]
-        except Exception as e:
-            print(f"❌ Erreur critique API Mailtrap: {e}", flush=True)
-            return False
+        sujet, corps_html = modeles["livraison_travail"].rendre({
+            "prenom_formateur": prenom_formateur, "prenom_etudiant": prenom_etudiant,
+            "nom_etudiant": nom_etudiant, "titre_travail": titre_travail, "nom_matiere": nom_matiere
+        })
+        return await self._envoyer(destinataire, sujet, corps_html)
 
-    def envoyer_email_soumission_travail(self, destinataire: str, prenom_formateur: str,
-                                        prenom_etudiant: str, nom_etudiant: str,
-                                        titre_travail: str, nom_matiere: str,
-                                        date_soumission: str, commentaire: str) -> bool:
+    async def envoyer_email_soumission_travail(self, destinataire: str, prenom_formateur: str,
+                                              prenom_etudiant: str, nom_etudiant: str,
+                                              titre_travail: str, nom_matiere: str,
+                                              date_soumission: str, commentaire: str) -> bool:
         """Envoie un email de notification de soumission de travail au formateur"""
-        if not self.api_token or not self.inbox_id:
-            print("❌ ERREUR: MAILTRAP_TOKEN ou MAILTRAP_INBOX_ID non configurée", flush=True)
-            return False
-
         print(f"📧 [MAILTRAP] Notification de soumission pour {destinataire}...", flush=True)
         
-        corps_html = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #e1e1e1; border-radius: 10px;">
-                <h2 style="color: #16a34a;">📝 Nouveau travail rendu !</h2>
-                <p>Bonjour <strong>{prenom_formateur}</strong>,</p>
-                <p>L'étudiant <strong>{prenom_etudiant} {nom_etudiant}</strong> vient de rendre son travail dans la matière <strong>{nom_matiere}</strong>.</p>
-                
-                <div style="background-color: #f0fdf4; padding: 15px; border-radius: 5px; margin: 20px 0; border-left: 4px solid #16a34a;">
-                    <p style="margin-top: 0;"><strong>Travail :</strong> {titre_travail}</p>
-                    <p><strong>Date de soumission :</strong> {date_soumission}</p>
-                    <p style="margin-bottom: 0;"><strong>Commentaire de l'étudiant :</strong><br><em>{commentaire}</em></p>
-                </div>
-                
-                <p>Connectez-vous à votre espace formateur pour consulter le travail et l'évaluer.</p>
-                <br>
-                <p>Cordialement,<br>L'équipe pédagogique UATM</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        payload = {
-            "from": {"email": self.email_sender, "name": self.sender_name},
-            "to": [{"email": destinataire}],
-            "subject": f"📝 Travail rendu : {titre_travail} - {prenom_etudiant} {nom_etudiant}",
-            "html": corps_html
-        }
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
-        
-        try:
-            with httpx.Client() as client:
-                response = client.post(self.api_url, headers=headers, json=payload, timeout=10)
-            
-            if response.status_code in [200, 201]:
-                print(f"✅ Email de soumission capturé par Mailtrap !", flush=True)
-                return True
-            else:
-                print(f"❌ Erreur Mailtrap ({response.status_code}): {response.text}", flush=True)
-                return False
-        except Exception as e:
-            print(f"❌ Erreur critique API Mailtrap: {e}", flush=True)
-            return False
+        sujet, corps_html = modeles["soumission_travail"].rendre({
+            "prenom_formateur": prenom_formateur, "prenom_etudiant": prenom_etudiant,
+            "nom_etudiant": nom_etudiant, "titre_travail": titre_travail, "nom_matiere": nom_matiere,
+            "date_soumission": date_soumission, "commentaire": commentaire
+        })
+        return await self._envoyer(destinataire, sujet, corps_html)
 
-    def envoyer_email_evaluation_travail(self, destinataire: str, prenom_etudiant: str,
-                                        titre_travail: str, nom_matiere: str,
-                                        note: float, note_max: float,
-                                        commentaire: str, formateur: str) -> bool:
+    async def envoyer_email_evaluation_travail(self, destinataire: str, prenom_etudiant: str,
+                                              titre_travail: str, nom_matiere: str,
+                                              note: float, note_max: float,
+                                              commentaire: str, formateur: str) -> bool:
         """Envoie un email de notification d'évaluation de travail à l'étudiant"""
-        if not self.api_token or not self.inbox_id:
-            print("❌ ERREUR: MAILTRAP_TOKEN ou MAILTRAP_INBOX_ID non configurée", flush=True)
-            return False
-
         print(f"📧 [MAILTRAP] Notification d'évaluation pour {destinataire}...", flush=True)
         
         # Déterminer la couleur selon la note
@@ -262,56 +215,34 @@ class EmailService:
             couleur_note = "#dc2626"  # Rouge
             emoji_note = "📚"
         
-        corps_html = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #e1e1e1; border-radius: 10px;">
-                <h2 style="color: {couleur_note};">{emoji_note} Votre travail a été évalué !</h2>
-                <p>Bonjour <strong>{prenom_etudiant}</strong>,</p>
-                <p>Votre formateur <strong>{formateur}</strong> vient d'évaluer votre travail dans la matière <strong>{nom_matiere}</strong>.</p>
-                
-                <div style="background-color: #f8fafc; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                    <p style="margin-top: 0;"><strong>Travail :</strong> {titre_travail}</p>
-                    <div style="background-color: white; padding: 10px; border-radius: 5px; text-align: center; margin: 10px 0;">
-                        <span style="font-size: 24px; font-weight: bold; color: {couleur_note};">{note}/{note_max}</span>
-                        <span style="font-size: 14px; color: #666; margin-left: 10px;">({pourcentage:.1f}%)</span>
-                    </div>
-                    <p style="margin-bottom: 0;"><strong>Commentaire du formateur :</strong><br><em>{commentaire}</em></p>
-                </div>
-                
-                <p>Connectez-vous à votre espace étudiant pour consulter les détails de votre évaluation.</p>
-                <br>
-                <p>Cordialement,<br>L'équipe pédagogique UATM</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        payload = {
-            "from": {"email": self.email_sender, "name": self.sender_name},
-            "to": [{"email": destinataire}],
-            "subject": f"📊 Note reçue : {titre_travail} - {note}/{note_max}",
-            "html": corps_html
-        }
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
-        
-        try:
-            with httpx.Client() as client:
-                response = client.post(self.api_url, headers=headers, json=payload, timeout=10)
-            
-            if response.status_code in [200, 201]:
-                print(f"✅ Email d'évaluation capturé par Mailtrap !", flush=True)
-                return True
-            else:
-                print(f"❌ Erreur Mailtrap ({response.status_code}): {response.text}", flush=True)
-                return False
-        except Exception as e:
-            print(f"❌ Erreur critique API Mailtrap: {e}", flush=True)
-            return False
+        sujet, corps_html = modeles["evaluation_travail"].rendre({
+            "prenom_etudiant": prenom_etudiant, "titre_travail": titre_travail, "nom_matiere": nom_matiere,
+            "note": note, "note_max": note_max, "pourcentage": pourcentage, "commentaire": commentaire,
+            "formateur": formateur, "couleur_note": couleur_note, "emoji_note": emoji_note
+        })
+        return await self._envoyer(destinataire, sujet, corps_html)
+
+    async def envoyer_email_digest_assignations(self, destinataire: str,
+                                                notifications: List[Dict[str, Any]]) -> bool:
+        """Envoie un récapitulatif de plusieurs travaux assignés au même étudiant"""
+        print(f"📧 [MAILTRAP] Récapitulatif de {len(notifications)} assignation(s) pour {destinataire}...", flush=True)
+
+        sujet, corps_html = modeles["digest_assignations"].rendre({
+            "nombre": len(notifications), "prenom": notifications[0]["prenom"],
+            "lignes": "".join(LIGNE_DIGEST_ASSIGNATION.rendre_lot(notifications))
+        })
+        return await self._envoyer(destinataire, sujet, corps_html)
+
+    async def envoyer_email_digest_soumissions(self, destinataire: str,
+                                               notifications: List[Dict[str, Any]]) -> bool:
+        """Envoie au formateur un récapitulatif de plusieurs travaux rendus"""
+        print(f"📧 [MAILTRAP] Récapitulatif de {len(notifications)} soumission(s) pour {destinataire}...", flush=True)
+
+        sujet, corps_html = modeles["digest_soumissions"].rendre({
+            "nombre": len(notifications), "prenom_formateur": notifications[0]["prenom_formateur"],
+            "lignes": "".join(LIGNE_DIGEST_SOUMISSION.rendre_lot(notifications))
+        })
+        return await self._envoyer(destinataire, sujet, corps_html)
 
 # Instance globale du service email
 email_service = EmailService()
@@ -0,0 +1,282 @@
+"""
+Modèles d'emails précompilés
+
+Chaque modèle (sujet + corps HTML) est découpé une seule fois, au chargement du module,
+en fragments statiques et en variables. Le rendu ne fait plus que concaténer les fragments
+avec les valeurs formatées, sans réanalyser le texte. Un lot de destinataires est rendu
+en un appel, colonne par colonne (lecture et formatage de chaque variable pour tout le
+lot par map, sans boucle Python par message) ; les variables communes à tout le lot
+sont figées une fois dans les fragments statiques.
+"""
+from itertools import repeat
+from operator import itemgetter
+from string import Formatter
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# Fragment statique (str) ou variable (nom, format, conversion)
+Segment = Union[str, Tuple[str, str, Optional[str]]]
+
+# Conversions acceptées (`{nom!r}`, `{nom!s}`, `{nom!a}`), comme str.format
+CONVERSIONS = {"r": repr, "s": str, "a": ascii}
+
+
+def _formater(valeur: Any, format_: str, conversion: Optional[str]) -> str:
+    if conversion:
+        valeur = CONVERSIONS[conversion](valeur)
+    return format(valeur, format_)
+
+
+class Gabarit:
+    """Texte à variables `{nom}` / `{nom:format}` / `{nom!conversion}` découpé en segments"""
+
+    __slots__ = ("segments", "variables")
+
+    def __init__(self, texte: str = "", segments: Iterable[Segment] = ()):
+        if texte:
+            segments = []
+            for statique, nom, format_, conversion in Formatter().parse(texte):
+                segments.append(statique)
+                if nom is not None:
+                    if not nom.isidentifier():
+                        raise ValueError(f"Variable de modèle invalide : {nom!r}")
+                    if conversion and conversion not in CONVERSIONS:
+                        raise ValueError(f"Conversion de modèle invalide : {nom}!{conversion}")
+                    if "{" in (format_ or ""):
+                        raise ValueError(f"Format imbriqué non pris en charge : {nom}:{format_}")
+                    segments.append((nom, format_ or "", conversion))
+        self.segments: List[Segment] = self._fusionner(segments)
+        self.variables = frozenset(s[0] for s in self.segments if type(s) is tuple)
+
+    def rendre(self, variables: Dict[str, Any]) -> str:
+        """Concatène les fragments statiques et les valeurs formatées des variables"""
+        # Sans conversion, le formatage reste dans l'expression (pas d'appel de fonction)
+        return "".join([
+            s if type(s) is str
+            else f"{variables[s[0]]:{s[1]}}" if s[2] is None
+            else _formater(variables[s[0]], s[1], s[2])
+            for s in self.segments
+        ])
+
+    @staticmethod
+    def _fusionner(segments: Iterable[Segment]) -> List[Segment]:
+        """Regroupe les fragments statiques consécutifs"""
+        resultat: List[Segment] = []
+        for segment in segments:
+            if type(segment) is str:
+                if not segment:
+                    continue
+                if resultat and type(resultat[-1]) is str:
+                    resultat[-1] += segment
+                    continue
+            resultat.append(segment)
+        return resultat
+
+    def rendre_lot(self, lot: Iterable[Dict[str, Any]],
+                   communes: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Rend un lot colonne par colonne : une ligne par élément, jointe fragment par fragment"""
+        gabarit = self.specialiser(communes) if communes else self
+        lot = lot if isinstance(lot, list) else list(lot)
+        if not gabarit.variables:
+            return ["".join(gabarit.segments)] * len(lot)
+        colonnes = [
+            repeat(s) if type(s) is str
+            else map(format, map(itemgetter(s[0]), lot), repeat(s[1])) if s[2] is None
+            else map(_formater, map(itemgetter(s[0]), lot), repeat(s[1]), repeat(s[2]))
+            for s in gabarit.segments
+        ]
+        return list(map("".join, zip(*colonnes)))
+
+    def specialiser(self, variables: Dict[str, Any]) -> "Gabarit":
+        """Nouveau gabarit où les variables fournies sont figées dans les fragments statiques"""
+        return Gabarit(segments=[
+            _formater(variables[s[0]], s[1], s[2]) if type(s) is tuple and s[0] in variables else s
+            for s in self.segments
+        ])
+
+
+class ModeleEmail:
+    """Sujet et corps HTML compilés d'un email"""
+
+    __slots__ = ("nom", "sujet", "corps")
+
+    def __init__(self, nom: str, sujet: str, corps: str):
+        self.nom = nom
+        self.sujet = Gabarit(sujet)
+        self.corps = Gabarit(corps)
+
+    def rendre(self, variables: Dict[str, Any]) -> Tuple[str, str]:
+        """Retourne (sujet, corps_html)"""
+        return self.sujet.rendre(variables), self.corps.rendre(variables)
+
+    def rendre_lot(self, lot: Iterable[Dict[str, Any]],
+                   communes: Optional[Dict[str, Any]] = None) -> List[Tuple[str, str]]:
+        """
+        Rend un lot de destinataires en un appel. `communes` contient les variables
+        identiques pour tout le lot (titre, matière, échéance...) : elles sont figées une
+        seule fois dans les fragments statiques et chaque élément du lot ne fournit
+        que ses variables propres.
+        """
+        lot = lot if isinstance(lot, list) else list(lot)
+        return list(zip(self.sujet.rendre_lot(lot, communes), self.corps.rendre_lot(lot, communes)))
+
+
+class RegistreModeles:
+    """Modèles d'emails par nom, compilés à l'enregistrement"""
+
+    def __init__(self):
+        self._modeles: Dict[str, ModeleEmail] = {}
+
+    def enregistrer(self, nom: str, sujet: str, contenu: str, signature: str) -> ModeleEmail:
+        corps = MISE_EN_PAGE.replace("[contenu]", contenu).replace("[signature]", signature)
+        modele = self._modeles[nom] = ModeleEmail(nom, sujet, corps)
+        return modele
+
+    def __getitem__(self, nom: str) -> ModeleEmail:
+        return self._modeles[nom]
+
+    def __contains__(self, nom: str) -> bool:
+        return nom in self._modeles
+
+
+# ==================== MODÈLES ====================
+
+# Mise en page commune à tous les emails
+MISE_EN_PAGE = """
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #e1e1e1; border-radius: 10px;">[contenu]
+                <br>
+                <p>Cordialement,<br>[signature]</p>
+            </div>
+        </body>
+        </html>
+        """
+
+modeles = RegistreModeles()
+
+modeles.enregistrer(
+    "creation_compte",
+    sujet="Création de votre compte {role}",
+    signature="L'équipe administrative",
+    contenu="""
+                <h3>Bonjour {prenom},</h3>
+                <p>Votre compte <b>{role_minuscule}</b> a été créé avec succès.</p>
+                <p>Voici vos identifiants de connexion :</p>
+                <ul>
+                    <li><b>Email :</b> {email}</li>
+                    <li><b>Mot de passe :</b> {mot_de_passe}</li>
+                </ul>
+                <p><i>Note : Ceci est un email de test Mailtrap.</i></p>"""
+)
+
+modeles.enregistrer(
+    "assignation_travail",
+    sujet="Nouveau travail : {titre_travail} - {nom_matiere}",
+    signature="L'équipe pédagogique",
+    contenu="""
+                <h2 style="color: #2563eb;">Nouveau travail assigné !</h2>
+                <p>Bonjour <strong>{prenom}</strong>,</p>
+                <p>Un nouveau travail vous a été assigné dans la matière <strong>{nom_matiere}</strong> par votre formateur <strong>{formateur}</strong>.</p>
+
+                <div style="background-color: #f8fafc; padding: 15px; border-radius: 5px; margin: 20px 0;">
+                    <p style="margin-top: 0;"><strong>Titre :</strong> {titre_travail}</p>
+                    <p><strong>Échéance :</strong> <span style="color: #dc2626; font-weight: bold;">{date_echeance}</span></p>
+                    <p style="margin-bottom: 0;"><strong>Description :</strong><br>{description}</p>
+                </div>
+
+                <p>Pour toute question, n'hésitez pas à contacter votre formateur.</p>"""
+)
+
+modeles.enregistrer(
+    "livraison_travail",
+    sujet="Livraison reçue : {prenom_etudiant} {nom_etudiant} - {titre_travail}",
+    signature="Le système de suivi pédagogique",
+    contenu="""
+                <h2 style="color: #059669;">Nouvelle livraison reçue !</h2>
+                <p>Bonjour <strong>{prenom_formateur}</strong>,</p>
+                <p>L'étudiant <strong>{prenom_etudiant} {nom_etudiant}</strong> vient de soumettre son travail pour le sujet :</p>
+                <div style="background-color: #f8fafc; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                    <p style="margin: 0;"><strong>Titre :</strong> {titre_travail}</p>
+                    <p style="margin: 5px 0 0 0;"><strong>Matière :</strong> {nom_matiere}</p>
+                </div>
+                <p>Vous pouvez maintenant consulter et noter cette livraison depuis votre espace pédagogique.</p>"""
+)
+
+modeles.enregistrer(
+    "soumission_travail",
+    sujet="📝 Travail rendu : {titre_travail} - {prenom_etudiant} {nom_etudiant}",
+    signature="L'équipe pédagogique UATM",
+    contenu="""
+                <h2 style="color: #16a34a;">📝 Nouveau travail rendu !</h2>
+                <p>Bonjour <strong>{prenom_formateur}</strong>,</p>
+                <p>L'étudiant <strong>{prenom_etudiant} {nom_etudiant}</strong> vient de rendre son travail dans la matière <strong>{nom_matiere}</strong>.</p>
+
+                <div style="background-color: #f0fdf4; padding: 15px; border-radius: 5px; margin: 20px 0; border-left: 4px solid #16a34a;">
+                    <p style="margin-top: 0;"><strong>Travail :</strong> {titre_travail}</p>
+                    <p><strong>Date de soumission :</strong> {date_soumission}</p>
+                    <p style="margin-bottom: 0;"><strong>Commentaire de l'étudiant :</strong><br><em>{commentaire}</em></p>
+                </div>
+
+                <p>Connectez-vous à votre espace formateur pour consulter le travail et l'évaluer.</p>"""
+)
+
+modeles.enregistrer(
+    "evaluation_travail",
+    sujet="📊 Note reçue : {titre_travail} - {note}/{note_max}",
+    signature="L'équipe pédagogique UATM",
+    contenu="""
+                <h2 style="color: {couleur_note};">{emoji_note} Votre travail a été évalué !</h2>
+                <p>Bonjour <strong>{prenom_etudiant}</strong>,</p>
+                <p>Votre formateur <strong>{formateur}</strong> vient d'évaluer votre travail dans la matière <strong>{nom_matiere}</strong>.</p>
+
+                <div style="background-color: #f8fafc; padding: 15px; border-radius: 5px; margin: 20px 0;">
+                    <p style="margin-top: 0;"><strong>Travail :</strong> {titre_travail}</p>
+                    <div style="background-color: white; padding: 10px; border-radius: 5px; text-align: center; margin: 10px 0;">
+                        <span style="font-size: 24px; font-weight: bold; color: {couleur_note};">{note}/{note_max}</span>
+                        <span style="font-size: 14px; color: #666; margin-left: 10px;">({pourcentage:.1f}%)</span>
+                    </div>
+                    <p style="margin-bottom: 0;"><strong>Commentaire du formateur :</strong><br><em>{commentaire}</em></p>
+                </div>
+
+                <p>Connectez-vous à votre espace étudiant pour consulter les détails de votre évaluation.</p>"""
+)
+
+modeles.enregistrer(
+    "digest_assignations",
+    sujet="{nombre} nouveaux travaux assignés",
+    signature="L'équipe pédagogique",
+    contenu="""
+                <h2 style="color: #2563eb;">{nombre} nouveaux travaux assignés !</h2>
+                <p>Bonjour <strong>{prenom}</strong>,</p>
+                <p>Les travaux suivants vous ont été assignés :</p>
+                <div style="background-color: #f8fafc; padding: 15px; border-radius: 5px; margin: 20px 0;">
+                    <ul style="margin: 0; padding-left: 20px;">{lignes}
+                    </ul>
+                </div>
+                <p>Connectez-vous à votre espace étudiant pour consulter les consignes.</p>"""
+)
+
+modeles.enregistrer(
+    "digest_soumissions",
+    sujet="📝 {nombre} travaux rendus",
+    signature="L'équipe pédagogique UATM",
+    contenu="""
+                <h2 style="color: #16a34a;">📝 {nombre} travaux rendus</h2>
+                <p>Bonjour <strong>{prenom_formateur}</strong>,</p>
+                <p>Les étudiants suivants viennent de rendre leur travail :</p>
+                <div style="background-color: #f0fdf4; padding: 15px; border-radius: 5px; margin: 20px 0; border-left: 4px solid #16a34a;">
+                    <table style="border-collapse: collapse; width: 100%;">{lignes}
+                    </table>
+                </div>
+                <p>Connectez-vous à votre espace formateur pour consulter les travaux et les évaluer.</p>"""
+)
+
+# Lignes des récapitulatifs, rendues une fois par notification
+LIGNE_DIGEST_ASSIGNATION = Gabarit("""
+                        <li style="margin-bottom: 10px;"><strong>{titre_travail}</strong> ({nom_matiere}, {formateur})<br>
+                            Échéance : <span style="color: #dc2626; font-weight: bold;">{date_echeance}</span></li>""")
+
+LIGNE_DIGEST_SOUMISSION = Gabarit("""
+                        <tr><td style="padding: 4px 8px;">{prenom_etudiant} {nom_etudiant}</td>
+                            <td style="padding: 4px 8px;">{titre_travail} ({nom_matiere})</td>
+                            <td style="padding: 4px 8px;">{date_soumission}</td></tr>""")
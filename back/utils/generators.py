@@ -1,33 +1,102 @@
+import hashlib
+import os
 import secrets
+import socket
 import string
+import threading
 import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
+
+# Préfixe des identifiants par type d'entité (alias acceptés : libellés longs et courts)
+PREFIXES = {
+    "FORMATEUR": "FMT", "FORM": "FMT", "FMT": "FMT",
+    "ETUDIANT": "ETD", "ETU": "ETD", "ETD": "ETD",
+    "ESPACE": "ESP", "ESP": "ESP",
+    "PROMOTION": "PRM", "PROMO": "PRM", "PRM": "PRM",
+    "INSCRIPTION": "INS", "INSC": "INS", "INS": "INS",
+    "FILIERE": "FIL", "FIL": "FIL",
+    "MATIERE": "MAT", "MAT": "MAT",
+    "TRAVAIL": "TRV", "TRV": "TRV",
+    "ASSIGNATION": "ASG", "ASG": "ASG",
+}
+
+# Alphabet base 32 de Crockford : ordre lexicographique = ordre numérique
+_BASE32 = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_BITS_NOEUD = 10
+_BITS_SEQUENCE = 12
+_LONGUEUR = 14  # 48 bits de millisecondes + 10 + 12 = 70 bits
+NB_NOEUDS = 1 << _BITS_NOEUD
+
+
+class GenerateurIdentifiants:
+    """
+    Identifiants triables façon Snowflake : millisecondes, numéro de nœud, séquence.
+
+    Uniques sans consulter la base tant que chaque processus a un numéro de nœud distinct :
+    ID_NOEUD (0-1023) s'il est défini, sinon un numéro attribué par la base au démarrage
+    de l'API (utils.sequences.attribuer_noeud_identifiants). À défaut des deux (scripts à
+    processus unique), le numéro est dérivé de l'hôte et du PID, sans garantie d'unicité
+    entre processus. Croissants dans le temps : les insertions se font en fin d'index de
+    clé primaire au lieu d'être dispersées.
+    """
+
+    def __init__(self, noeud: Optional[int] = None):
+        if noeud is None:
+            noeud = os.getenv("ID_NOEUD") or None
+        # Nœud fixé explicitement (paramètre ou ID_NOEUD) : jamais remplacé par la base
+        self.noeud_explicite = noeud is not None
+        if noeud is None:
+            empreinte = hashlib.sha1(f"{socket.gethostname()}:{os.getpid()}".encode()).digest()
+            noeud = int.from_bytes(empreinte[:2], "big")
+        self.noeud = int(noeud) % NB_NOEUDS
+        self._derniere_ms = 0
+        self._sequence = 0
+        self._verrou = threading.Lock()
+
+    def changer_noeud(self, noeud: int) -> None:
+        with self._verrou:
+            self.noeud = noeud % NB_NOEUDS
+
+    def _valeurs(self, nombre: int) -> List[int]:
+        with self._verrou:
+            # Horloge qui recule : on reste sur la dernière milliseconde utilisée
+            ms = max(int(time.time() * 1000), self._derniere_ms)
+            sequence = self._sequence if ms == self._derniere_ms else 0
+            valeurs = []
+            for _ in range(nombre):
+                if sequence >> _BITS_SEQUENCE:
+                    # Séquence épuisée pour cette milliseconde : on emprunte la suivante
+                    ms, sequence = ms + 1, 0
+                valeurs.append((ms << (_BITS_NOEUD + _BITS_SEQUENCE)) | (self.noeud << _BITS_SEQUENCE) | sequence)
+                sequence += 1
+            self._derniere_ms, self._sequence = ms, sequence
+            return valeurs
+
+    @staticmethod
+    def _encoder(valeur: int) -> str:
+        caracteres = []
+        for _ in range(_LONGUEUR):
+            valeur, reste = divmod(valeur, 32)
+            caracteres.append(_BASE32[reste])
+        return "".join(reversed(caracteres))
+
+    def generer(self, role: str, nombre: int) -> List[str]:
+        prefixe = PREFIXES.get(role.upper(), "USR")
+        return [f"{prefixe}_{self._encoder(v)}" for v in self._valeurs(nombre)]
+
+
+generateur_identifiants = GenerateurIdentifiants()
+
 
 def generer_identifiant_unique(role: str) -> str:
-    """Génère un identifiant unique basé sur le rôle"""
-    prefixe = ""
-    if role == "FORMATEUR":
-        prefixe = "FMT"
-    elif role == "ETUDIANT":
-        prefixe = "ETD"
-    elif role == "ESPACE":
-        prefixe = "ESP"
-    elif role == "PROMOTION":
-        prefixe = "PRM"
-    elif role == "INSCRIPTION":
-        prefixe = "INS"
-    elif role == "FILIERE":
-        prefixe = "FIL"
-    elif role == "MATIERE":
-        prefixe = "MAT"
-    else:
-        prefixe = "USR"
-    
-    timestamp = str(int(time.time()))
-    aleatoire = str(secrets.randbelow(9000) + 1000)
-    
-    return f"{prefixe}_{timestamp}_{aleatoire}"
+    """Génère un identifiant unique et croissant, préfixé selon le type d'entité"""
+    return generateur_identifiants.generer(role, 1)[0]
+
+
+def generer_identifiants(role: str, nombre: int) -> List[str]:
+    """Génère `nombre` identifiants distincts en une fois (insertions en masse)"""
+    return generateur_identifiants.generer(role, nombre)
 
 def generer_mot_de_passe_aleatoire(longueur: int = 8) -> str:
     """Génère un mot de passe simple avec lettres majuscules et chiffres uniquement"""
@@ -38,16 +107,3 @@ def generer_mot_de_passe_aleatoire(longueur: int = 8) -> str:
 def generer_token_activation() -> str:
     """Génère un token d'activation sécurisé"""
     return secrets.token_urlsafe(32)
-
-def generer_matricule_unique() -> str:
-    """Génère un matricule unique pour étudiant"""
-    annee = datetime.now().year
-    # En pratique, on devrait récupérer le dernier numéro depuis la base
-    numero = secrets.randbelow(9000) + 1000
-    return f"MAT{annee}{str(numero).zfill(4)}"
-
-def generer_numero_employe() -> str:
-    """Génère un numéro d'employé unique"""
-    annee = datetime.now().year
-    numero = secrets.randbelow(900) + 100
-    return f"EMP{annee}{str(numero).zfill(3)}"
@@ -0,0 +1,233 @@
+"""
+Import en masse de comptes étudiants (CSV ou XLSX)
+
+Le fichier est lu ligne à ligne et traité par lots : pour chaque lot, une requête vérifie
+les emails déjà utilisés, les comptes Utilisateur et Etudiant sont insérés en deux
+INSERT multi-lignes et les emails d'identifiants mis en file en un seul INSERT, puis le
+lot est validé. Une ligne invalide n'empêche pas l'import des autres : chaque ligne
+figure dans le rapport avec son résultat.
+"""
+import codecs
+import csv
+import itertools
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+from openpyxl import load_workbook
+from pydantic import BaseModel, EmailStr, Field, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from core.auth import get_password_hash
+from models import Etudiant, Promotion, RoleEnum, StatutEtudiantEnum, Utilisateur
+from utils.email_outbox import mettre_en_file_lot
+from utils.generators import generer_identifiants, generer_mot_de_passe_aleatoire
+from utils.sequences import allouer_matricules
+
+TAILLE_LOT = 200
+
+# Colonnes acceptées (en-têtes insensibles à la casse et aux espaces)
+COLONNES = ("email", "nom", "prenom", "id_promotion")
+
+
+class FormatImportInvalide(ValueError):
+    """Fichier illisible ou en-têtes manquants"""
+
+
+class LigneImport(BaseModel):
+    email: EmailStr
+    nom: str = Field(..., min_length=1)
+    prenom: str = Field(..., min_length=1)
+    id_promotion: str = Field(..., min_length=1)
+
+
+def _normaliser(entete: Any) -> str:
+    return str(entete or "").strip().lower().replace("é", "e").replace(" ", "_")
+
+
+def _lignes_csv(flux: BinaryIO) -> Iterator[List[str]]:
+    # utf-8-sig : les exports Excel commencent souvent par un BOM
+    texte = codecs.getreader("utf-8-sig")(flux)
+    premiere = texte.readline()
+    try:
+        dialecte = csv.Sniffer().sniff(premiere, delimiters=",;\t")
+    except csv.Error:
+        dialecte = csv.excel
+    yield from csv.reader(itertools.chain([premiere], texte), dialecte)
+
+
+def _lignes_xlsx(flux: BinaryIO) -> Iterator[List[str]]:
+    """Première feuille du classeur, lue en mode flux (read_only)"""
+    try:
+        classeur = load_workbook(flux, read_only=True, data_only=True)
+    except Exception:
+        raise FormatImportInvalide("Fichier XLSX illisible")
+    try:
+        for valeurs in classeur.active.iter_rows(values_only=True):
+            yield ["" if v is None else str(v) for v in valeurs]
+    finally:
+        classeur.close()
+
+
+def lire_lignes(flux: BinaryIO, nom_fichier: str, id_promotion: Optional[str] = None) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Vérifie l'en-tête puis retourne un itérateur de (numéro de ligne, valeurs par colonne),
+    lignes vides ignorées. `id_promotion` s'applique aux lignes sans id_promotion.
+    """
+    lignes = _lignes_xlsx(flux) if nom_fichier.lower().endswith(".xlsx") else _lignes_csv(flux)
+    try:
+        entetes = [_normaliser(e) for e in next(lignes)]
+    except (StopIteration, UnicodeDecodeError, csv.Error):
+        raise FormatImportInvalide("Fichier vide ou illisible (CSV UTF-8 attendu)")
+    manquantes = [c for c in COLONNES if c not in entetes and not (c == "id_promotion" and id_promotion)]
+    if manquantes:
+        raise FormatImportInvalide(f"Colonnes manquantes : {', '.join(manquantes)}")
+
+    def parcourir() -> Iterator[Tuple[int, Dict[str, str]]]:
+        try:
+            for numero, valeurs in enumerate(lignes, start=2):
+                if not any(v.strip() for v in valeurs):
+                    continue
+                ligne = {e: v.strip() for e, v in zip(entetes, valeurs) if e in COLONNES}
+                if not ligne.get("id_promotion"):
+                    ligne["id_promotion"] = id_promotion or ""
+                yield numero, ligne
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise FormatImportInvalide(f"Fichier illisible : {e}")
+
+    return parcourir()
+
+
+class ImportEtudiants:
+    """Import d'un fichier, lot par lot ; `rapport` contient le résultat de chaque ligne"""
+
+    def __init__(self, db: Session, taille_lot: Optional[int] = None):
+        self.db = db
+        self.taille_lot = taille_lot or TAILLE_LOT
+        self.rapport: List[Dict[str, Any]] = []
+        self.promotions_modifiees: Set[str] = set()
+        self._emails_vus: Set[str] = set()
+        self._promotions: Dict[str, bool] = {}
+
+    def _erreur(self, numero: int, email: Optional[str], message: str) -> None:
+        self.rapport.append({"ligne": numero, "email": email, "statut": "erreur", "erreur": message})
+
+    def _verifier_promotions(self, ids: Set[str]) -> None:
+        inconnues = ids - self._promotions.keys()
+        if inconnues:
+            existantes = {p for (p,) in self.db.query(Promotion.id_promotion).filter(Promotion.id_promotion.in_(inconnues))}
+            self._promotions.update({p: p in existantes for p in inconnues})
+
+    def traiter(self, lignes: Iterator[Tuple[int, Dict[str, str]]]) -> Dict[str, Any]:
+        """
+        Importe toutes les lignes. Si le fichier devient illisible en cours de route,
+        les lots déjà validés sont conservés et `erreur_fichier` indique l'arrêt.
+        """
+        erreur_fichier = None
+        try:
+            while lot := list(itertools.islice(lignes, self.taille_lot)):
+                self._traiter_lot(lot)
+        except FormatImportInvalide as e:
+            erreur_fichier = str(e)
+        crees = sum(1 for l in self.rapport if l["statut"] == "cree")
+        return {
+            "total": len(self.rapport),
+            "crees": crees,
+            "erreurs": len(self.rapport) - crees,
+            "erreur_fichier": erreur_fichier,
+            "lignes": sorted(self.rapport, key=lambda l: l["ligne"])
+        }
+
+    def _traiter_lot(self, lot: List[Tuple[int, Dict[str, str]]]) -> None:
+        # 1. Validation des champs et doublons dans le fichier
+        valides: List[Tuple[int, LigneImport]] = []
+        for numero, ligne in lot:
+            try:
+                donnees = LigneImport(**ligne)
+            except ValidationError as e:
+                champs = ", ".join(str(err["loc"][0]) for err in e.errors())
+                self._erreur(numero, ligne.get("email"), f"Champ invalide ou manquant : {champs}")
+                continue
+            email = donnees.email.lower()
+            if email in self._emails_vus:
+                self._erreur(numero, donnees.email, "Email en double dans le fichier")
+                continue
+            self._emails_vus.add(email)
+            valides.append((numero, donnees))
+
+        # 2. Une requête pour les emails déjà utilisés, une pour les promotions pas encore vues
+        if valides:
+            emails = [d.email for _, d in valides]
+            existants = {e.lower() for (e,) in self.db.query(Utilisateur.email).filter(Utilisateur.email.in_(emails))}
+            self._verifier_promotions({d.id_promotion for _, d in valides})
+        a_creer = []
+        for numero, donnees in valides:
+            if donnees.email.lower() in existants:
+                self._erreur(numero, donnees.email, "Cet email est déjà utilisé")
+            elif not self._promotions[donnees.id_promotion]:
+                self._erreur(numero, donnees.email, "Promotion introuvable")
+            else:
+                a_creer.append((numero, donnees))
+        if not a_creer:
+            return
+
+        # 3. Insertion du lot et mise en file des emails, dans une même transaction
+        identifiants = generer_identifiants("ETUDIANT", len(a_creer))
+        ids_etudiants = generer_identifiants("ETUDIANT", len(a_creer))
+        matricules = allouer_matricules(self.db, len(a_creer))
+        mots_de_passe = [generer_mot_de_passe_aleatoire() for _ in a_creer]
+        aujourd_hui = datetime.utcnow().date()
+        comptes = list(zip(a_creer, identifiants, ids_etudiants, matricules, mots_de_passe))
+        try:
+            self.db.execute(insert(Utilisateur), [
+                {
+                    "identifiant": identifiant,
+                    "email": d.email,
+                    "mot_de_passe": get_password_hash(mot_de_passe),
+                    "nom": d.nom,
+                    "prenom": d.prenom,
+                    "role": RoleEnum.ETUDIANT,
+                    "actif": True,
+                    "mot_de_passe_temporaire": True
+                }
+                for (_, d), identifiant, _, _, mot_de_passe in comptes
+            ])
+            self.db.execute(insert(Etudiant), [
+                {
+                    "id_etudiant": id_etudiant,
+                    "identifiant": identifiant,
+                    "matricule": matricule,
+                    "id_promotion": d.id_promotion,
+                    "date_inscription": aujourd_hui,
+                    "statut": StatutEtudiantEnum.ACTIF
+                }
+                for (_, d), identifiant, id_etudiant, matricule, _ in comptes
+            ])
+            mettre_en_file_lot(self.db, "creation_compte", [
+                {
+                    "destinataire": d.email,
+                    "prenom": d.prenom,
+                    "email": d.email,
+                    "mot_de_passe": mot_de_passe,
+                    "role": "ETUDIANT"
+                }
+                for (_, d), _, _, _, mot_de_passe in comptes
+            ])
+            self.db.commit()
+        except Exception as e:
+            # Lot annulé en entier (ex : email créé entre-temps) ; les lots précédents restent validés
+            self.db.rollback()
+            for numero, d in a_creer:
+                self._erreur(numero, d.email, f"Erreur lors de l'enregistrement du lot : {type(e).__name__}")
+            return
+
+        for (numero, d), identifiant, id_etudiant, matricule, _ in comptes:
+            self.rapport.append({
+                "ligne": numero,
+                "email": d.email,
+                "statut": "cree",
+                "identifiant": identifiant,
+                "id_etudiant": id_etudiant,
+                "matricule": matricule
+            })
+            self.promotions_modifiees.add(d.id_promotion)
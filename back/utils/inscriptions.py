@@ -0,0 +1,71 @@
+"""
+Inscription en masse d'étudiants dans un espace pédagogique
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import insert, or_, and_
+from sqlalchemy.orm import Session
+
+from models import Etudiant, Inscription
+from utils.generators import generer_identifiants
+
+
+def inscrire_etudiants(
+    db: Session,
+    id_espace: str,
+    etudiants_ids: Iterable[str] = (),
+    id_promotion: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    Inscrit dans l'espace les étudiants listés et/ou tous ceux d'une promotion.
+
+    Une seule requête valide les identifiants et repère les inscriptions existantes,
+    puis les nouvelles inscriptions sont insérées en un seul INSERT multi-lignes.
+    Ne valide pas la transaction : l'appelant reste responsable du commit.
+    """
+    ids_demandes = set(etudiants_ids)
+    if not ids_demandes and not id_promotion:
+        return {"ajoutes": 0, "deja_inscrits": 0, "invalides": 0}
+
+    criteres = []
+    if ids_demandes:
+        criteres.append(Etudiant.id_etudiant.in_(ids_demandes))
+    if id_promotion:
+        criteres.append(Etudiant.id_promotion == id_promotion)
+
+    # Étudiants existants, avec leur éventuelle inscription dans l'espace
+    lignes = db.query(
+        Etudiant.id_etudiant,
+        Inscription.id_inscription
+    ).outerjoin(
+        Inscription,
+        and_(
+            Inscription.id_etudiant == Etudiant.id_etudiant,
+            Inscription.id_espace == id_espace
+        )
+    ).filter(or_(*criteres)).all()
+
+    trouves = {row.id_etudiant for row in lignes}
+    deja_inscrits = {row.id_etudiant for row in lignes if row.id_inscription is not None}
+    a_inscrire = sorted(trouves - deja_inscrits)
+    invalides = ids_demandes - trouves
+
+    if a_inscrire:
+        ids_inscriptions = generer_identifiants("INSCRIPTION", len(a_inscrire))
+        maintenant = datetime.utcnow()
+        db.execute(insert(Inscription), [
+            {
+                "id_inscription": id_inscription,
+                "id_espace": id_espace,
+                "id_etudiant": id_etudiant,
+                "date_inscription": maintenant
+            }
+            for id_etudiant, id_inscription in zip(a_inscrire, ids_inscriptions)
+        ])
+
+    return {
+        "ajoutes": len(a_inscrire),
+        "deja_inscrits": len(deja_inscrits),
+        "invalides": len(invalides)
+    }
@@ -10,7 +10,7 @@ from datetime import datetime, timedelta
 import secrets
 
 
-def reparer_utilisateurs_douteux(db: Session):
+async def reparer_utilisateurs_douteux(db: Session):
     """
     Répare les utilisateurs qui ont des problèmes d'authentification
     """
@@ -54,7 +54,7 @@ def reparer_utilisateurs_douteux(db: Session):
         utilisateur.date_expiration_token = date_expiration
         
         # Envoyer l'email avec les nouveaux identifiants
-        success = email_service.envoyer_email_creation_compte(
+        success = await email_service.envoyer_email_creation_compte(
             destinataire=utilisateur.email,
             prenom=utilisateur.prenom,
             email=utilisateur.email,
@@ -0,0 +1,91 @@
+"""
+Numéros séquentiels par année (matricules étudiants, numéros d'employé)
+
+Chaque séquence est une ligne de compteur_sequence. Une réservation de N numéros est
+un seul UPDATE valeur = valeur + N : la ligne reste verrouillée jusqu'à la validation
+de la transaction de l'appelant, les blocs sont donc contigus et jamais attribués deux
+fois. Si la transaction est annulée, les numéros réservés le sont aussi (pas de trou).
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import CompteurSequence, Etudiant, Formateur
+from utils.generators import generateur_identifiants
+
+# Séquence -> (colonne des valeurs déjà attribuées, préfixe, nombre minimal de chiffres)
+SEQUENCES = {
+    "matricule": (Etudiant.matricule, "MAT", 4),
+    "numero_employe": (Formateur.numero_employe, "EMP", 3),
+}
+
+
+def _valeur_initiale(db: Session, nom: str, annee: int) -> int:
+    """Plus grand numéro déjà attribué (avant la création du compteur, ex : tirages aléatoires)"""
+    if nom not in SEQUENCES:
+        return 0
+    colonne, prefixe, _ = SEQUENCES[nom]
+    debut = f"{prefixe}{annee}"
+    numeros = [
+        int(valeur[len(debut):])
+        for (valeur,) in db.query(colonne).filter(colonne.like(f"{debut}%"))
+        if valeur[len(debut):].isdigit()
+    ]
+    return max(numeros, default=0)
+
+
+def reserver(db: Session, nom: str, annee: int, nombre: int) -> int:
+    """
+    Réserve `nombre` numéros consécutifs et retourne le premier.
+    Ne valide pas la transaction.
+    """
+    resultat = db.execute(
+        update(CompteurSequence)
+        .where(CompteurSequence.nom == nom, CompteurSequence.annee == annee)
+        .values(valeur=CompteurSequence.valeur + nombre)
+    )
+    if not resultat.rowcount:
+        try:
+            with db.begin_nested():
+                db.add(CompteurSequence(nom=nom, annee=annee, valeur=_valeur_initiale(db, nom, annee) + nombre))
+        except IntegrityError:
+            # Compteur créé entre-temps par une transaction concurrente
+            return reserver(db, nom, annee, nombre)
+    fin = db.query(CompteurSequence.valeur).filter(
+        CompteurSequence.nom == nom, CompteurSequence.annee == annee
+    ).scalar()
+    return fin - nombre + 1
+
+
+def _allouer(db: Session, nom: str, nombre: int, annee: Optional[int]) -> List[str]:
+    if nombre <= 0:
+        return []
+    annee = annee or datetime.now().year
+    _, prefixe, chiffres = SEQUENCES[nom]
+    premier = reserver(db, nom, annee, nombre)
+    return [f"{prefixe}{annee}{str(numero).zfill(chiffres)}" for numero in range(premier, premier + nombre)]
+
+
+def allouer_matricules(db: Session, nombre: int = 1, annee: Optional[int] = None) -> List[str]:
+    """Matricules MAT{année}{numéro}, consécutifs"""
+    return _allouer(db, "matricule", nombre, annee)
+
+
+def allouer_numeros_employe(db: Session, nombre: int = 1, annee: Optional[int] = None) -> List[str]:
+    """Numéros d'employé EMP{année}{numéro}, consécutifs"""
+    return _allouer(db, "numero_employe", nombre, annee)
+
+
+def attribuer_noeud_identifiants(db: Session) -> int:
+    """
+    Attribue à ce processus le numéro de nœud suivant du compteur « noeud_identifiants »
+    (sauf si ID_NOEUD est défini) et valide. Deux processus démarrés l'un après l'autre
+    ont des numéros distincts ; le compteur boucle après 1024 démarrages.
+    """
+    if not generateur_identifiants.noeud_explicite:
+        generateur_identifiants.changer_noeud(reserver(db, "noeud_identifiants", 0, 1))
+        db.commit()
+    return generateur_identifiants.noeud
@@ -0,0 +1,167 @@
+"""
+Statistiques du tableau de bord du Directeur d'Établissement
+"""
+from datetime import datetime
+from typing import Dict, Any
+
+from sqlalchemy import select, func, case, true
+from sqlalchemy.orm import Session
+
+from models import (
+    Filiere, Matiere, Promotion, Etudiant, Formateur, EspacePedagogique,
+    Travail, Assignation, StatutAssignationEnum, StatutEtudiantEnum
+)
+
+
+def _compter(modele) -> Any:
+    return select(func.count()).select_from(modele).scalar_subquery()
+
+
+def _compter_si(condition) -> Any:
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def calculer_compteurs_de(db: Session) -> Dict[str, int]:
+    """
+    Calcule tous les compteurs du tableau de bord DE en une seule requête
+    (agrégation conditionnelle + sous-requêtes scalaires)
+    """
+    etudiants = select(
+        func.count().label("total_etudiants"),
+        _compter_si(Etudiant.statut == StatutEtudiantEnum.ACTIF).label("etudiants_actifs")
+    ).select_from(Etudiant).subquery()
+
+    assignations = select(
+        _compter_si(Assignation.statut == StatutAssignationEnum.EN_COURS).label("en_cours"),
+        _compter_si(Assignation.statut == StatutAssignationEnum.RENDU).label("rendus"),
+        _compter_si(Assignation.statut == StatutAssignationEnum.NOTE).label("notes")
+    ).select_from(Assignation).subquery()
+
+    ligne = db.execute(
+        select(
+            etudiants.c.total_etudiants,
+            etudiants.c.etudiants_actifs,
+            _compter(Formateur).label("total_formateurs"),
+            _compter(Filiere).label("total_filieres"),
+            _compter(Promotion).label("total_promotions"),
+            _compter(EspacePedagogique).label("total_espaces"),
+            _compter(Travail).label("total_travaux"),
+            assignations.c.en_cours,
+            assignations.c.rendus,
+            assignations.c.notes
+        ).select_from(etudiants.join(assignations, true()))
+    ).one()
+
+    return {cle: int(valeur or 0) for cle, valeur in ligne._mapping.items()}
+
+
+def calculer_tableau_de_bord_de(db: Session) -> Dict[str, Any]:
+    """
+    Construit le tableau de bord DE en 4 requêtes :
+    compteurs, effectifs par promotion, travaux récents, espaces sans formateur
+    """
+    # 1. Compteurs généraux et statuts des assignations
+    compteurs = calculer_compteurs_de(db)
+
+    # 2. Effectifs par promotion (sert à la répartition par filière et aux promotions actives)
+    effectifs_promotions = db.query(
+        Promotion.libelle,
+        Promotion.annee_academique,
+        Filiere.nom_filiere,
+        func.count(Etudiant.id_etudiant).label('nombre_etudiants')
+    ).join(
+        Filiere, Promotion.id_filiere == Filiere.id_filiere
+    ).outerjoin(
+        Etudiant, Promotion.id_promotion == Etudiant.id_promotion
+    ).group_by(
+        Promotion.id_promotion, Promotion.libelle,
+        Promotion.annee_academique, Filiere.nom_filiere
+    ).all()
+
+    repartition_filieres: Dict[str, int] = {}
+    for row in effectifs_promotions:
+        if row.nombre_etudiants:
+            repartition_filieres[row.nom_filiere] = (
+                repartition_filieres.get(row.nom_filiere, 0) + row.nombre_etudiants
+            )
+
+    annee_actuelle = str(datetime.now().year)
+    promotions_actives = [
+        row for row in effectifs_promotions if annee_actuelle in row.annee_academique
+    ]
+
+    # 3. Activité récente (derniers travaux créés)
+    travaux_recents = db.query(
+        Travail.titre,
+        Travail.date_creation,
+        Matiere.nom_matiere,
+        Promotion.libelle.label('promotion')
+    ).join(
+        EspacePedagogique, Travail.id_espace == EspacePedagogique.id_espace
+    ).join(
+        Matiere, EspacePedagogique.id_matiere == Matiere.id_matiere
+    ).join(
+        Promotion, EspacePedagogique.id_promotion == Promotion.id_promotion
+    ).order_by(Travail.date_creation.desc()).limit(5).all()
+
+    # 4. Espaces pédagogiques sans formateur
+    espaces_sans_formateur = db.query(
+        EspacePedagogique.id_espace,
+        Matiere.nom_matiere,
+        Promotion.libelle.label('promotion')
+    ).join(
+        Matiere, EspacePedagogique.id_matiere == Matiere.id_matiere
+    ).join(
+        Promotion, EspacePedagogique.id_promotion == Promotion.id_promotion
+    ).filter(EspacePedagogique.id_formateur.is_(None)).all()
+
+    return {
+        "statistiques_generales": {
+            "total_etudiants": compteurs["total_etudiants"],
+            "etudiants_actifs": compteurs["etudiants_actifs"],
+            "total_formateurs": compteurs["total_formateurs"],
+            "total_filieres": compteurs["total_filieres"],
+            "total_promotions": compteurs["total_promotions"],
+            "total_espaces": compteurs["total_espaces"],
+            "total_travaux": compteurs["total_travaux"]
+        },
+        "repartition_filieres": [
+            {
+                "filiere": nom_filiere,
+                "nombre_etudiants": nombre_etudiants
+            }
+            for nom_filiere, nombre_etudiants in sorted(repartition_filieres.items())
+        ],
+        "activite_recente": [
+            {
+                "titre": row.titre,
+                "date_creation": row.date_creation.isoformat(),
+                "matiere": row.nom_matiere,
+                "promotion": row.promotion
+            }
+            for row in travaux_recents
+        ],
+        "espaces_sans_formateur": [
+            {
+                "id_espace": row.id_espace,
+                "matiere": row.nom_matiere,
+                "promotion": row.promotion
+            }
+            for row in espaces_sans_formateur
+        ],
+        "statistiques_travaux": {
+            "en_cours": compteurs["en_cours"],
+            "rendus": compteurs["rendus"],
+            "notes": compteurs["notes"],
+            "total": compteurs["en_cours"] + compteurs["rendus"] + compteurs["notes"]
+        },
+        "promotions_actives": [
+            {
+                "libelle": row.libelle,
+                "annee_academique": row.annee_academique,
+                "filiere": row.nom_filiere,
+                "nombre_etudiants": row.nombre_etudiants or 0
+            }
+            for row in promotions_actives
+        ]
+    }
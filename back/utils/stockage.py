@@ -0,0 +1,273 @@
+"""
+Stockage des fichiers livrés
+
+Les fichiers reçus sont lus par morceaux de taille fixe et écrits hors de la boucle
+d'événements (thread), en calculant leur SHA-256 au fil de l'écriture et en refusant
+dès que possible ceux qui dépassent la taille maximale autorisée.
+
+Les fichiers sont adressés par leur contenu : un fichier identique (travail collectif,
+nouvelle soumission) n'est stocké qu'une fois, sous uploads/blobs/ab/cd/<sha256>.
+La table fichier_stocke compte les assignations qui y font référence ; les fichiers
+qui ne sont plus référencés sont supprimés par `python gc_fichiers.py`.
+
+Une livraison enregistre le fichier (ajouter), prend sa référence (referencer), puis
+confirme le fichier (confirmer) : si le ramasse-miettes l'a supprimé entre-temps, la
+copie reçue le remplace. Le ramasse-miettes ne supprime un fichier qu'après avoir
+verrouillé et revérifié sa ligne, dans la transaction qui supprime la ligne.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional
+
+from fastapi import UploadFile
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import Assignation, FichierStocke
+
+DOSSIER_BLOBS = Path("uploads/blobs")
+
+TAILLE_MAX = int(float(os.getenv("UPLOAD_TAILLE_MAX_MO", "50")) * 1024 * 1024)
+TAILLE_MORCEAU = int(os.getenv("UPLOAD_TAILLE_MORCEAU", str(1024 * 1024)))
+
+
+class FichierTropVolumineux(ValueError):
+    def __init__(self, taille_max: int):
+        super().__init__(f"Le fichier dépasse la taille maximale autorisée ({taille_max // (1024 * 1024)} Mo)")
+        self.taille_max = taille_max
+
+
+@dataclass(frozen=True)
+class FichierEnregistre:
+    chemin: Path
+    taille: int
+    sha256: str
+    # Copie reçue, conservée jusqu'à `confirmer` quand le contenu était déjà stocké
+    temporaire: Optional[Path] = None
+
+
+def _ecrire(sortie: BinaryIO, empreinte, morceau: bytes) -> None:
+    sortie.write(morceau)
+    empreinte.update(morceau)
+
+
+async def enregistrer_upload(fichier: UploadFile, destination: Path,
+                             taille_max: Optional[int] = None) -> FichierEnregistre:
+    """
+    Copie un fichier reçu vers `destination` par morceaux, sans bloquer la boucle
+    d'événements. Le fichier est écrit sous un nom temporaire puis renommé : en cas
+    d'erreur ou de dépassement de taille, rien n'est laissé sur le disque.
+    """
+    taille_max = taille_max or TAILLE_MAX
+    # Taille annoncée connue : refus avant toute écriture
+    if fichier.size is not None and fichier.size > taille_max:
+        raise FichierTropVolumineux(taille_max)
+
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temporaire = destination.with_name(destination.name + ".part")
+    empreinte = hashlib.sha256()
+    taille = 0
+
+    sortie = await asyncio.to_thread(open, temporaire, "wb")
+    try:
+        while morceau := await fichier.read(TAILLE_MORCEAU):
+            taille += len(morceau)
+            if taille > taille_max:
+                raise FichierTropVolumineux(taille_max)
+            await asyncio.to_thread(_ecrire, sortie, empreinte, morceau)
+        await asyncio.to_thread(sortie.close)
+        await asyncio.to_thread(os.replace, temporaire, destination)
+    except BaseException:
+        await asyncio.to_thread(sortie.close)
+        await asyncio.to_thread(temporaire.unlink, missing_ok=True)
+        raise
+
+    return FichierEnregistre(chemin=destination, taille=taille, sha256=empreinte.hexdigest())
+
+
+# ==================== STOCKAGE ADRESSÉ PAR CONTENU ====================
+
+class StockageBlobs(ABC):
+    """Fichiers identifiés par leur SHA-256"""
+
+    @abstractmethod
+    def chemin(self, sha256: str) -> Path:
+        """Chemin local du fichier (servi tel quel au téléchargement)"""
+
+    @abstractmethod
+    async def ajouter(self, fichier: UploadFile, taille_max: Optional[int] = None) -> FichierEnregistre:
+        """Enregistre un fichier reçu ; s'il est déjà stocké, la copie reçue est mise de côté"""
+
+    @abstractmethod
+    async def confirmer(self, fichier: FichierEnregistre) -> None:
+        """
+        À appeler après `referencer` : garantit que le fichier est présent (recréé depuis
+        la copie reçue s'il a été supprimé entre-temps) et écarte la copie
+        """
+
+    @abstractmethod
+    def supprimer(self, sha256: str) -> None:
+        ...
+
+    @abstractmethod
+    def lister(self) -> Iterator[str]:
+        """Empreintes des fichiers présents"""
+
+    @abstractmethod
+    def nettoyer_temporaires(self, limite: datetime) -> int:
+        """Supprime les fichiers temporaires antérieurs à `limite` (envois interrompus)"""
+
+
+class StockageLocal(StockageBlobs):
+    """Fichiers sur disque, répartis en sous-dossiers par préfixe d'empreinte (ab/cd/abcd...)"""
+
+    def __init__(self, racine: Path):
+        self.racine = racine
+
+    def chemin(self, sha256: str) -> Path:
+        return self.racine / sha256[:2] / sha256[2:4] / sha256
+
+    async def ajouter(self, fichier: UploadFile, taille_max: Optional[int] = None) -> FichierEnregistre:
+        # L'empreinte n'est connue qu'après lecture : écriture dans tmp/, puis déplacement
+        temporaire = await enregistrer_upload(fichier, self.racine / "tmp" / uuid.uuid4().hex, taille_max)
+        destination = self.chemin(temporaire.sha256)
+        if await asyncio.to_thread(destination.exists):
+            # Conservée : le ramasse-miettes peut supprimer l'existant avant `referencer`
+            return FichierEnregistre(chemin=destination, taille=temporaire.taille,
+                                     sha256=temporaire.sha256, temporaire=temporaire.chemin)
+        await asyncio.to_thread(self._placer, temporaire.chemin, destination)
+        return FichierEnregistre(chemin=destination, taille=temporaire.taille, sha256=temporaire.sha256)
+
+    async def confirmer(self, fichier: FichierEnregistre) -> None:
+        if fichier.temporaire is None:
+            return
+        if await asyncio.to_thread(fichier.chemin.exists):
+            await asyncio.to_thread(fichier.temporaire.unlink, missing_ok=True)
+        else:
+            await asyncio.to_thread(self._placer, fichier.temporaire, fichier.chemin)
+
+    @staticmethod
+    def _placer(source: Path, destination: Path) -> None:
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, destination)
+
+    def supprimer(self, sha256: str) -> None:
+        self.chemin(sha256).unlink(missing_ok=True)
+
+    def lister(self) -> Iterator[str]:
+        for chemin in self.racine.glob("??/??/*"):
+            if chemin.is_file() and not chemin.name.endswith(".part"):
+                yield chemin.name
+
+    def nettoyer_temporaires(self, limite: datetime) -> int:
+        supprimes = 0
+        candidats = list(self.racine.glob("tmp/*")) + list(self.racine.rglob("*.part"))
+        for chemin in set(candidats):
+            try:
+                if chemin.is_file() and datetime.utcfromtimestamp(chemin.stat().st_mtime) < limite:
+                    chemin.unlink()
+                    supprimes += 1
+            except FileNotFoundError:
+                continue
+        return supprimes
+
+
+stockage_blobs: StockageBlobs = StockageLocal(DOSSIER_BLOBS)
+
+
+# ==================== COMPTAGE DES RÉFÉRENCES ====================
+
+def referencer(db: Session, fichier: FichierEnregistre) -> None:
+    """Ajoute une référence au fichier (créé au premier usage). Ne valide pas la transaction."""
+    maintenant = datetime.utcnow()
+    resultat = db.execute(
+        update(FichierStocke)
+        .where(FichierStocke.sha256 == fichier.sha256)
+        .values(nb_references=FichierStocke.nb_references + 1, date_modification=maintenant)
+    )
+    if resultat.rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.add(FichierStocke(
+                sha256=fichier.sha256, taille=fichier.taille, nb_references=1,
+                date_creation=maintenant, date_modification=maintenant
+            ))
+    except IntegrityError:
+        # Créé entre-temps par une livraison concurrente
+        referencer(db, fichier)
+
+
+def dereferencer(db: Session, sha256: str) -> None:
+    """Retire une référence ; le fichier sera supprimé par le ramasse-miettes. Ne valide pas la transaction."""
+    db.execute(
+        update(FichierStocke)
+        .where(FichierStocke.sha256 == sha256, FichierStocke.nb_references > 0)
+        .values(nb_references=FichierStocke.nb_references - 1, date_modification=datetime.utcnow())
+    )
+
+
+def recompter_references(db: Session) -> int:
+    """Recalcule les compteurs depuis les assignations ; retourne le nombre de compteurs corrigés"""
+    comptes = dict(
+        db.query(Assignation.fichier_sha256, func.count())
+        .filter(Assignation.fichier_sha256.isnot(None))
+        .group_by(Assignation.fichier_sha256)
+        .all()
+    )
+    corriges = 0
+    for fichier in db.query(FichierStocke):
+        attendu = comptes.get(fichier.sha256, 0)
+        if fichier.nb_references != attendu:
+            fichier.nb_references = attendu
+            fichier.date_modification = datetime.utcnow()
+            corriges += 1
+    db.commit()
+    return corriges
+
+
+def collecter_fichiers(db: Session, stockage: StockageBlobs, delai_grace: timedelta) -> Dict[str, int]:
+    """
+    Supprime les fichiers sans référence depuis plus de `delai_grace`, les fichiers
+    présents sur disque mais inconnus de la base et les fichiers temporaires laissés
+    par une livraison interrompue. Le délai de grâce protège les livraisons en cours.
+    """
+    limite = datetime.utcnow() - delai_grace
+    sans_reference = (FichierStocke.nb_references <= 0, FichierStocke.date_modification < limite)
+    candidats = [sha256 for (sha256,) in db.query(FichierStocke.sha256).filter(*sans_reference)]
+
+    supprimes = 0
+    for sha256 in candidats:
+        # Ligne verrouillée et revérifiée : une livraison qui la référence attend la
+        # validation, puis recrée la ligne et le fichier (StockageBlobs.confirmer)
+        fichier = db.query(FichierStocke).filter(
+            FichierStocke.sha256 == sha256, *sans_reference
+        ).with_for_update(skip_locked=True).first()
+        if fichier is not None:
+            db.delete(fichier)
+            db.flush()
+            stockage.supprimer(sha256)
+            supprimes += 1
+        db.commit()
+
+    connus = {sha256 for (sha256,) in db.query(FichierStocke.sha256)}
+    orphelins = [
+        sha256 for sha256 in stockage.lister()
+        if sha256 not in connus and sha256 not in candidats
+        and datetime.utcfromtimestamp(stockage.chemin(sha256).stat().st_mtime) < limite
+    ]
+    for sha256 in orphelins:
+        stockage.supprimer(sha256)
+    db.rollback()
+    return {
+        "supprimes": supprimes,
+        "orphelins": len(orphelins),
+        "temporaires": stockage.nettoyer_temporaires(limite)
+    }
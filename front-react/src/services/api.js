@@ -99,6 +99,19 @@ export const gestionComptesAPI = {
 
   // Création étudiant
   createEtudiant: (data) => api.post('/api/gestion-comptes/creer-etudiant', data),
+
+  // Import d'étudiants (CSV/XLSX), rapport par ligne
+  importerEtudiants: (fichier, idPromotion) => {
+    const formData = new FormData();
+    formData.append('fichier', fichier);
+    if (idPromotion) formData.append('id_promotion', idPromotion);
+
+    return api.post('/api/gestion-comptes/importer-etudiants', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    });
+  },
 };
 
 // ==================== ESPACES PEDAGOGIQUES ====================